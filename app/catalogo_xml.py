@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+catalogo_xml.py
+Catálogo local dos XMLs de NF-e (SQLite), no lugar do estado guardado em
+sufixos de nome de arquivo ((FEITO_TMP), (JA_IMPORTADO_TMP), (FEITO)):
+1) Cada XML é indexado pela chave de acesso e pelo hash (sha256) do conteúdo
+2) Guarda número da NF, nome original (o mesmo do Drive), caminho local e status
+3) Consultas diretas por NF / chave / nome, sem varrer a pasta
+4) Arquivamento dos XMLs concluídos numa subpasta
+5) Índice chave de acesso → id da importação no SGI (abre a tela da NF
+   direto pela URL)
+6) Índice referência do fornecedor → produto do SGI, aprendido de cada item
+   vinculado (vincula itens que o SGI não sugere)
+Na primeira abertura, os arquivos que ainda usam sufixos são importados.
+"""
+import os
+import re
+import shutil
+import sqlite3
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+# Ciclo de vida de um XML
+BAIXADO      = "BAIXADO"        # na pasta local, ainda não enviado ao SGI
+IMPORTADO    = "IMPORTADO"      # importado no SGI nesta/numa execução anterior
+JA_IMPORTADO = "JA_IMPORTADO"   # SGI respondeu "Chave de Acesso já está em uso"
+FEITO        = "FEITO"          # fluxo encerrado (renomeado no Drive)
+REJEITADO    = "REJEITADO"      # reprovado na pré-validação; não vai ao SGI
+EM_ANDAMENTO = (IMPORTADO, JA_IMPORTADO)
+
+_SUFIXOS_LEGADOS = (
+    ("(FEITO_TMP)", IMPORTADO),
+    ("(JA_IMPORTADO_TMP)", JA_IMPORTADO),
+    ("(FEITO)", FEITO),
+)
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS xmls (
+    chave          TEXT PRIMARY KEY,
+    hash           TEXT NOT NULL,
+    nf             TEXT NOT NULL,
+    nome           TEXT NOT NULL,
+    caminho        TEXT NOT NULL,
+    drive_id       TEXT,
+    status         TEXT NOT NULL,
+    motivo         TEXT,
+    arquivado      INTEGER NOT NULL DEFAULT 0,
+    atualizado_em  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_xmls_nf     ON xmls(nf);
+CREATE INDEX IF NOT EXISTS idx_xmls_hash   ON xmls(hash);
+CREATE INDEX IF NOT EXISTS idx_xmls_nome   ON xmls(nome);
+CREATE INDEX IF NOT EXISTS idx_xmls_status ON xmls(status);
+
+CREATE TABLE IF NOT EXISTS referencias_produto (
+    cnpj_emitente  TEXT NOT NULL,
+    referencia     TEXT NOT NULL,   -- normalizada (até ZEROS_TOLERADOS zeros à esquerda a menos)
+    codigo         TEXT NOT NULL,   -- código do produto no SGI
+    produto        TEXT,
+    vezes          INTEGER NOT NULL DEFAULT 1,
+    atualizado_em  TEXT NOT NULL,
+    PRIMARY KEY (cnpj_emitente, referencia)
+);
+
+CREATE TABLE IF NOT EXISTS importacoes_sgi (
+    chave          TEXT PRIMARY KEY,   -- chave de acesso (nº de NF se repete entre fornecedores)
+    nf             TEXT NOT NULL,
+    sgi_id         TEXT NOT NULL,
+    caminho_url    TEXT NOT NULL,
+    atualizado_em  TEXT NOT NULL
+);
+"""
+
+
+def hash_arquivo(caminho: str, algoritmo: str = "sha256") -> str:
+    h = hashlib.new(algoritmo)
+    with open(caminho, "rb") as fh:
+        for bloco in iter(lambda: fh.read(1 << 16), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def identificar_nfe(caminho: str):
+    """(chave de acesso, nNF) lidos do próprio XML — independe do nome do arquivo."""
+    from app.nfe_parser import ler_nfe
+    nota = ler_nfe(caminho)
+    return nota.chave, nota.numero
+
+
+# zeros à esquerda que a vinculação aceita de diferença entre referência e código
+# (regra de `codigos_equivalentes`, que usa esta constante)
+ZEROS_TOLERADOS = 2
+
+
+def normalizar_referencia(ref: str) -> str:
+    """Referência sem espaços e sem até ZEROS_TOLERADOS zeros à esquerda ('0012' → '12', '00012' → '012')."""
+    ref = (ref or "").strip()
+    return re.sub(r"^0{1,%d}" % ZEROS_TOLERADOS, "", ref) or ref
+
+
+def nome_original(nome_arquivo: str) -> str:
+    """Remove os sufixos de estado legados do nome."""
+    return re.sub(r"\((FEITO|JA_IMPORTADO)(_TMP)?\)", "", nome_arquivo, flags=re.IGNORECASE).strip()
+
+
+class CatalogoXML:
+    """Índice SQLite dos XMLs locais. Thread-safe (uma conexão + lock)."""
+
+    def __init__(self, caminho_db: str, pasta_xml: str):
+        self.pasta_xml = pasta_xml
+        self.pasta_arquivo = os.path.join(pasta_xml, "arquivo")
+        os.makedirs(os.path.dirname(caminho_db) or ".", exist_ok=True)
+        self.lock = threading.RLock()
+        self.con = sqlite3.connect(caminho_db, check_same_thread=False, isolation_level=None)
+        self.con.row_factory = sqlite3.Row
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.executescript(_ESQUEMA)
+        self.consultas_ref = self.acertos_ref = 0   # uso do índice de referências nesta execução
+        self._importar_legado()
+
+    # ---------- escrita ----------
+    def registrar(self, caminho: str, drive_id: str = None, status: str = BAIXADO,
+                  nome: str = None) -> sqlite3.Row:
+        """
+        Indexa o XML em `caminho`. Se a chave já existir, só atualiza o
+        caminho/hash — o status de um XML já processado é preservado, exceto
+        REJEITADO com conteúdo novo (XML corrigido e baixado de novo), que
+        volta a BAIXADO para passar outra vez pela pré-validação.
+        """
+        chave, nf = identificar_nfe(caminho)
+        digest = hash_arquivo(caminho)
+        chave = chave or f"SEM_CHAVE_{digest[:32]}"
+        agora = datetime.now().isoformat(timespec="seconds")
+        with self.lock:
+            self.con.execute(
+                """INSERT INTO xmls (chave, hash, nf, nome, caminho, drive_id, status, atualizado_em)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(chave) DO UPDATE SET
+                       status = CASE WHEN xmls.status = ? AND xmls.hash != excluded.hash
+                                     THEN ? ELSE xmls.status END,
+                       motivo = CASE WHEN xmls.status = ? AND xmls.hash != excluded.hash
+                                     THEN NULL ELSE xmls.motivo END,
+                       hash = excluded.hash, caminho = excluded.caminho,
+                       drive_id = COALESCE(excluded.drive_id, xmls.drive_id),
+                       atualizado_em = excluded.atualizado_em""",
+                (chave, digest, nf, nome or nome_original(os.path.basename(caminho)),
+                 caminho, drive_id, status, agora, REJEITADO, BAIXADO, REJEITADO),
+            )
+            return self.por_chave(chave)
+
+    def marcar(self, chave: str, status: str, motivo: str = None):
+        with self.lock:
+            self.con.execute("UPDATE xmls SET status = ?, motivo = ?, atualizado_em = ? WHERE chave = ?",
+                             (status, motivo, datetime.now().isoformat(timespec="seconds"), chave))
+
+    def arquivar(self, chave: str):
+        """
+        Move o XML concluído para `<pasta>/arquivo/` e atualiza o caminho. Se
+        já há um arquivo com o mesmo nome (outro XML), a chave entra no nome.
+        """
+        with self.lock:
+            reg = self.por_chave(chave)
+            if reg is None or reg["arquivado"]:
+                return
+            os.makedirs(self.pasta_arquivo, exist_ok=True)
+            destino = os.path.join(self.pasta_arquivo, reg["nome"])
+            if os.path.exists(destino):
+                raiz, ext = os.path.splitext(reg["nome"])
+                destino = os.path.join(self.pasta_arquivo, f"{raiz}_{chave}{ext}")
+            if os.path.exists(reg["caminho"]):
+                shutil.move(reg["caminho"], destino)
+            self.con.execute("UPDATE xmls SET caminho = ?, arquivado = 1 WHERE chave = ?", (destino, chave))
+
+    def registrar_importacao(self, chave: str, nf: str, sgi_id, caminho_url: str):
+        """Grava no índice a importação do SGI conferida para o XML `chave`."""
+        agora = datetime.now().isoformat(timespec="seconds")
+        with self.lock:
+            self.con.execute(
+                """INSERT INTO importacoes_sgi (chave, nf, sgi_id, caminho_url, atualizado_em) VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(chave) DO UPDATE SET nf = excluded.nf, sgi_id = excluded.sgi_id,
+                       caminho_url = excluded.caminho_url, atualizado_em = excluded.atualizado_em""",
+                (chave, str(nf), str(sgi_id), caminho_url, agora),
+            )
+
+    def esquecer_importacao(self, chave: str):
+        with self.lock:
+            self.con.execute("DELETE FROM importacoes_sgi WHERE chave = ?", (chave,))
+
+    def aprender_referencias(self, cnpj_emitente: str, pares: dict):
+        """Grava {referência do fornecedor: (código SGI, nome do produto)} de itens vinculados."""
+        agora = datetime.now().isoformat(timespec="seconds")
+        linhas = [(cnpj_emitente or "", normalizar_referencia(ref), str(cod), prod, agora)
+                  for ref, (cod, prod) in pares.items() if normalizar_referencia(ref) and cod]
+        with self.lock:
+            self.con.executemany(
+                """INSERT INTO referencias_produto (cnpj_emitente, referencia, codigo, produto, atualizado_em)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(cnpj_emitente, referencia) DO UPDATE SET
+                       vezes = CASE WHEN referencias_produto.codigo = excluded.codigo
+                                    THEN referencias_produto.vezes + 1 ELSE 1 END,
+                       codigo = excluded.codigo, produto = excluded.produto,
+                       atualizado_em = excluded.atualizado_em""",
+                linhas,
+            )
+
+    # ---------- consultas ----------
+    def produto_da_referencia(self, cnpj_emitente: str, ref: str):
+        """
+        Linha (codigo, produto, vezes) aprendida para a referência do
+        fornecedor, ou None. `vezes` = vinculações seguidas com o mesmo código.
+        """
+        achado = self._um("SELECT codigo, produto, vezes FROM referencias_produto "
+                          "WHERE cnpj_emitente = ? AND referencia = ?",
+                          cnpj_emitente or "", normalizar_referencia(ref))
+        with self.lock:
+            self.consultas_ref += 1
+            self.acertos_ref += achado is not None
+        return achado
+
+    def resumo_referencias(self) -> str:
+        taxa = 100 * self.acertos_ref / self.consultas_ref if self.consultas_ref else 0
+        with self.lock:
+            total = self.con.execute("SELECT COUNT(*) FROM referencias_produto").fetchone()[0]
+        return (f"{self.acertos_ref}/{self.consultas_ref} consulta(s) resolvidas ({taxa:.0f}%), "
+                f"{total} referência(s) no índice")
+
+    def importacao_sgi(self, chave: str):
+        """Linha (sgi_id, caminho_url) da importação do XML `chave` no SGI, ou None."""
+        return self._um("SELECT sgi_id, caminho_url FROM importacoes_sgi WHERE chave = ?", chave)
+
+    def _um(self, sql: str, *args):
+        with self.lock:
+            return self.con.execute(sql, args).fetchone()
+
+    def por_chave(self, chave: str):
+        return self._um("SELECT * FROM xmls WHERE chave = ?", chave)
+
+    def por_nome(self, nome: str):
+        return self._um("SELECT * FROM xmls WHERE nome = ?", nome)
+
+    def por_nf(self, nf: str):
+        """
+        Registro da NF (igualdade exata: NF 123 ≠ 1234). Se o número se repete
+        (outro fornecedor/série), vale o XML ainda em processamento; entre os
+        demais, o mais recente.
+        """
+        return self._um("SELECT * FROM xmls WHERE nf = ? "
+                        "ORDER BY status IN (?, ?), atualizado_em DESC LIMIT 1", nf, FEITO, REJEITADO)
+
+    def com_status(self, *status) -> list:
+        marcadores = ",".join("?" * len(status))
+        with self.lock:
+            return self.con.execute(
+                f"SELECT * FROM xmls WHERE status IN ({marcadores}) ORDER BY nf", status
+            ).fetchall()
+
+    def caminhos(self) -> set:
+        with self.lock:
+            return {r["caminho"] for r in self.con.execute("SELECT caminho FROM xmls")}
+
+    # ---------- migração ----------
+    def _importar_legado(self):
+        """Indexa XMLs da pasta que ainda não estão no catálogo (estado vem do sufixo)."""
+        if not os.path.isdir(self.pasta_xml):
+            return
+        conhecidos = self.caminhos()
+        novos = 0
+        for nome in sorted(os.listdir(self.pasta_xml)):
+            caminho = os.path.join(self.pasta_xml, nome)
+            if not nome.lower().endswith(".xml") or caminho in conhecidos or not os.path.isfile(caminho):
+                continue
+            status = next((st for suf, st in _SUFIXOS_LEGADOS if suf.lower() in nome.lower()), BAIXADO)
+            try:
+                self.registrar(caminho, status=status)
+                novos += 1
+            except Exception as e:
+                logging.warning(f"⚠️ Catálogo: {nome} ignorado ({e})")
+        if novos:
+            logging.info(f"🗂️ Catálogo: {novos} XML(s) da pasta local indexado(s).")
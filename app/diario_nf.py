@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+diario_nf.py
+Diário (SQLite) do pipeline por NF: importar → vincular → entrada → boleto → renomear.
+1) Cada XML entra pela chave de acesso (`reservar`); cada transição de
+   etapa (INICIADA / resultado) é gravada na hora
+2) `proxima_etapa(chave)` diz onde o XML parou: uma execução reiniciada
+   continua cada NF a partir da última etapa concluída
+3) ERRO que deve ser refeito (`falhar`) não conclui a etapa; os demais
+   resultados (`concluir`) encerram a etapa mesmo sem sucesso
+4) Nº de NF repetido com outra chave (outra série / outro emitente) é
+   acusado em `reservar`; os dois XMLs seguem, só a colisão é relatada
+Usa o mesmo arquivo do catálogo (CATALOGO_DB), em tabelas próprias.
+"""
+import sqlite3
+import threading
+from datetime import datetime
+
+IMPORTAR  = "IMPORTAR XML"
+VINCULAR  = "VINCULAR PRODUTOS"
+ENTRADA   = "GERAR ENTRADA"
+BOLETO    = "GERAR BOLETO"
+RENOMEAR  = "RENOMEAR"
+ETAPAS    = (IMPORTAR, VINCULAR, ENTRADA, BOLETO, RENOMEAR)
+
+INICIADA  = "INICIADA"
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS diario_nf (
+    chave          TEXT PRIMARY KEY,
+    nf             TEXT NOT NULL,
+    concluida      TEXT,            -- última etapa concluída (NULL = nenhuma)
+    atualizado_em  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_diario_nf ON diario_nf(nf);
+CREATE TABLE IF NOT EXISTS diario_transicoes (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    chave      TEXT NOT NULL,
+    etapa      TEXT NOT NULL,
+    resultado  TEXT NOT NULL,
+    execucao   TEXT NOT NULL,
+    em         TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transicoes_chave ON diario_transicoes(chave, etapa);
+"""
+
+def _agora():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class DiarioNF:
+    """Thread-safe (uma conexão + lock), como o CatalogoXML."""
+
+    def __init__(self, caminho_db: str):
+        self.lock = threading.RLock()
+        self.con = sqlite3.connect(caminho_db, check_same_thread=False, isolation_level=None)
+        self.con.row_factory = sqlite3.Row
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.executescript(_ESQUEMA)
+        self.execucao = _agora()
+
+    # ---------- escrita ----------
+    def reservar(self, chave: str, nf: str):
+        """
+        Registra o XML `chave` (NF `nf`) no diário, se ainda não estiver.
+        Devolve a chave de OUTRO XML já registrado com o mesmo nº de NF (o
+        XML segue mesmo assim; quem chama relata a colisão), ou None.
+        """
+        with self.lock:
+            self.con.execute("BEGIN IMMEDIATE")
+            try:
+                outra = self.con.execute("SELECT chave FROM diario_nf WHERE nf = ? AND chave != ? LIMIT 1",
+                                         (nf, chave)).fetchone()
+                self.con.execute("INSERT OR IGNORE INTO diario_nf (chave, nf, atualizado_em) VALUES (?, ?, ?)",
+                                 (chave, nf, _agora()))
+                self.con.execute("COMMIT")
+            except Exception:
+                self.con.execute("ROLLBACK")
+                raise
+        return outra["chave"] if outra else None
+
+    def iniciar(self, chave: str, etapa: str):
+        self._transicao(chave, etapa, INICIADA)
+
+    def concluir(self, chave: str, etapa: str, resultado: str = "OK"):
+        """Etapa encerrada (com ou sem erro): o XML não volta a ela."""
+        self._transicao(chave, etapa, resultado, concluida=etapa)
+
+    def falhar(self, chave: str, etapa: str, resultado: str = "ERRO"):
+        """Etapa com erro que deve ser refeita na próxima execução."""
+        self._transicao(chave, etapa, resultado)
+
+    def _transicao(self, chave, etapa, resultado, concluida=None):
+        """Exige `reservar` antes (é ele que cria a linha do XML)."""
+        agora = _agora()
+        with self.lock:
+            self.con.execute("BEGIN IMMEDIATE")
+            try:
+                self.con.execute(
+                    "INSERT INTO diario_transicoes (chave, etapa, resultado, execucao, em) VALUES (?, ?, ?, ?, ?)",
+                    (chave, etapa, resultado, self.execucao, agora))
+                self.con.execute(
+                    "UPDATE diario_nf SET concluida = COALESCE(?, concluida), atualizado_em = ? WHERE chave = ?",
+                    (concluida, agora, chave))
+                self.con.execute("COMMIT")
+            except Exception:
+                self.con.execute("ROLLBACK")
+                raise
+
+    # ---------- consultas ----------
+    def proxima_etapa(self, chave: str):
+        """Etapa a executar para o XML (a 1ª se nunca começou; None se terminou)."""
+        with self.lock:
+            row = self.con.execute("SELECT concluida FROM diario_nf WHERE chave = ?", (chave,)).fetchone()
+        if row is None or row["concluida"] is None:
+            return ETAPAS[0]
+        i = ETAPAS.index(row["concluida"]) + 1
+        return ETAPAS[i] if i < len(ETAPAS) else None
+
+    def ultimo_resultado(self, chave: str, etapa: str):
+        """Resultado mais recente (de qualquer execução) da etapa, fora INICIADA."""
+        with self.lock:
+            row = self.con.execute(
+                """SELECT resultado FROM diario_transicoes
+                   WHERE chave = ? AND etapa = ? AND resultado != ? ORDER BY id DESC LIMIT 1""",
+                (chave, etapa, INICIADA)).fetchone()
+        return row["resultado"] if row else None
+
+    def na_etapa(self, etapa: str) -> list:
+        """[(chave, nf)] dos XMLs cuja próxima etapa é `etapa`."""
+        i = ETAPAS.index(etapa)
+        with self.lock:
+            if i == 0:
+                rows = self.con.execute("SELECT chave, nf FROM diario_nf WHERE concluida IS NULL ORDER BY nf")
+            else:
+                rows = self.con.execute("SELECT chave, nf FROM diario_nf WHERE concluida = ? ORDER BY nf",
+                                        (ETAPAS[i - 1],))
+            return [(r["chave"], r["nf"]) for r in rows]
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+drive_download.py
+Download concorrente e em streaming dos XMLs do Google Drive:
+1) Pool de threads limitado (DRIVE_DOWNLOAD_WORKERS), um cliente Drive por thread
+2) Cada arquivo vai direto para o disco em blocos (MediaIoBaseDownload)
+3) Escrita atômica: arquivo temporário .part + rename só depois de conferir o md5Checksum
+"""
+import os
+import time
+import hashlib
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from app.google_exec import chamar
+
+WORKERS    = int(os.environ.get("DRIVE_DOWNLOAD_WORKERS", "4"))
+CHUNK_SIZE = int(os.environ.get("DRIVE_DOWNLOAD_CHUNK_KB", "256")) * 1024
+
+
+class ChecksumInvalido(Exception):
+    pass
+
+
+class _EscritorComHash:
+    """Arquivo de saída que calcula o MD5 enquanto os blocos são gravados."""
+
+    def __init__(self, fh):
+        self.fh = fh
+        self.md5 = hashlib.md5()
+
+    def write(self, dados):
+        self.md5.update(dados)
+        return self.fh.write(dados)
+
+
+def baixar_arquivo(drive, f: dict, destino: str, chunk: int = CHUNK_SIZE) -> float:
+    """
+    Baixa o arquivo `f` ({id, name, md5Checksum?}) para `destino`.
+    Retorna o tempo gasto (s). Em erro, nada fica em `destino`.
+    """
+    from googleapiclient.http import MediaIoBaseDownload
+
+    inicio = time.monotonic()
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(destino), prefix=".", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            saida = _EscritorComHash(fh)
+            dl = MediaIoBaseDownload(saida, drive.files().get_media(fileId=f["id"]), chunksize=chunk)
+            pronto = False
+            while not pronto:
+                _status, pronto = chamar(dl.next_chunk, "drive")
+        esperado = f.get("md5Checksum")
+        if esperado and saida.md5.hexdigest() != esperado:
+            raise ChecksumInvalido(f"md5 {saida.md5.hexdigest()} ≠ {esperado}")
+        os.replace(tmp, destino)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return time.monotonic() - inicio
+
+
+def baixar_lote(drive_fn, arquivos: list, pasta: str, workers: int = WORKERS):
+    """
+    Baixa `arquivos` em paralelo para `pasta`. `drive_fn()` devolve o cliente
+    Drive da thread atual (ex.: app.google_clients.drive).
+    Retorna [(arquivo, destino, erro|None)] na ordem de término.
+    """
+    def _um(f):
+        destino = os.path.join(pasta, f["name"])
+        segundos = baixar_arquivo(drive_fn(), f, destino)
+        kb = os.path.getsize(destino) / 1024
+        logging.info(f"⬇️ Baixado {f['name']} ({kb:.0f} KB em {segundos:.2f}s)")
+        return destino
+
+    resultados = []
+    inicio = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="drive-dl") as pool:
+        futuros = {pool.submit(_um, f): f for f in arquivos}
+        for fut in as_completed(futuros):
+            f = futuros[fut]
+            try:
+                resultados.append((f, fut.result(), None))
+            except Exception as e:
+                logging.warning(f"⚠️ Falha ao baixar {f['name']}: {e}")
+                resultados.append((f, None, e))
+    if arquivos:
+        ok = sum(1 for _f, _d, erro in resultados if erro is None)
+        logging.info(f"⬇️ Drive: {ok}/{len(arquivos)} arquivo(s) em {time.monotonic() - inicio:.1f}s "
+                     f"({max(1, workers)} worker(s)).")
+    return resultados
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+drive_sync.py
+Sincronização incremental da pasta de XMLs no Google Drive:
+1) Primeira execução (ou cursor inválido): listagem completa, com paginação
+2) Execuções seguintes: Changes API a partir do startPageToken salvo
+3) Arquivos vistos mas ainda não baixados ficam no estado até `confirmar()`
+4) Renomeação em lote pelo endpoint batch HTTP (até 100 por requisição;
+   cada item conta na cota do Drive)
+
+O estado (cursor + pendentes) é um JSON local. O serviço `drive` é injetado,
+então pode ser um cliente apontado para um servidor falso
+(bench/drive_mock.py; ver DRIVE_API_ENDPOINT em app.google_clients).
+"""
+import os
+import json
+import logging
+import tempfile
+from urllib.parse import urljoin
+
+from app.google_exec import executar, erro_transitorio
+
+CAMPOS_ARQUIVO = "id,name,parents,trashed,mimeType,md5Checksum,size,modifiedTime"
+MIME_PASTA     = "application/vnd.google-apps.folder"
+LOTE_MAXIMO    = 100   # limite do endpoint batch do Drive
+
+
+def listar_pasta(drive, pasta_id: str, q_extra: str = "",
+                 campos: str = CAMPOS_ARQUIVO, page_size: int = 1000):
+    """Gera TODOS os arquivos (não excluídos) da pasta, seguindo nextPageToken."""
+    q = f"'{pasta_id}' in parents and trashed = false and mimeType != '{MIME_PASTA}'"
+    if q_extra:
+        q += f" and {q_extra}"
+    token = None
+    while True:
+        resp = executar(drive.files().list(
+            q=q, fields=f"nextPageToken,files({campos})",
+            pageSize=page_size, pageToken=token
+        ), "drive")
+        yield from resp.get("files", [])
+        token = resp.get("nextPageToken")
+        if not token:
+            return
+
+
+def _xml_pendente(f: dict, pasta_id: str) -> bool:
+    nome = f.get("name", "")
+    return (
+        pasta_id in (f.get("parents") or [])
+        and not f.get("trashed")
+        and f.get("mimeType") != MIME_PASTA
+        and ".xml" in nome
+        and "(FEITO)" not in nome
+    )
+
+
+class SincronizadorDrive:
+    """
+    Descobre os XMLs pendentes da pasta do Drive sem relistar tudo a cada execução.
+    Fluxo: `arquivos = s.pendentes()` → baixa → `s.confirmar(ids_ok)`.
+    """
+
+    def __init__(self, drive, pasta_id: str, caminho_estado: str):
+        self.drive = drive
+        self.pasta_id = pasta_id
+        self.caminho_estado = caminho_estado
+        self.estado = self._carregar_estado()
+        self._novo_cursor = None
+
+    # ---------- estado ----------
+    def _carregar_estado(self) -> dict:
+        try:
+            with open(self.caminho_estado, encoding="utf-8") as fh:
+                estado = json.load(fh)
+            if estado.get("pasta") == self.pasta_id:
+                return estado
+            logging.info("ℹ️ Drive sync: pasta mudou, descartando cursor anterior.")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"⚠️ Drive sync: estado ilegível ({e}); fazendo listagem completa.")
+        return {"pasta": self.pasta_id, "cursor": None, "pendentes": {}}
+
+    def _salvar_estado(self):
+        pasta = os.path.dirname(self.caminho_estado) or "."
+        os.makedirs(pasta, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump(self.estado, fh, ensure_ascii=False)
+        os.replace(tmp, self.caminho_estado)
+
+    # ---------- consultas ----------
+    def _start_page_token(self) -> str:
+        return executar(self.drive.changes().getStartPageToken(), "drive")["startPageToken"]
+
+    def _listagem_completa(self) -> dict:
+        # cursor pego ANTES da listagem: o que mudar durante ela aparece na próxima execução
+        self._novo_cursor = self._start_page_token()
+        arquivos = {f["id"]: f for f in listar_pasta(self.drive, self.pasta_id,
+                                                     "name contains '.xml' and not name contains '(FEITO)'")}
+        logging.info(f"🔎 Drive sync: listagem completa → {len(arquivos)} XML(s) pendente(s).")
+        return arquivos
+
+    def _mudancas(self, cursor: str):
+        """Aplica as mudanças desde `cursor` sobre os pendentes conhecidos."""
+        pendentes = dict(self.estado.get("pendentes") or {})
+        token, n = cursor, 0
+        while token:
+            resp = executar(self.drive.changes().list(
+                pageToken=token, spaces="drive", pageSize=1000,
+                fields=f"nextPageToken,newStartPageToken,changes(fileId,removed,file({CAMPOS_ARQUIVO}))"
+            ), "drive")
+            for ch in resp.get("changes", []):
+                n += 1
+                f = ch.get("file")
+                if not ch.get("removed") and f and _xml_pendente(f, self.pasta_id):
+                    pendentes[ch["fileId"]] = f
+                else:
+                    pendentes.pop(ch["fileId"], None)   # apagado, movido ou já (FEITO)
+            token = resp.get("nextPageToken")
+            if resp.get("newStartPageToken"):
+                self._novo_cursor = resp["newStartPageToken"]
+        logging.info(f"🔎 Drive sync: {n} mudança(s) desde a última execução → {len(pendentes)} XML(s) pendente(s).")
+        return pendentes
+
+    def pendentes(self) -> list:
+        """XMLs pendentes da pasta (mais recentes primeiro)."""
+        from googleapiclient.errors import HttpError
+        cursor = self.estado.get("cursor")
+        arquivos = None
+        if cursor:
+            try:
+                arquivos = self._mudancas(cursor)
+            except HttpError as e:
+                if getattr(e, "resp", None) and e.resp.status in (400, 404, 410):
+                    logging.warning(f"⚠️ Drive sync: cursor inválido (HTTP {e.resp.status}); fazendo listagem completa.")
+                else:
+                    raise
+        if arquivos is None:
+            arquivos = self._listagem_completa()
+        self.estado["pendentes"] = arquivos
+        return sorted(arquivos.values(), key=lambda f: f.get("modifiedTime", ""), reverse=True)
+
+    def confirmar(self, ids_processados=()):
+        """Avança o cursor e tira da lista os arquivos já baixados."""
+        for fid in ids_processados:
+            self.estado["pendentes"].pop(fid, None)
+        if self._novo_cursor:
+            self.estado["cursor"] = self._novo_cursor
+        self._salvar_estado()
+
+
+def _novo_lote(drive, callback):
+    """
+    Batch HTTP do `drive`. O googleapiclient monta a URL do batch a partir do
+    discovery e ignora o api_endpoint, então com DRIVE_API_ENDPOINT o batch
+    vai para o mesmo servidor.
+    """
+    endpoint = os.environ.get("DRIVE_API_ENDPOINT")
+    if not endpoint:
+        return drive.new_batch_http_request(callback=callback)
+    from googleapiclient.http import BatchHttpRequest
+    return BatchHttpRequest(callback=callback, batch_uri=urljoin(endpoint, "/batch/drive/v3"))
+
+
+def renomear_em_lote(drive, renomes: dict, tamanho_lote: int = LOTE_MAXIMO) -> dict:
+    """
+    Aplica `renomes` ({file_id: novo_nome}) via batch HTTP, `tamanho_lote`
+    por requisição. Itens com erro transitório entram em mais uma rodada.
+    Retorna {file_id: erro} dos que falharam.
+    """
+    falhas, pendentes = {}, dict(renomes)
+    for _rodada in range(2):
+        repetir = {}
+        ids = list(pendentes)
+        for i in range(0, len(ids), tamanho_lote):
+            def _cb(request_id, _resp, exc):
+                if exc is None:
+                    return
+                if erro_transitorio(exc):
+                    repetir[request_id] = pendentes[request_id]
+                else:
+                    falhas[request_id] = exc
+            lote, ids_lote = _novo_lote(drive, _cb), ids[i:i + tamanho_lote]
+            for fid in ids_lote:
+                lote.add(drive.files().update(fileId=fid, body={"name": pendentes[fid]},
+                                              fields="id,name"), request_id=fid)
+            executar(lote, "drive", custo=len(ids_lote))
+        if not repetir:
+            break
+        pendentes = repetir
+    else:
+        for fid in repetir:
+            falhas[fid] = RuntimeError("erro transitório persistente")
+    return falhas
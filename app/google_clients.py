@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+google_clients.py
+Fábrica única de clientes Google (Sheets/Drive), construída sobre google_sheets_auth:
+1) Credenciais memoizadas por conjunto de escopos (a chave é lida uma vez)
+2) Access token em disco até expirar (GOOGLE_TOKEN_CACHE_DIR), reaproveitado entre execuções
+3) Discovery estático (documento embutido no googleapiclient, sem download)
+4) Um cliente HTTP autorizado por thread (httplib2 não é thread-safe)
+5) GOOGLE_CREDENCIAIS_ANONIMAS=1: sem Service Account nem token (só para
+   servidores falsos locais, ex.: bench/drive_mock.py com DRIVE_API_ENDPOINT)
+"""
+import os
+import json
+import hashlib
+import logging
+import threading
+import tempfile
+from datetime import datetime, timedelta
+
+import httplib2
+import google_auth_httplib2
+from google.auth.transport.requests import Request
+from googleapiclient.discovery import build
+
+from app.google_sheets_auth import load_sa_credentials
+
+SCOPES_SHEETS      = ["https://www.googleapis.com/auth/spreadsheets"]
+SCOPES_DRIVE_LEIT  = ["https://www.googleapis.com/auth/drive.readonly"]
+SCOPES_DRIVE       = ["https://www.googleapis.com/auth/drive"]
+
+TOKEN_CACHE_DIR = os.environ.get("GOOGLE_TOKEN_CACHE_DIR", "/app/creds/.tokens")
+HTTP_TIMEOUT    = int(os.environ.get("GOOGLE_HTTP_TIMEOUT", "60"))
+MARGEM_TOKEN    = timedelta(minutes=5)   # não reaproveita token a menos de 5 min de expirar
+ANONIMAS        = os.environ.get("GOOGLE_CREDENCIAIS_ANONIMAS", "0") == "1"
+
+_creds = {}                 # escopos -> Credentials
+_lock  = threading.Lock()
+_local = threading.local()  # por thread: http autorizado + serviços construídos
+
+
+def _chave(scopes) -> tuple:
+    return tuple(sorted(scopes))
+
+
+def _arquivo_token(creds, chave: tuple) -> str:
+    ident = f"{getattr(creds, 'service_account_email', '')}|{' '.join(chave)}"
+    return os.path.join(TOKEN_CACHE_DIR, hashlib.sha1(ident.encode()).hexdigest() + ".json")
+
+
+def _carregar_token(creds, caminho: str):
+    """Injeta no objeto de credenciais um token salvo que ainda está válido."""
+    try:
+        with open(caminho, encoding="utf-8") as fh:
+            salvo = json.load(fh)
+        expiry = datetime.fromisoformat(salvo["expiry"])   # UTC "ingênuo", como o google-auth usa
+        if expiry - datetime.utcnow() > MARGEM_TOKEN:
+            creds.token, creds.expiry = salvo["token"], expiry
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logging.warning(f"⚠️ Cache de token ignorado ({caminho}): {e}")
+
+
+def _salvar_token(creds, caminho: str):
+    """Grava o token de forma atômica e legível só pelo dono."""
+    try:
+        os.makedirs(TOKEN_CACHE_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=TOKEN_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump({"token": creds.token, "expiry": creds.expiry.isoformat()}, fh)
+        os.chmod(tmp, 0o600)
+        os.replace(tmp, caminho)
+    except Exception as e:
+        logging.warning(f"⚠️ Não foi possível salvar cache de token: {e}")
+
+
+def credenciais(scopes: list):
+    """
+    Credenciais do Service Account para `scopes`, carregadas uma vez por processo
+    e com access token válido (do cache em disco ou recém-obtido).
+    """
+    chave = _chave(scopes)
+    if ANONIMAS:
+        from google.auth.credentials import AnonymousCredentials
+        return AnonymousCredentials()
+    with _lock:
+        creds = _creds.get(chave)
+        if creds is None:
+            creds = load_sa_credentials(list(chave))
+            _carregar_token(creds, _arquivo_token(creds, chave))
+            _creds[chave] = creds
+        if not creds.valid:
+            creds.refresh(Request())
+            _salvar_token(creds, _arquivo_token(creds, chave))
+        return creds
+
+
+def _http(scopes: list):
+    """Cliente HTTP autorizado exclusivo da thread atual."""
+    https = getattr(_local, "https", None)
+    if https is None:
+        https = _local.https = {}
+    chave = _chave(scopes)
+    if chave not in https and ANONIMAS:
+        https[chave] = httplib2.Http(timeout=HTTP_TIMEOUT)
+    elif chave not in https:
+        https[chave] = google_auth_httplib2.AuthorizedHttp(
+            credenciais(scopes), http=httplib2.Http(timeout=HTTP_TIMEOUT)
+        )
+    return https[chave]
+
+
+def servico(api: str, versao: str, scopes: list):
+    """
+    Cliente `api`/`versao` da thread atual, construído a partir do discovery
+    estático. `<API>_API_ENDPOINT` (ex.: DRIVE_API_ENDPOINT) troca o endpoint,
+    útil para apontar para um servidor falso local.
+    """
+    servicos = getattr(_local, "servicos", None)
+    if servicos is None:
+        servicos = _local.servicos = {}
+    chave = (api, versao, _chave(scopes))
+    if chave not in servicos:
+        endpoint = os.environ.get(f"{api.upper()}_API_ENDPOINT")
+        servicos[chave] = build(
+            api, versao, http=_http(scopes),
+            static_discovery=True, cache_discovery=False,
+            client_options={"api_endpoint": endpoint} if endpoint else None,
+        )
+    return servicos[chave]
+
+
+def sheets():
+    """API `spreadsheets` do Google Sheets (thread atual)."""
+    return servico("sheets", "v4", SCOPES_SHEETS).spreadsheets()
+
+
+def drive(escrita: bool = False):
+    """API do Google Drive v3 (thread atual); `escrita=True` para renomear/alterar."""
+    return servico("drive", "v3", SCOPES_DRIVE if escrita else SCOPES_DRIVE_LEIT)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+google_exec.py
+Executor compartilhado para as requisições das APIs Google (Sheets/Drive):
+1) Limitador token-bucket por API, ajustado às cotas por minuto (um batch
+   paga uma ficha por requisição interna)
+2) Retry com backoff exponencial + jitter em 429 / 5xx / rateLimitExceeded
+3) Contadores de chamadas, retries e tempo de espera (cota e backoff)
+
+Uso: em vez de `req.execute()`, chame `executar(req, "sheets")`; para outras
+chamadas (ex.: `MediaIoBaseDownload.next_chunk`), `chamar(fn, "drive")`.
+"""
+import os
+import time
+import random
+import socket
+import logging
+import threading
+
+from app import metricas
+
+# Cotas (requisições/minuto). Padrões abaixo das cotas por usuário do Google:
+# Sheets = 60 leituras + 60 escritas/min; Drive = 12.000/min (usamos bem menos).
+COTAS_POR_MINUTO = {
+    "sheets": int(os.environ.get("SHEETS_REQ_POR_MINUTO", "60")),
+    "drive":  int(os.environ.get("DRIVE_REQ_POR_MINUTO", "600")),
+}
+
+RETRY_STATUS  = {429, 500, 502, 503, 504}
+RETRY_MOTIVOS = (b"rateLimitExceeded", b"userRateLimitExceeded")
+
+
+class TokenBucket:
+    """Token bucket simples e thread-safe (`por_minuto` fichas, rajada = 1/6 da cota)."""
+
+    def __init__(self, por_minuto: int, rajada: int = None):
+        self.taxa = por_minuto / 60.0
+        self.capacidade = max(1, rajada or por_minuto // 6)
+        self.fichas = float(self.capacidade)
+        self.ultimo = time.monotonic()
+        self.lock = threading.Lock()
+
+    def adquirir(self, n: int = 1) -> float:
+        """
+        Consome `n` fichas, dormindo o necessário. Retorna o tempo esperado (s).
+        Um custo acima da rajada espera o balde encher e deixa o saldo negativo:
+        as próximas chamadas pagam a diferença.
+        """
+        esperado = 0.0
+        minimo = min(n, self.capacidade)
+        while True:
+            with self.lock:
+                agora = time.monotonic()
+                self.fichas = min(self.capacidade, self.fichas + (agora - self.ultimo) * self.taxa)
+                self.ultimo = agora
+                if self.fichas >= minimo:
+                    self.fichas -= n
+                    return esperado
+                falta = (minimo - self.fichas) / self.taxa
+            time.sleep(falta)
+            esperado += falta
+
+
+_buckets = {}
+_lock = threading.Lock()
+
+ESTATISTICAS = {}   # api -> {"chamadas", "retries", "espera_cota_s", "espera_backoff_s"}
+
+
+def _bucket(api: str) -> TokenBucket:
+    with _lock:
+        if api not in _buckets:
+            _buckets[api] = TokenBucket(COTAS_POR_MINUTO.get(api, 60))
+            ESTATISTICAS[api] = {"chamadas": 0, "retries": 0,
+                                 "espera_cota_s": 0.0, "espera_backoff_s": 0.0}
+        return _buckets[api]
+
+
+def _contar(api: str, chave: str, valor=1):
+    with _lock:
+        ESTATISTICAS[api][chave] += valor
+
+
+def erro_transitorio(exc: Exception) -> bool:
+    from googleapiclient.errors import HttpError
+    if isinstance(exc, HttpError):
+        status = getattr(exc.resp, "status", None)
+        if status in RETRY_STATUS:
+            return True
+        return status == 403 and any(m in (exc.content or b"") for m in RETRY_MOTIVOS)
+    return isinstance(exc, (socket.timeout, ConnectionError, TimeoutError))
+
+
+def chamar(fn, api: str = "sheets", tentativas: int = 6,
+           base: float = 1.0, teto: float = 32.0, custo: int = 1):
+    """
+    Executa `fn()` respeitando a cota de `api` e repetindo com backoff
+    exponencial (full jitter) em erros transitórios.
+    `custo` = requisições que `fn()` representa na cota (ex.: itens de um batch).
+    Erros definitivos (404, 400, 403 de permissão…) sobem na primeira vez.
+    """
+    bucket = _bucket(api)
+    for tentativa in range(tentativas):
+        _contar(api, "espera_cota_s", bucket.adquirir(custo))
+        _contar(api, "chamadas", custo)
+        try:
+            with metricas.medir(f"google.{api}"):   # latência de cada chamada (inclui as que falham)
+                return fn()
+        except Exception as e:
+            if tentativa == tentativas - 1 or not erro_transitorio(e):
+                raise
+            pausa = random.uniform(0, min(teto, base * (2 ** tentativa)))
+            status = getattr(getattr(e, "resp", None), "status", None)
+            logging.warning(f"⏳ {api}: erro transitório ({e.__class__.__name__}"
+                            f"{' ' + str(status) if status else ''}) "
+                            f"— nova tentativa em {pausa:.1f}s ({tentativa + 1}/{tentativas - 1})")
+            _contar(api, "retries")
+            _contar(api, "espera_backoff_s", pausa)
+            time.sleep(pausa)
+
+
+def executar(req, api: str = "sheets", custo: int = 1, **kwargs):
+    """Atalho para `chamar(lambda: req.execute(**kwargs), api, custo=custo)`."""
+    return chamar(lambda: req.execute(**kwargs), api, custo=custo)
+
+
+def resumo() -> str:
+    """Linha de log com os contadores por API."""
+    with _lock:
+        return "; ".join(
+            f"{api}: {e['chamadas']} chamadas, {e['retries']} retries, "
+            f"{e['espera_cota_s']:.1f}s em cota, {e['espera_backoff_s']:.1f}s em backoff"
+            for api, e in sorted(ESTATISTICAS.items())
+        ) or "nenhuma chamada"
@@ -2,7 +2,7 @@
 """
 google_sheets_auth.py
 Carrega credenciais do Google Service Account de forma flexível:
-1) JSON inline via GOOGLE_SA_JSON
+1) JSON inline via GOOGLE_SA_JSON (ou GSPREAD_CREDENTIALS, nome legado)
 2) JSON base64 via GOOGLE_SA_JSON_B64
 3) Arquivo via GOOGLE_SA_JSON_PATH (padrão: /app/creds/service-account.json)
 """
@@ -19,7 +19,7 @@ def load_sa_credentials(scopes: list):
     Prioridade: GOOGLE_SA_JSON > GOOGLE_SA_JSON_B64 > GOOGLE_SA_JSON_PATH
     """
     # 1) Tenta JSON inline
-    raw = os.environ.get("GOOGLE_SA_JSON")
+    raw = os.environ.get("GOOGLE_SA_JSON") or os.environ.get("GSPREAD_CREDENTIALS", "").strip()
     if raw:
         info = json.loads(raw)
         return service_account.Credentials.from_service_account_info(info, scopes=scopes)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+metricas.py
+Tempos da execução por etapa e por NF, exportados no fim do main():
+1) `with medir("importar.arquivo", nf=nf):` cronometra um trecho; funções
+   inteiras usam o decorador `@cronometrado("sgi.login")`
+2) `contar("planilha.celulas", n)` soma contadores da execução
+3) `exportar(pasta, prom)` grava um resumo JSON (n, p50, p95, máx e total por
+   etapa + tempos por NF) e um textfile Prometheus (node_exporter
+   textfile collector), os dois com escrita atômica
+Thread-safe: os workers do SGI (sgi_pool) medem em paralelo.
+"""
+import os
+import json
+import time
+import tempfile
+import functools
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+PREFIXO_PROM = "vincular_notas"
+
+_duracoes = {}    # etapa -> [segundos]
+_erros = {}       # etapa -> nº de spans que terminaram em exceção
+_por_nf = {}      # nf -> {etapa: segundos (somados)}
+_contadores = {}  # nome -> valor
+_inicio = time.time()
+_lock = threading.Lock()
+
+
+def registrar(etapa: str, segundos: float, nf=None, erro: bool = False):
+    with _lock:
+        _duracoes.setdefault(etapa, []).append(segundos)
+        if erro:
+            _erros[etapa] = _erros.get(etapa, 0) + 1
+        if nf is not None:
+            tempos = _por_nf.setdefault(str(nf), {})
+            tempos[etapa] = tempos.get(etapa, 0.0) + segundos
+
+
+@contextmanager
+def medir(etapa: str, nf=None):
+    """Span: mede o bloco (inclusive quando ele levanta exceção)."""
+    inicio, erro = time.monotonic(), False
+    try:
+        yield
+    except BaseException:
+        erro = True
+        raise
+    finally:
+        registrar(etapa, time.monotonic() - inicio, nf, erro)
+
+
+def cronometrado(etapa: str):
+    """Decorador: a função inteira vira um span `etapa`."""
+    def decorador(fn):
+        @functools.wraps(fn)
+        def envolvida(*args, **kwargs):
+            with medir(etapa):
+                return fn(*args, **kwargs)
+        return envolvida
+    return decorador
+
+
+def contar(nome: str, valor=1):
+    with _lock:
+        _contadores[nome] = _contadores.get(nome, 0) + valor
+
+
+def _p(valores, q: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))]
+
+
+def resumo() -> dict:
+    """{"etapas": {etapa: {n, erros, p50_s, p95_s, max_s, total_s}}, "por_nf", "contadores"}."""
+    with _lock:
+        etapas = {
+            etapa: {"n": len(v), "erros": _erros.get(etapa, 0),
+                    "p50_s": round(_p(v, 0.5), 3), "p95_s": round(_p(v, 0.95), 3),
+                    "max_s": round(max(v), 3), "total_s": round(sum(v), 3)}
+            for etapa, v in sorted(_duracoes.items())
+        }
+        por_nf = {nf: {e: round(s, 3) for e, s in t.items()} for nf, t in sorted(_por_nf.items())}
+        contadores = dict(sorted(_contadores.items()))
+    return {"inicio": datetime.fromtimestamp(_inicio).isoformat(timespec="seconds"),
+            "duracao_s": round(time.time() - _inicio, 3),
+            "etapas": etapas, "por_nf": por_nf, "contadores": contadores}
+
+
+def _rotulo(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def texto_prometheus(dados: dict) -> str:
+    """Formato de exposição do Prometheus (summary por etapa + contadores da execução)."""
+    p = PREFIXO_PROM
+    linhas = [f"# HELP {p}_etapa_segundos Duração dos spans por etapa na última execução.",
+              f"# TYPE {p}_etapa_segundos summary"]
+    for etapa, e in dados["etapas"].items():
+        r = f'etapa="{_rotulo(etapa)}"'
+        linhas += [f'{p}_etapa_segundos{{{r},quantile="0.5"}} {e["p50_s"]}',
+                   f'{p}_etapa_segundos{{{r},quantile="0.95"}} {e["p95_s"]}',
+                   f'{p}_etapa_segundos_sum{{{r}}} {e["total_s"]}',
+                   f'{p}_etapa_segundos_count{{{r}}} {e["n"]}']
+    linhas += [f"# HELP {p}_etapa_erros Spans que terminaram em exceção na última execução.",
+               f"# TYPE {p}_etapa_erros gauge"]
+    linhas += [f'{p}_etapa_erros{{etapa="{_rotulo(etapa)}"}} {e["erros"]}' for etapa, e in dados["etapas"].items()]
+    linhas += [f"# HELP {p}_contador Contadores da última execução.",
+               f"# TYPE {p}_contador gauge"]
+    linhas += [f'{p}_contador{{nome="{_rotulo(n)}"}} {v}' for n, v in dados["contadores"].items()]
+    linhas += [f"# HELP {p}_execucao_segundos Duração da última execução.",
+               f"# TYPE {p}_execucao_segundos gauge",
+               f"{p}_execucao_segundos {dados['duracao_s']}",
+               f"# HELP {p}_ultima_execucao_timestamp_seconds Fim da última execução (epoch).",
+               f"# TYPE {p}_ultima_execucao_timestamp_seconds gauge",
+               f"{p}_ultima_execucao_timestamp_seconds {int(time.time())}"]
+    return "\n".join(linhas) + "\n"
+
+
+def _gravar(caminho: str, conteudo: str):
+    pasta = os.path.dirname(caminho) or "."
+    os.makedirs(pasta, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=pasta, prefix=".", suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as fh:
+        fh.write(conteudo)
+    os.chmod(tmp, 0o644)   # o node_exporter lê com outro usuário
+    os.replace(tmp, caminho)
+
+
+def exportar(pasta: str, prom: str = None) -> str:
+    """Grava `<pasta>/metricas_<início>.json` e o textfile `prom`. Devolve o caminho do JSON."""
+    dados = resumo()
+    caminho = os.path.join(pasta, f"metricas_{datetime.fromtimestamp(_inicio):%Y%m%d_%H%M%S}.json")
+    _gravar(caminho, json.dumps(dados, ensure_ascii=False, indent=1))
+    if prom:
+        _gravar(prom, texto_prometheus(dados))
+    return caminho
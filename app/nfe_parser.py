@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+nfe_parser.py
+Leitura única (streaming, via iterparse) de cada XML de NF-e para um registro
+tipado e compacto (__slots__):
+1) Chave de acesso, nNF, data de emissão, CNPJs de emitente/destinatário
+2) Itens (det/prod) com código, descrição, quantidade e desconto
+3) Duplicatas (cobr/dup) — base dos boletos
+Os registros ficam em cache por (caminho, mtime, tamanho): o mesmo arquivo
+não é relido pelas várias etapas da execução.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, date
+
+NS_NFE = "http://www.portalfiscal.inf.br/nfe"
+_NS = {"nfe": NS_NFE}
+
+CACHE_MAXIMO = 512
+
+
+def _num(txt) -> float:
+    return float((txt or "0").strip().replace(",", "."))
+
+
+class ItemNFe:
+    # desconto = det/prod/vDesc; desconto_det = vDesc filho direto de <det>
+    # (onde extrair_info_xml sempre procurou — base do fator dos boletos)
+    __slots__ = ("n_item", "codigo", "descricao", "quantidade", "valor", "desconto", "desconto_det")
+
+    def __init__(self, n_item, codigo, descricao, quantidade, valor, desconto, desconto_det=0.0):
+        self.n_item, self.codigo, self.descricao = n_item, codigo, descricao
+        self.quantidade, self.valor, self.desconto = quantidade, valor, desconto
+        self.desconto_det = desconto_det
+
+    def __repr__(self):
+        return f"ItemNFe({self.n_item}, {self.codigo!r}, qtd={self.quantidade}, desc={self.desconto})"
+
+
+class Duplicata:
+    __slots__ = ("numero", "vencimento", "valor")
+
+    def __init__(self, numero, vencimento: date, valor: float):
+        self.numero, self.vencimento, self.valor = numero, vencimento, valor
+
+    def __repr__(self):
+        return f"Duplicata({self.numero!r}, {self.vencimento}, {self.valor})"
+
+
+class NotaFiscal:
+    __slots__ = ("chave", "numero", "emissao", "cnpj_emitente", "cnpj_destinatario",
+                 "itens", "duplicatas")
+
+    def __init__(self, chave, numero, emissao: date, cnpj_emitente, cnpj_destinatario,
+                 itens: tuple, duplicatas: tuple):
+        self.chave, self.numero, self.emissao = chave, numero, emissao
+        self.cnpj_emitente, self.cnpj_destinatario = cnpj_emitente, cnpj_destinatario
+        self.itens, self.duplicatas = itens, duplicatas
+
+    def __repr__(self):
+        return (f"NotaFiscal(nf={self.numero!r}, chave={self.chave!r}, emissao={self.emissao}, "
+                f"{len(self.itens)} itens, {len(self.duplicatas)} dup)")
+
+    @property
+    def data_emissao_br(self) -> str:
+        return self.emissao.strftime("%d/%m/%Y")
+
+    @property
+    def tem_desconto(self) -> bool:
+        """Mesma regra de extrair_info_xml: vDesc > 0 direto em <det> (não em det/prod)."""
+        return any(it.desconto_det > 0 for it in self.itens)
+
+    @property
+    def fator_desconto(self) -> int:
+        """Notas de FEIRA / MOSTRUÁRIO (com desconto) são lançadas ×3."""
+        return 3 if self.tem_desconto else 1
+
+    def parcelas_sgi(self) -> list:
+        """Duplicatas já ajustadas pelo fator e formatadas para o SGI (vírgula, dd/mm/aaaa)."""
+        fator = self.fator_desconto
+        return [
+            {"nDup": d.numero,
+             "vDup": f"{d.valor * fator:.2f}".replace(".", ","),
+             "dVenc": d.vencimento.strftime("%d/%m/%Y")}
+            for d in self.duplicatas
+        ]
+
+
+def _data(txt) -> date:
+    return datetime.strptime(txt.strip()[:10], "%Y-%m-%d").date()
+
+
+def _texto(el, caminho, padrao=""):
+    achado = el.find(caminho, _NS) if el is not None else None
+    return achado.text.strip() if achado is not None and achado.text else padrao
+
+
+_T = lambda nome: f"{{{NS_NFE}}}{nome}"
+T_INF, T_IDE, T_EMIT, T_DEST, T_DET, T_DUP, T_PROD = map(
+    _T, ("infNFe", "ide", "emit", "dest", "det", "dup", "prod"))
+_CAMPOS_PROD = {_T(c): c for c in ("cProd", "xProd", "qCom", "vProd", "vDesc")}
+T_VDESC = _T("vDesc")
+
+
+def _item(det) -> ItemNFe:
+    # uma passada pelos filhos de <prod>, em vez de um find() por campo
+    campos = {}
+    vdesc_det = det.find(T_VDESC)
+    prod = det.find(T_PROD)
+    if prod is not None:
+        for filho in prod:
+            nome = _CAMPOS_PROD.get(filho.tag)
+            if nome:
+                campos[nome] = (filho.text or "").strip()
+    return ItemNFe(
+        int(det.get("nItem", "0")),
+        campos.get("cProd", ""),
+        campos.get("xProd", ""),
+        _num(campos.get("qCom")),
+        _num(campos.get("vProd")),
+        _num(campos.get("vDesc")),
+        _num(vdesc_det.text) if vdesc_det is not None else 0.0,
+    )
+
+
+def _eventos(caminho: str):
+    """iterparse só com eventos "end"; quem consome limpa cada bloco logo após o uso."""
+    import xml.etree.ElementTree as ET
+    return ET.iterparse(caminho, events=("end",))
+
+
+def iterar_itens(caminho: str):
+    """Gera os itens (det) um a um, sem montar a árvore do documento."""
+    for _evento, el in _eventos(caminho):
+        if el.tag == T_DET:
+            yield _item(el)
+            el.clear()
+
+
+def _parse(caminho: str) -> NotaFiscal:
+    chave = numero = emissao = None
+    cnpj_emit = cnpj_dest = ""
+    itens, duplicatas = [], []
+    for _evento, el in _eventos(caminho):
+        tag = el.tag
+        if tag == T_DET:
+            itens.append(_item(el))
+        elif tag == T_DUP:
+            duplicatas.append(Duplicata(_texto(el, "nfe:nDup"), _data(_texto(el, "nfe:dVenc")),
+                                        _num(_texto(el, "nfe:vDup"))))
+        elif tag == T_IDE and numero is None:
+            numero = _texto(el, "nfe:nNF")
+            emissao = _texto(el, "nfe:dhEmi") or _texto(el, "nfe:dEmi")
+        elif tag == T_EMIT:
+            cnpj_emit = _texto(el, "nfe:CNPJ")
+        elif tag == T_DEST:
+            cnpj_dest = _texto(el, "nfe:CNPJ") or _texto(el, "nfe:CPF")
+        elif tag == T_INF and chave is None:
+            chave = re.sub(r"\D", "", el.get("Id", ""))
+            break   # o resto (assinatura, protNFe) não interessa
+        else:
+            continue
+        el.clear()   # det/dup já lidos: sobra só o elemento vazio na árvore
+
+    nome = os.path.basename(caminho)
+    if chave is None:
+        raise ValueError(f"{nome}: infNFe não encontrado (namespace {NS_NFE}?)")
+    if not numero:
+        raise ValueError(f"{nome}: ide/nNF ausente")
+    return NotaFiscal(chave, numero, _data(emissao), cnpj_emit, cnpj_dest,
+                      tuple(itens), tuple(duplicatas))
+
+
+_cache = OrderedDict()   # (caminho, mtime_ns, tamanho) -> NotaFiscal
+_lock = threading.Lock()
+
+
+def ler_nfe(caminho: str) -> NotaFiscal:
+    """NotaFiscal do XML em `caminho`, do cache enquanto o arquivo não mudar."""
+    st = os.stat(caminho)
+    chave = (os.path.abspath(caminho), st.st_mtime_ns, st.st_size)
+    with _lock:
+        nota = _cache.get(chave)
+        if nota is not None:
+            _cache.move_to_end(chave)
+            return nota
+    nota = _parse(caminho)
+    with _lock:
+        _cache[chave] = nota
+        while len(_cache) > CACHE_MAXIMO:
+            _cache.popitem(last=False)
+    return nota
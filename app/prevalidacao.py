@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+prevalidacao.py
+Pré-validação local dos XMLs antes do upload no SGI (sem navegador):
+1) XML bem-formado e no namespace da NF-e
+2) Chave de acesso com 44 dígitos, modelo 55, DV (módulo 11) e nNF coerentes
+3) CNPJ do destinatário entre os aceitos (CNPJS_DESTINATARIO, opcional)
+Qualquer outro erro ao ler um arquivo o classifica como XML MALFORMADO (um
+arquivo ruim não derruba a pré-validação dos demais). Chave já importada não
+é rejeitada aqui: a importação reabre a existente no SGI e segue dela.
+Só os aptos seguem para o Selenium; os demais saem classificados no relatório.
+"""
+import os
+import re
+import shutil
+import logging
+
+from app import catalogo_xml
+from app.nfe_parser import NS_NFE, ler_nfe
+
+# CNPJs (só dígitos, separados por vírgula) aceitos como destinatário; vazio = não confere
+CNPJS_DESTINATARIO = {
+    re.sub(r"\D", "", c) for c in os.environ.get("CNPJS_DESTINATARIO", "").split(",") if c.strip()
+}
+
+# Motivos de reprovação
+MALFORMADO      = "XML MALFORMADO"
+NAMESPACE       = "NAMESPACE INVÁLIDO"
+CHAVE_INVALIDA  = "CHAVE INVÁLIDA"
+CNPJ_DIVERGENTE = "CNPJ DIVERGENTE"
+
+
+class Resultado:
+    __slots__ = ("caminho", "nf", "chave", "motivo")
+
+    def __init__(self, caminho, nf="", chave="", motivo=None):
+        self.caminho, self.nf, self.chave, self.motivo = caminho, nf, chave, motivo
+
+    @property
+    def apto(self) -> bool:
+        return self.motivo is None
+
+    def __repr__(self):
+        return f"Resultado({os.path.basename(self.caminho)!r}, nf={self.nf!r}, motivo={self.motivo!r})"
+
+
+def dv_chave(chave43: str) -> str:
+    """Dígito verificador da chave de acesso (módulo 11, pesos 2..9)."""
+    soma = sum(int(d) * (2 + i % 8) for i, d in enumerate(reversed(chave43)))
+    resto = soma % 11
+    return "0" if resto < 2 else str(11 - resto)
+
+
+def problema_chave(chave: str, nf: str):
+    """Descrição do problema da chave, ou None se ela é coerente com a nota."""
+    if not re.fullmatch(r"\d{44}", chave or ""):
+        return f"{len(chave or '')} dígitos"
+    if chave[20:22] != "55":
+        return f"modelo {chave[20:22]}"
+    if dv_chave(chave[:43]) != chave[43]:
+        return "dígito verificador"
+    if nf.isdigit() and int(chave[25:34]) != int(nf):
+        return f"nNF {int(chave[25:34])} ≠ {nf}"
+    return None
+
+
+def _namespace_raiz(caminho: str) -> str:
+    """Namespace do elemento raiz (lê só o primeiro evento do arquivo)."""
+    import xml.etree.ElementTree as ET
+    for _evento, el in ET.iterparse(caminho, events=("start",)):
+        return el.tag[1:].split("}", 1)[0] if el.tag.startswith("{") else ""
+    return ""
+
+
+def validar(caminho: str) -> Resultado:
+    try:
+        return _validar(caminho)
+    except Exception as e:
+        return Resultado(caminho, motivo=f"{MALFORMADO} ({e.__class__.__name__}: {e})")
+
+
+def _validar(caminho: str) -> Resultado:
+    import xml.etree.ElementTree as ET
+    try:
+        nota = ler_nfe(caminho)
+    except (ET.ParseError, OSError) as e:
+        return Resultado(caminho, motivo=f"{MALFORMADO} ({e})")
+    except ValueError as e:
+        # bem-formado mas sem infNFe/nNF: o namespace errado é o caso comum
+        ns = _namespace_raiz(caminho)
+        if ns != NS_NFE:
+            return Resultado(caminho, motivo=f"{NAMESPACE} ({ns or 'sem namespace'})")
+        return Resultado(caminho, motivo=f"{MALFORMADO} ({e})")
+
+    res = Resultado(caminho, nota.numero, nota.chave)
+    problema = problema_chave(nota.chave, nota.numero)
+    if problema:
+        res.motivo = f"{CHAVE_INVALIDA} ({problema})"
+    elif CNPJS_DESTINATARIO and nota.cnpj_destinatario not in CNPJS_DESTINATARIO:
+        res.motivo = f"{CNPJ_DIVERGENTE} ({nota.cnpj_destinatario or 'sem CNPJ'})"
+    return res
+
+
+def prevalidar(catalogo, registros) -> tuple:
+    """
+    Valida os registros BAIXADO do catálogo e os XMLs da pasta que nem
+    chegaram a ser indexados (ilegíveis). Retorna (aptos, rejeitados):
+    `aptos` são os registros do catálogo, `rejeitados` são Resultado.
+    Reprovados indexados viram REJEITADO; os sem índice vão para `rejeitados/`.
+    """
+    aptos, rejeitados = [], []
+    for reg in registros:
+        res = validar(reg["caminho"])
+        if res.apto:
+            aptos.append(reg)
+            continue
+        res.nf, res.chave = res.nf or reg["nf"], reg["chave"]
+        catalogo.marcar(reg["chave"], catalogo_xml.REJEITADO, res.motivo)
+        rejeitados.append(res)
+
+    conhecidos = catalogo.caminhos()
+    pasta = catalogo.pasta_xml
+    for nome in sorted(os.listdir(pasta)) if os.path.isdir(pasta) else ():
+        caminho = os.path.join(pasta, nome)
+        if nome.lower().endswith(".xml") and os.path.isfile(caminho) and caminho not in conhecidos:
+            res = validar(caminho)
+            if res.apto:
+                continue   # legível mas fora do catálogo: será indexado na próxima abertura
+            destino = os.path.join(pasta, "rejeitados")
+            os.makedirs(destino, exist_ok=True)
+            shutil.move(caminho, os.path.join(destino, nome))
+            rejeitados.append(res)
+
+    for res in rejeitados:
+        logging.warning(f"🚫 Pré-validação: {os.path.basename(res.caminho)} → {res.motivo}")
+    logging.info(f"🧪 Pré-validação: {len(aptos)} apto(s), {len(rejeitados)} rejeitado(s).")
+    return aptos, rejeitados
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+sgi_autocomplete.py
+IDs já resolvidos dos autocompletes (typeahead) fixos do cadastro de títulos:
+1) Na primeira vez o campo é preenchido do jeito normal (digita + sugestão) e o
+   id gravado no input oculto é lido e guardado num JSON local
+2) Nos títulos seguintes, id e texto são escritos direto nos inputs (sem
+   esperar sugestões do servidor)
+3) Cada id vale por SGI_AUTOCOMPLETE_TTL_H horas; vencido, é resolvido de novo.
+   Se um título falhar ao salvar, o cache é descartado (`limpar()`)
+"""
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+
+TTL_S = float(os.environ.get("SGI_AUTOCOMPLETE_TTL_H", "24")) * 3600
+
+_JS_LER = """
+var vis = document.getElementById(arguments[0]);
+var oculto = document.getElementById(arguments[1]);
+if (!oculto && vis && vis.parentElement) {
+    var grupo = vis.closest('.form-group') || vis.parentElement;
+    oculto = grupo.querySelector('input[type="hidden"]');
+}
+return (vis && oculto) ? {id: oculto.value, texto: vis.value, oculto: oculto.id || oculto.name} : null;
+"""
+
+_JS_DEFINIR = """
+var vis = document.getElementById(arguments[0]);
+var oculto = document.getElementById(arguments[1]) || document.getElementsByName(arguments[1])[0];
+if (!vis || !oculto) { return false; }
+var disparar = function (el, tipo) { el.dispatchEvent(new Event(tipo, {bubbles: true})); };
+oculto.value = arguments[2];
+vis.value = arguments[3];
+disparar(oculto, 'change');
+disparar(vis, 'change');
+return true;
+"""
+
+
+def campo_oculto(campo_id: str) -> str:
+    """autocompletar_tipo_titulo_id → tipo_titulo_id (convenção dos formulários do SGI)."""
+    return campo_id.replace("autocompletar_", "", 1)
+
+
+class CacheAutocomplete:
+    def __init__(self, caminho: str, ttl: float = TTL_S):
+        self.caminho, self.ttl = caminho, ttl
+        self.lock = threading.Lock()   # compartilhado pelos workers do SGI
+        try:
+            with open(caminho, encoding="utf-8") as fh:
+                self.dados = json.load(fh)
+        except FileNotFoundError:
+            self.dados = {}
+        except Exception as e:
+            logging.warning(f"⚠️ Autocomplete: cache ilegível ({e}); resolvendo de novo.")
+            self.dados = {}
+
+    @staticmethod
+    def _chave(campo_id, digitado):
+        return f"{campo_id}|{digitado}"
+
+    def obter(self, campo_id, digitado):
+        item = self.dados.get(self._chave(campo_id, digitado))
+        if item and time.time() - item.get("resolvido_em", 0) < self.ttl and item.get("id"):
+            return item
+        return None
+
+    def guardar(self, campo_id, digitado, id_, texto, oculto):
+        with self.lock:
+            self.dados[self._chave(campo_id, digitado)] = {
+                "id": id_, "texto": texto, "oculto": oculto, "resolvido_em": time.time()}
+            self._salvar()
+
+    def limpar(self):
+        with self.lock:
+            if self.dados:
+                logging.info("🧹 Autocomplete: cache de IDs descartado.")
+            self.dados = {}
+            self._salvar()
+
+    def _salvar(self):
+        pasta = os.path.dirname(self.caminho) or "."
+        os.makedirs(pasta, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump(self.dados, fh, ensure_ascii=False)
+        os.replace(tmp, self.caminho)
+
+
+def ler(driver, campo_id: str):
+    """{"id", "texto", "oculto"} do autocomplete já preenchido, ou None."""
+    return driver.execute_script(_JS_LER, campo_id, campo_oculto(campo_id))
+
+
+def definir(driver, campo_id: str, item: dict) -> bool:
+    """Escreve id (input oculto) e texto (input visível) sem abrir sugestões."""
+    return bool(driver.execute_script(_JS_DEFINIR, campo_id, item.get("oculto") or campo_oculto(campo_id),
+                                      item["id"], item["texto"]))
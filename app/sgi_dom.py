@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+sgi_dom.py
+Leitura de tabelas do SGI com UM execute_script por tabela, em vez de um
+find_element/.text por célula (cada um é uma ida e volta ao chromedriver):
+1) `tabela()`: linhas do <tbody> como dicionários JSON (id, textos das
+   células, células por data-title, produto, estado dos ícones de vínculo)
+2) Atalhos para as tabelas usadas no fluxo: itens da importação de XML e
+   produtos da tela de entrada
+3) Preenchimento em lote da quantidade por local de estocagem (inputs
+   data-local_id das linhas) e, numa chamada separada — depois que o JS do
+   SGI reagiu aos eventos —, a leitura de volta para validação
+4) Edição em lote de células de grades editáveis (duplo clique → editor
+   inline → valor → Enter/blur), disparando os próprios eventos da grade
+"""
+
+_JS_TABELA = """
+var tabela = document.getElementById(arguments[0]);
+if (!tabela) { return null; }
+var texto = function (el) { return el ? (el.innerText || el.textContent || '').trim() : ''; };
+return Array.prototype.map.call(tabela.querySelectorAll(':scope > tbody > tr'), function (tr, i) {
+    var porTitulo = {};
+    Array.prototype.forEach.call(tr.cells, function (td) {
+        var t = td.getAttribute('data-title');
+        if (t) { porTitulo[t] = texto(td); }
+    });
+    return {
+        indice: i,
+        id: tr.id || '',
+        celulas: Array.prototype.map.call(tr.cells, texto),
+        por_titulo: porTitulo,
+        produto: texto(tr.querySelector('td.coluna-produto')),
+        vinculado: !!tr.querySelector('span[class*="glyphicon-check"]'),
+        pendente: !!tr.querySelector('span[class*="glyphicon-edit"]')
+    };
+});
+"""
+
+_JS_QTDE_LOCAL = """
+var tabela = document.getElementById(arguments[0]), local = arguments[1], qtdes = arguments[2];
+if (!tabela) { return null; }
+var disparar = function (el, tipo) { el.dispatchEvent(new Event(tipo, {bubbles: true})); };
+return Array.prototype.map.call(tabela.querySelectorAll(':scope > tbody > tr'), function (tr, i) {
+    var inp = tr.querySelector('input[data-local_id="' + local + '"]');
+    if (!inp || qtdes[i] === null || qtdes[i] === undefined) { return false; }
+    inp.value = qtdes[i];
+    disparar(inp, 'input');
+    disparar(inp, 'change');
+    return true;
+});
+"""
+
+_JS_QTDE_LOCAL_LER = """
+var tabela = document.getElementById(arguments[0]), local = arguments[1];
+if (!tabela) { return null; }
+return Array.prototype.map.call(tabela.querySelectorAll(':scope > tbody > tr'), function (tr) {
+    var inp = tr.querySelector('input[data-local_id="' + local + '"]');
+    return inp ? inp.value : null;
+});
+"""
+
+_JS_EDITAR_CELULAS = """
+var tabela = document.getElementById(arguments[0]), edicoes = arguments[1];
+if (!tabela) { return null; }
+var linhas = tabela.querySelectorAll(':scope > tbody > tr');
+var disparar = function (el, tipo) { el.dispatchEvent(new Event(tipo, {bubbles: true})); };
+var enter = function (el) {
+    if (window.jQuery) {
+        jQuery(el).trigger(jQuery.Event('keydown', {which: 13, keyCode: 13}));
+    } else {
+        el.dispatchEvent(new KeyboardEvent('keydown', {key: 'Enter', bubbles: true}));
+    }
+};
+return edicoes.map(function (e) {
+    var tr = linhas[e.linha];
+    if (!tr) { return false; }
+    var td = tr.cells[e.coluna < 0 ? tr.cells.length + e.coluna : e.coluna];
+    if (!td) { return false; }
+    td.dispatchEvent(new MouseEvent('dblclick', {bubbles: true, cancelable: true, view: window}));
+    var inp = td.querySelector(e.seletor);
+    if (!inp) { return false; }
+    inp.focus();
+    inp.value = e.valor;
+    disparar(inp, 'input');
+    disparar(inp, 'change');
+    enter(inp);
+    inp.blur();
+    disparar(inp, 'focusout');
+    return true;
+});
+"""
+
+_JS_VALORES = """
+var tabela = document.getElementById(arguments[0]);
+if (!tabela) { return null; }
+return Array.prototype.map.call(tabela.querySelectorAll(':scope > tbody > tr'), function (tr) {
+    return Array.prototype.map.call(tr.cells, function (td) {
+        var inp = td.querySelector('input:not([type="hidden"])');
+        return (inp ? inp.value : (td.innerText || td.textContent || '')).trim();
+    });
+});
+"""
+
+TABELA_ITENS_IMPORTACAO = "lista_itens_importacao_xml_nfe"
+TABELA_PRODUTOS_ENTRADA = "tabela_de_produtos"
+
+
+def tabela(driver, tabela_id: str) -> list:
+    """Linhas do <tbody> de `tabela_id` (lista vazia se a tabela não existe)."""
+    return driver.execute_script(_JS_TABELA, tabela_id) or []
+
+
+def numero_br(txt, padrao=0.0) -> float:
+    """'1.234,56' → 1234.56 (valor padrão se não for número)."""
+    try:
+        return float((txt or "").strip().replace(".", "").replace(",", "."))
+    except ValueError:
+        return padrao
+
+
+def itens_importacao(driver) -> list:
+    """
+    Itens da importação de XML: dicts com `id`, `produto`, `referencia`
+    (Referência Fornecedor), `vinculado` (✓) e `pendente` (✏️).
+    """
+    itens = []
+    for ln in tabela(driver, TABELA_ITENS_IMPORTACAO):
+        if not ln["id"].startswith("xml_nfe_"):
+            continue
+        ln["referencia"] = ln["por_titulo"].get("Referência Fornecedor", "")
+        itens.append(ln)
+    return itens
+
+
+def produtos_entrada(driver) -> list:
+    """Produtos da tela de entrada: acrescenta `qtde_nota` (5ª coluna) e `desconto` (10ª)."""
+    linhas = tabela(driver, TABELA_PRODUTOS_ENTRADA)
+    for ln in linhas:
+        cel = ln["celulas"]
+        ln["qtde_nota"] = cel[4] if len(cel) > 4 else ""
+        ln["desconto"] = numero_br(cel[9]) if len(cel) > 9 else 0.0
+    return linhas
+
+
+def preencher_qtde_local(driver, local_id, qtdes, tabela_id: str = TABELA_PRODUTOS_ENTRADA) -> list:
+    """
+    Escreve `qtdes[i]` no input data-local_id=`local_id` de cada linha, numa
+    chamada só (dispara input/change para o JS da página). Devolve, por linha,
+    se o input existia e foi preenchido. A conferência é com `qtde_local`,
+    depois que o SGI processou os eventos.
+    """
+    return driver.execute_script(_JS_QTDE_LOCAL, tabela_id, str(local_id), list(qtdes)) or []
+
+
+def qtde_local(driver, local_id, tabela_id: str = TABELA_PRODUTOS_ENTRADA) -> list:
+    """Valor atual do input data-local_id=`local_id` de cada linha (None se a linha não tem)."""
+    return driver.execute_script(_JS_QTDE_LOCAL_LER, tabela_id, str(local_id)) or []
+
+
+def editar_celulas(driver, tabela_id: str, edicoes: list) -> list:
+    """
+    Aplica `edicoes` ([{"linha", "coluna", "seletor", "valor"}], coluna < 0
+    conta do fim) numa chamada só. Devolve, por edição, se o editor inline
+    apareceu e recebeu o valor.
+    """
+    return driver.execute_script(_JS_EDITAR_CELULAS, tabela_id, edicoes) or []
+
+
+def valores_tabela(driver, tabela_id: str) -> list:
+    """Valor de cada célula do <tbody> (o do input, se a célula estiver em edição)."""
+    return driver.execute_script(_JS_VALORES, tabela_id) or []
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+sgi_espera.py
+Esperas por condição (no lugar de time.sleep fixo) para as telas do SGI:
+1) Condições explícitas: página carregada, AJAX ocioso (jQuery.active),
+   mudança de URL, bootbox fechado, a primeira de várias (`qualquer`)
+2) Timeout adaptativo por rótulo: múltiplo do p95 das esperas já medidas,
+   entre um piso e o teto informado na chamada. Esperas pela resposta de
+   uma escrita (`confirmacao=True`: salvar, importar) nunca ficam abaixo do
+   teto — uma resposta lenta do SGI não pode virar ERRO de algo que gravou
+3) Duração de cada espera no log: DEBUG, ou INFO a partir de LENTA_S (inclusive
+   timeouts); resumo por rótulo no fim (`resumo()`)
+
+Uso: `esperar(driver, url_contem("/entrada"), "entrada.salvar", teto=15, confirmacao=True)`.
+Selenium é importado só na primeira espera.
+"""
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+POLL_S      = 0.1
+AMOSTRAS    = 50                                                  # janela por rótulo
+FATOR_P95   = float(os.environ.get("SGI_ESPERA_FATOR_P95", "4"))  # timeout = fator × p95
+PISO_S      = float(os.environ.get("SGI_ESPERA_PISO_S", "3"))
+LENTA_S     = float(os.environ.get("SGI_ESPERA_LENTA_S", "5"))       # espera lenta: log em INFO
+
+_medidas = {}   # rótulo -> deque de durações (s) das esperas que deram certo
+_contagem = {}  # rótulo -> {"ok", "timeout", "total_s"}
+_lock = threading.Lock()
+
+
+def _p(valores, q: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))]
+
+
+def timeout_para(rotulo: str, teto: float, confirmacao: bool = False) -> float:
+    """
+    Teto até haver 5 medidas; depois FATOR_P95 × p95, limitado a [PISO_S, teto].
+    Em `confirmacao` a adaptação só alonga: max(teto, FATOR_P95 × p95).
+    """
+    with _lock:
+        medidas = list(_medidas.get(rotulo, ()))
+    if len(medidas) < 5:
+        return teto
+    adaptado = FATOR_P95 * _p(medidas, 0.95)
+    if confirmacao:
+        return max(teto, adaptado)
+    return max(min(PISO_S, teto), min(teto, adaptado))
+
+
+def _registrar(rotulo: str, segundos: float, ok: bool):
+    with _lock:
+        if ok:
+            _medidas.setdefault(rotulo, deque(maxlen=AMOSTRAS)).append(segundos)
+        c = _contagem.setdefault(rotulo, {"ok": 0, "timeout": 0, "total_s": 0.0})
+        c["ok" if ok else "timeout"] += 1
+        c["total_s"] += segundos
+
+
+def _logar(rotulo: str, gasto: float, limite: float, ok: bool):
+    lenta = gasto >= LENTA_S
+    logging.log(logging.INFO if lenta else logging.DEBUG,
+                f"⏱️ espera {'lenta ' if lenta else ''}{rotulo}: "
+                f"{'' if ok else 'TIMEOUT após '}{gasto:.2f}s (limite {limite:.1f}s)")
+
+
+def esperar(driver, condicao, rotulo: str, teto: float = 15, confirmacao: bool = False):
+    """
+    `WebDriverWait(driver, t).until(condicao)` com t adaptativo; devolve o valor
+    da condição. Em TimeoutException a duração também é contada e o erro sobe.
+    `confirmacao=True` para a resposta de uma escrita no SGI (t ≥ teto).
+    """
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.common.exceptions import TimeoutException
+
+    limite = timeout_para(rotulo, teto, confirmacao)
+    inicio = time.monotonic()
+    try:
+        valor = WebDriverWait(driver, limite, poll_frequency=POLL_S).until(condicao)
+    except TimeoutException:
+        gasto = time.monotonic() - inicio
+        _registrar(rotulo, gasto, False)
+        _logar(rotulo, gasto, limite, False)
+        raise
+    gasto = time.monotonic() - inicio
+    _registrar(rotulo, gasto, True)
+    _logar(rotulo, gasto, limite, True)
+    return valor
+
+
+def tentar(driver, condicao, rotulo: str, teto: float = 5, confirmacao: bool = False):
+    """Como `esperar`, mas devolve None no timeout (condições opcionais)."""
+    from selenium.common.exceptions import TimeoutException
+    try:
+        return esperar(driver, condicao, rotulo, teto, confirmacao)
+    except TimeoutException:
+        return None
+
+
+def resumo() -> str:
+    """Linha de log: n, p50, p95 e total por rótulo (os mais caros primeiro)."""
+    with _lock:
+        linhas = []
+        for rotulo, c in sorted(_contagem.items(), key=lambda kv: -kv[1]["total_s"]):
+            medidas = _medidas.get(rotulo) or [0.0]
+            linhas.append(f"{rotulo}: {c['ok']} ok/{c['timeout']} timeout, "
+                          f"p50 {_p(medidas, 0.5):.2f}s, p95 {_p(medidas, 0.95):.2f}s, total {c['total_s']:.1f}s")
+    return "; ".join(linhas) or "nenhuma espera"
+
+
+# ---------- condições (recebem o driver, devolvem valor verdadeiro quando prontas) ----------
+def ajax_ocioso(driver):
+    """Documento carregado e nenhuma requisição jQuery em curso."""
+    return driver.execute_script(
+        "return document.readyState === 'complete' && (!window.jQuery || jQuery.active === 0);")
+
+
+def url_contem(trecho: str):
+    return lambda driver: trecho in driver.current_url
+
+
+def url_muda(url_anterior: str):
+    return lambda driver: driver.current_url != url_anterior
+
+
+def bootbox_fechado(driver):
+    return not driver.execute_script(
+        "return Array.prototype.some.call(document.querySelectorAll('.bootbox.modal'),"
+        " function (m) { return m.offsetParent !== null; });")
+
+
+def qualquer(**condicoes):
+    """Primeira condição satisfeita: devolve (nome, valor)."""
+    def _cond(driver):
+        for nome, cond in condicoes.items():
+            try:
+                valor = cond(driver)
+            except Exception:
+                continue
+            if valor:
+                return nome, valor
+        return False
+    return _cond
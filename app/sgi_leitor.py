@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+sgi_leitor.py
+Leitura das páginas do SGI por HTTP simples (requests + BeautifulSoup),
+com os cookies da sessão aberta pelo Selenium:
+1) Lista de importações de XML (NF → ids/URLs das importações), todas as
+   páginas (links da paginação resolvidos contra a página atual)
+2) Tela de login no lugar da página pedida → SessaoExpirada (quem chama
+   refaz o login no navegador e cria outro leitor)
+O navegador fica só com as ações que escrevem no SGI. A URL base vem de
+SGI_URL_BASE (app.sgi_sessao), então o leitor também funciona contra um
+servidor local que sirva HTML gravado do SGI.
+"""
+import re
+import logging
+from urllib.parse import urljoin, urlparse
+
+from app.sgi_sessao import URL_BASE
+
+CAMINHO_IMPORTACOES = "/importacoes_xml_nfe"
+RE_ID_IMPORTACAO    = re.compile(r"/importacoes_xml_nfe/(\d+)")
+PAGINAS_MAXIMO      = 200
+
+
+class SessaoExpirada(Exception):
+    """O SGI devolveu a tela de login: os cookies do leitor não valem mais."""
+
+
+class LeitorSGI:
+    def __init__(self, cookies=(), user_agent=None, base=URL_BASE, timeout=15):
+        import requests
+        self.base, self.timeout = base, timeout
+        self.http = requests.Session()
+        if user_agent:
+            self.http.headers["User-Agent"] = user_agent
+        for c in cookies:
+            self.http.cookies.set(c["name"], c["value"], domain=c.get("domain"), path=c.get("path", "/"))
+        self._importacoes = None   # nf -> [(sgi_id, caminho_url, chave)] (cache da listagem)
+        self.url_atual = None
+
+    @classmethod
+    def do_driver(cls, driver, **kwargs):
+        """Leitor com os cookies e o User-Agent do navegador já logado."""
+        return cls(driver.get_cookies(), driver.execute_script("return navigator.userAgent;"), **kwargs)
+
+    # ---------- HTTP ----------
+    def pagina(self, caminho: str):
+        """
+        BeautifulSoup da página (`caminho` relativo à base ou URL completa);
+        SessaoExpirada se o SGI devolveu a tela de login. A URL final (após
+        redirecionamentos) fica em `self.url_atual`.
+        """
+        from bs4 import BeautifulSoup
+        resp = self.http.get(urljoin(self.base + "/", caminho.lstrip("/")), timeout=self.timeout)
+        resp.raise_for_status()
+        self.url_atual = resp.url
+        sopa = BeautifulSoup(resp.content, "html.parser")   # bs4 detecta o charset dos bytes
+        if sopa.find(id="usuario") is not None and sopa.find(attrs={"name": "senha"}) is not None:
+            raise SessaoExpirada(f"{caminho}: redirecionado para o login")
+        return sopa
+
+    # ---------- consultas ----------
+    @staticmethod
+    def _proxima_pagina(sopa, url_atual: str):
+        """URL absoluta da próxima página (href como '?page=2' vale para a página atual)."""
+        a = sopa.find("a", attrs={"rel": "next"}) or sopa.select_one(".pagination .next a, li.next a")
+        return urljoin(url_atual, a["href"]) if a is not None and a.get("href") else None
+
+    def importacoes(self, recarregar=False) -> dict:
+        """
+        {nº NF-e: [(id da importação, caminho da URL, chave de acesso)]} de
+        TODAS as páginas da lista de importações de XML (segue o link "próxima"
+        da paginação). O mesmo número pode ter várias importações (fornecedores
+        diferentes); a chave fica "" quando a lista não a mostra.
+        """
+        if self._importacoes is None or recarregar:
+            links, vistas = {}, set()
+            url = urljoin(self.base + "/", CAMINHO_IMPORTACOES.lstrip("/"))
+            while url and url not in vistas and len(vistas) < PAGINAS_MAXIMO:
+                vistas.add(url)
+                sopa = self.pagina(url)
+                for tr in sopa.find_all("tr"):
+                    td = tr.find("td", attrs={"data-title": "Número NF-e"})
+                    a_nf = td.find("a") if td else None
+                    a = tr.find("a", href=True)   # 1º link da linha, como o XPath antigo
+                    m = RE_ID_IMPORTACAO.search(a["href"]) if a else None
+                    if a_nf and m:
+                        td_chave = tr.find("td", attrs={"data-title": "Chave de Acesso"})
+                        chave = re.sub(r"\D", "", td_chave.get_text()) if td_chave else ""
+                        links.setdefault(a_nf.get_text(strip=True), []).append(
+                            (m.group(1), urlparse(a["href"]).path, chave))
+                url = self._proxima_pagina(sopa, self.url_atual)
+            self._importacoes = links
+            logging.info(f"🔗 SGI leitor: {sum(map(len, links.values()))} importação(ões) "
+                         f"em {len(vistas)} página(s).")
+        return self._importacoes
+
+    def links_importacao(self, nf: str, chave: str = None, recarregar=False) -> list:
+        """
+        URLs das importações listadas com o nº `nf` (a mais recente primeiro).
+        Com `chave`, as de chave igual vêm à frente e as de outra chave saem.
+        Lista vazia = a NF não está na lista.
+        """
+        candidatos = [(i, caminho) for i, caminho, ch in self.importacoes(recarregar).get(str(nf), [])
+                      if not (chave and ch and ch != chave)]
+        if chave:
+            por_chave = {caminho for _i, caminho, ch in self.importacoes().get(str(nf), []) if ch == chave}
+            candidatos.sort(key=lambda c: c[1] not in por_chave)
+        return [urljoin(self.base + "/", caminho.lstrip("/")) for _i, caminho in candidatos]
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+sgi_pool.py
+Pool de sessões Chrome headless para o SGI:
+1) N navegadores isolados (perfil, pasta de download e porta de depuração próprios),
+   abertos e logados em paralelo
+2) Cada etapa distribui as NFs numa fila: o worker livre pega a próxima
+3) Vazão por worker e por etapa no log (`relatorio()`)
+N vem de SGI_WORKERS (padrão 1 = comportamento sequencial de antes) e é o
+teto de sessões simultâneas no SGI.
+"""
+import os
+import time
+import queue
+import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+WORKERS = max(1, int(os.environ.get("SGI_WORKERS", "1")))
+
+
+class WorkerSGI:
+    __slots__ = ("indice", "driver", "etapas")
+
+    def __init__(self, indice, driver):
+        self.indice, self.driver = indice, driver
+        self.etapas = {}   # etapa -> [itens, segundos, erros]
+
+    def contar(self, etapa, segundos, erro=False):
+        e = self.etapas.setdefault(etapa, [0, 0.0, 0])
+        e[0] += 1
+        e[1] += segundos
+        e[2] += int(erro)
+
+
+class PoolSGI:
+    """
+    `criar_driver(indice)` abre o navegador do worker; `preparar(driver)` faz o login.
+    As etapas são funções de lote do fluxo — `fn(driver, itens) -> list` — chamadas
+    com um item por vez em cada worker; os resultados são concatenados.
+    """
+
+    def __init__(self, n, criar_driver, preparar):
+        self.n = max(1, n)
+        self.criar_driver, self.preparar = criar_driver, preparar
+        self.workers = []
+
+    def abrir(self):
+        def _um(indice):
+            driver = self.criar_driver(indice)
+            try:
+                self.preparar(driver)
+            except Exception:
+                _encerrar(driver)
+                raise
+            return WorkerSGI(indice, driver)
+
+        inicio = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.n, thread_name_prefix="sgi-abrir") as ex:
+            futuros = [ex.submit(_um, i) for i in range(self.n)]
+        erros = []
+        for fut in futuros:
+            try:
+                self.workers.append(fut.result())
+            except Exception as e:
+                erros.append(e)
+                logging.warning(f"⚠️ SGI pool: worker não abriu ({e})")
+        if not self.workers:
+            raise erros[0]
+        logging.info(f"🧵 SGI pool: {len(self.workers)}/{self.n} sessão(ões) logada(s) "
+                     f"em {time.monotonic() - inicio:.1f}s.")
+        return self
+
+    def mapear(self, etapa, fn, itens) -> list:
+        """Executa `fn(driver, [item])` para cada item, repartindo entre os workers."""
+        itens = list(itens)
+        if not itens:
+            return []
+        fila = queue.Queue()
+        for pos, item in enumerate(itens):
+            fila.put((pos, item))
+        saidas = [None] * len(itens)
+
+        def _loop(w):
+            while True:
+                try:
+                    pos, item = fila.get_nowait()
+                except queue.Empty:
+                    return
+                inicio = time.monotonic()
+                try:
+                    saidas[pos] = fn(w.driver, [item]) or []
+                    w.contar(etapa, time.monotonic() - inicio)
+                except Exception:
+                    logging.exception(f"💥 {etapa} (worker {w.indice}): falha em {item!r}")
+                    saidas[pos] = []
+                    w.contar(etapa, time.monotonic() - inicio, erro=True)
+
+        inicio = time.monotonic()
+        if len(self.workers) == 1:
+            _loop(self.workers[0])
+        else:
+            threads = [threading.Thread(target=_loop, args=(w,), name=f"sgi-{w.indice}")
+                       for w in self.workers]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        logging.info(f"🧵 {etapa}: {len(itens)} item(ns) em {time.monotonic() - inicio:.1f}s "
+                     f"com {len(self.workers)} worker(s).")
+        return [r for parte in saidas for r in parte]
+
+    def relatorio(self) -> str:
+        linhas = []
+        for w in self.workers:
+            for etapa, (n, seg, erros) in w.etapas.items():
+                linhas.append(f"worker {w.indice} {etapa}: {n} em {seg:.1f}s "
+                              f"({60 * n / seg if seg else 0:.1f}/min, {erros} erro(s))")
+        return "; ".join(linhas) or "nenhum item processado"
+
+    def fechar(self):
+        for w in self.workers:
+            _encerrar(w.driver)
+        self.workers = []
+
+
+def _encerrar(driver):
+    """Fecha o navegador e apaga o perfil único da execução."""
+    try:
+        driver.quit()
+    except Exception:
+        pass
+    prof = getattr(driver, "_lebebe_profile_dir", None)
+    if prof and os.path.isdir(prof):
+        shutil.rmtree(prof, ignore_errors=True)
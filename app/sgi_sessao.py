@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+sgi_sessao.py
+Reaproveitamento da sessão autenticada do SGI entre execuções:
+1) Após um login completo, os cookies do navegador vão para um JSON local
+   (permissão 0600, escrita atômica) — um arquivo por worker do pool, para
+   cada navegador manter a sua própria sessão no SGI
+2) Na próxima execução, `restaurar()` injeta esses cookies no driver novo e
+   confere a sessão com UMA requisição (fetch sem seguir redirecionamento;
+   um 200 que é a tela de login não conta)
+3) Só se a sessão expirou o login completo é feito de novo
+"""
+import os
+import json
+import time
+import logging
+import tempfile
+from urllib.parse import urlparse
+
+# SGI_URL_BASE permite apontar para um servidor de testes com HTML gravado do SGI
+URL_BASE      = os.environ.get("SGI_URL_BASE", "https://smart.sgisistemas.com.br").rstrip("/")
+URL_VALIDACAO = URL_BASE + "/home"            # logado: 200 sem o formulário de login
+URL_LEVE      = URL_BASE + "/favicon.ico"     # só para o navegador "entrar" no domínio
+
+_JS_STATUS = """
+var pronto = arguments[arguments.length - 1];
+fetch(arguments[0], {credentials: 'include', redirect: 'manual', cache: 'no-store'})
+    .then(function (r) {
+        if (r.type === 'opaqueredirect') { pronto(302); return; }
+        return r.text().then(function (html) {
+            // a tela de login (mesmo critério do LeitorSGI) às vezes vem com 200
+            var login = /id=["']usuario["']/.test(html) && /name=["']senha["']/.test(html);
+            pronto(login ? 401 : r.status);
+        });
+    })
+    .catch(function () { pronto(-1); });
+"""
+
+
+def caminho_do_worker(caminho: str, indice: int) -> str:
+    """Arquivo de cookies do worker `indice` (o 0 usa o próprio `caminho`)."""
+    if not indice:
+        return caminho
+    raiz, ext = os.path.splitext(caminho)
+    return f"{raiz}.{indice}{ext}"
+
+
+def _no_dominio(driver):
+    """Garante uma página do SGI aberta (cookies e fetch exigem a mesma origem)."""
+    if not driver.current_url.startswith(URL_BASE):
+        driver.get(URL_LEVE)
+
+
+def sessao_valida(driver, timeout: float = 10) -> bool:
+    """Uma requisição à /home com os cookies atuais: 200 sem a tela de login = sessão ativa."""
+    try:
+        _no_dominio(driver)
+        driver.set_script_timeout(timeout)
+        status = driver.execute_async_script(_JS_STATUS, URL_VALIDACAO)
+    except Exception as e:
+        logging.debug(f"SGI sessão: validação falhou ({e})")
+        return False
+    return status == 200
+
+
+def salvar(driver, caminho: str):
+    """Grava os cookies do SGI em `caminho` (0600, substituição atômica)."""
+    host = urlparse(URL_BASE).hostname or ""
+    cookies = [c for c in driver.get_cookies() if c.get("domain", "").lstrip(".") in host]
+    pasta = os.path.dirname(caminho) or "."
+    os.makedirs(pasta, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=pasta, prefix=".", suffix=".tmp")   # mkstemp já cria com 0600
+    with os.fdopen(fd, "w", encoding="utf-8") as fh:
+        json.dump({"salvo_em": time.time(), "cookies": cookies}, fh)
+    os.replace(tmp, caminho)
+    logging.info(f"🍪 SGI sessão: {len(cookies)} cookie(s) salvos para a próxima execução.")
+
+
+def restaurar(driver, caminho: str) -> bool:
+    """Injeta os cookies salvos e confere a sessão. False = fazer login completo."""
+    try:
+        with open(caminho, encoding="utf-8") as fh:
+            cookies = json.load(fh).get("cookies") or []
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        logging.warning(f"⚠️ SGI sessão: cookies ilegíveis ({e}); fazendo login completo.")
+        return False
+
+    agora = time.time()
+    validos = [c for c in cookies if not c.get("expiry") or c["expiry"] > agora]
+    if not validos:
+        return False
+    _no_dominio(driver)
+    for c in validos:
+        if c.get("sameSite") not in ("Strict", "Lax", "None"):
+            c.pop("sameSite", None)
+        try:
+            driver.add_cookie(c)
+        except Exception as e:
+            logging.debug(f"SGI sessão: cookie {c.get('name')} recusado ({e})")
+    if sessao_valida(driver):
+        logging.info("🍪 SGI sessão: cookies reaproveitados — login dispensado.")
+        return True
+    logging.info("🍪 SGI sessão: sessão salva expirou; fazendo login completo.")
+    driver.delete_all_cookies()
+    return False
+
@@ -16,44 +16,72 @@ ID_PASTA_GOOGLE_DRIVE   = os.environ.get("ID_PASTA_GOOGLE_DRIVE", "")
 LOGS_DIR        = os.environ.get("LOGS_DIR", "/app/logs")
 DOWNLOAD_DIR    = os.environ.get("DOWNLOAD_DIR", "/app/downloads")
 PASTA_LOCAL_XML = os.path.join(DOWNLOAD_DIR, "xml")
-
-# Criar diretórios necessários
-os.makedirs(LOGS_DIR, exist_ok=True)
-os.makedirs(PASTA_LOCAL_XML, exist_ok=True)
+DRIVE_SYNC_ESTADO = os.environ.get("DRIVE_SYNC_ESTADO", os.path.join(DOWNLOAD_DIR, ".drive_sync.json"))
+CATALOGO_DB     = os.environ.get("CATALOGO_DB", os.path.join(DOWNLOAD_DIR, "catalogo_xml.sqlite3"))
+SGI_COOKIES     = os.environ.get("SGI_COOKIES", os.path.join(DOWNLOAD_DIR, ".sgi_cookies.json"))
+SGI_AUTOCOMPLETE_CACHE = os.environ.get("SGI_AUTOCOMPLETE_CACHE", os.path.join(DOWNLOAD_DIR, ".sgi_autocomplete.json"))
+METRICAS_DIR    = os.environ.get("METRICAS_DIR", os.path.join(LOGS_DIR, "metricas"))
+METRICAS_PROM   = os.environ.get("METRICAS_PROM", os.path.join(METRICAS_DIR, "vincular_notas.prom"))
+
+def _preparar_diretorios():
+    """Cria os diretórios necessários (chamado na execução, não no import)."""
+    os.makedirs(LOGS_DIR, exist_ok=True)
+    os.makedirs(PASTA_LOCAL_XML, exist_ok=True)
 
 # =========================================
 # Sessão 1.0 – Bibliotecas
 # =========================================
-import re, time, glob, logging
+# Só a stdlib é importada aqui: Selenium, googleapiclient e ElementTree são
+# carregados sob demanda, então importar o módulo não faz I/O nem exige credenciais.
+import re, time, logging, atexit, threading
+from collections import Counter
 from datetime import datetime as dt
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait, Select
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import ElementClickInterceptedException
-from selenium.webdriver.chrome.service import Service
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-import xml.etree.ElementTree as ET
+from app import metricas
+
+# Preenchidos por _carregar_selenium()
+webdriver = By = Keys = WebDriverWait = Select = EC = Service = ActionChains = None
+ElementClickInterceptedException = ElementNotInteractableException = None
+
+def _carregar_selenium():
+    """Importa o Selenium na primeira vez que um navegador é necessário."""
+    global webdriver, By, Keys, WebDriverWait, Select, EC, Service, ActionChains
+    global ElementClickInterceptedException, ElementNotInteractableException
+    if webdriver is not None:
+        return
+    from selenium import webdriver as _webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.common.keys import Keys
+    from selenium.webdriver.support.ui import WebDriverWait, Select
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.common.action_chains import ActionChains
+    from selenium.common.exceptions import ElementClickInterceptedException, ElementNotInteractableException
+    webdriver = _webdriver
 
 # =========================================
 # Sessão 1.1 – Logging
 # =========================================
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(os.path.join(LOGS_DIR, dt.now().strftime("log_%Y-%m-%d_%H-%M-%S.txt")), encoding="utf-8"),
-        logging.FileHandler(os.path.join(LOGS_DIR, "latest.log"), encoding="utf-8"),
-        logging.StreamHandler(),  # stdout
-    ],
-)
+def _configurar_logging():
+    """Arquivo da execução + latest.log + stdout. Idempotente."""
+    raiz = logging.getLogger()
+    if getattr(raiz, "_lebebe_configurado", False):
+        return
+    _preparar_diretorios()
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        handlers=[
+            logging.FileHandler(os.path.join(LOGS_DIR, dt.now().strftime("log_%Y-%m-%d_%H-%M-%S.txt")), encoding="utf-8"),
+            logging.FileHandler(os.path.join(LOGS_DIR, "latest.log"), encoding="utf-8"),
+            logging.StreamHandler(),  # stdout
+        ],
+    )
+    raiz._lebebe_configurado = True
 
 # =========================================
 # Sessão 2.0 – Google Sheets util
 # =========================================
-from googleapiclient.errors import HttpError
+from app.google_exec import executar
 
 def _normalize_drive_folder_id(raw: str) -> str:
     """
@@ -88,20 +116,21 @@ def _selftest_ping():
     """Ping simples: escreve timestamp na planilha para validar credencial/Sheets."""
     try:
         logging.info("🩺 SELFTEST: iniciando ping (Sheets)")
-        SHEETS.values().update(
+        executar(_sheets().values().update(
             spreadsheetId=PLANILHA_ID,
             range=f"'{ABA_CONTROLE}'!J1",
             valueInputOption="RAW",
             body={"values":[[dt.now().strftime("%d/%m/%Y %H:%M:%S")]]}
-        ).execute()
+        ), "sheets")
         logging.info("🩺 SELFTEST: Sheets OK")
     except Exception:
         logging.exception("🩺 SELFTEST: falhou")
 
 def _selftest_drive_list_one():
     """Lista 1 XML na pasta do Drive para validar ID/permissão."""
+    from googleapiclient.errors import HttpError
+    from app import google_clients
     try:
-        from app.google_sheets_auth import load_sa_credentials
         logging.info("🩺 DRIVE: listando 1 arquivo .xml na pasta…")
 
         # 👇 normaliza localmente (cobre caso ainda não tenha passado por main)
@@ -110,14 +139,13 @@ def _selftest_drive_list_one():
             logging.error("❌ DRIVE selftest: ID_PASTA_GOOGLE_DRIVE vazio ou inválido.")
             return
 
-        creds_drive = load_sa_credentials(["https://www.googleapis.com/auth/drive.readonly"])
-        drive = build("drive", "v3", credentials=creds_drive, cache_discovery=False)
+        drive = google_clients.drive()
 
         q = (f"'{pasta_id}' in parents and trashed=false "
              "and mimeType!='application/vnd.google-apps.folder' "
              "and name contains '.xml'")
-        resp = drive.files().list(q=q, fields="files(id,name)", pageSize=1,
-                                  orderBy="modifiedTime desc").execute()
+        resp = executar(drive.files().list(q=q, fields="files(id,name)", pageSize=1,
+                                           orderBy="modifiedTime desc"), "drive")
         files = resp.get("files", [])
         if not files:
             logging.warning("🩺 DRIVE: 0 arquivos retornados (ID correto? pasta compartilhada com a conta de serviço?)")
@@ -132,11 +160,10 @@ def _selftest_drive_list_one():
     except Exception:
         logging.exception("💥 DRIVE: erro inesperado no selftest")
 
-from app.google_sheets_auth import load_sa_credentials, sheets_api
-
-SCOPES_SHEETS = ["https://www.googleapis.com/auth/spreadsheets"]
-creds_sheets   = load_sa_credentials(SCOPES_SHEETS)
-SHEETS         = sheets_api(creds_sheets)
+def _sheets():
+    """API do Sheets da thread atual (credencial/token/cliente em cache)."""
+    from app import google_clients
+    return google_clients.sheets()
 
 COL = {  # índice zero-based na planilha
     "NUMERO NF": 0,  "DATA EMISSÃO NF": 1, "XML DRIVE": 2,
@@ -144,88 +171,246 @@ COL = {  # índice zero-based na planilha
     "XML ENTRADA SALVA SGI": 5, "XML BOLETO SALVO SGI": 6, 
     "LINK LANÇAMENTO SGI": 7,
 }
+N_COLUNAS = 10  # A:J
 
+@metricas.cronometrado("planilha.ler")
 def _read_sheet():
-    return SHEETS.values().get(
+    return executar(_sheets().values().get(
         spreadsheetId=PLANILHA_ID,
         range=f"'{ABA_CONTROLE}'!A1:J"
-    ).execute().get("values", [])
+    ), "sheets").get("values", [])
 
-def _update_cell(row_idx, col_idx, value):
-    rng = f"'{ABA_CONTROLE}'!{chr(ord('A')+col_idx)}{row_idx+1}"
-    # Transforma strings em booleanos apenas se for necessário
+class PlanilhaSnapshot:
+    """
+    Cópia local da aba de controle, lida UMA vez por execução.
+    Mantém índice NF → linha e a próxima linha livre; cada escrita feita
+    pelos helpers abaixo atualiza a cópia local, então não é preciso reler
+    a planilha inteira a cada consulta.
+    """
+    def __init__(self, vals):
+        self.vals = [list(r) for r in vals]
+        self.idx_nf = {}
+        self.vazias = []          # linhas (após o cabeçalho) com coluna A vazia
+        for idx, row in enumerate(self.vals[1:], start=1):   # pula cabeçalho
+            nf = row[0] if row else ""
+            if nf:
+                self.idx_nf.setdefault(nf, idx)   # mantém a 1ª ocorrência
+            else:
+                self.vazias.append(idx)
+
+    def linha_da_nf(self, nf):
+        return self.idx_nf.get(nf)
+
+    def proxima_livre(self):
+        """Primeira linha vazia já existente ou, se não houver, o fim da tabela."""
+        return self.vazias[0] if self.vazias else len(self.vals)
+
+    def ler(self, row_idx, col_idx, default=""):
+        if 0 <= row_idx < len(self.vals):
+            row = self.vals[row_idx]
+            if col_idx < len(row):
+                return row[col_idx]
+        return default
+
+    def gravar(self, row_idx, col_idx, value):
+        while len(self.vals) <= row_idx:
+            self.vals.append([])
+        row = self.vals[row_idx]
+        if len(row) <= col_idx:
+            row.extend([""] * (col_idx + 1 - len(row)))
+        row[col_idx] = value
+        if col_idx == COL["NUMERO NF"] and row_idx > 0:
+            self._reindexar(row_idx, value)
+
+    def gravar_linha(self, row_idx, valores):
+        for col_idx, value in enumerate(valores):
+            self.gravar(row_idx, col_idx, value)
+
+    def _reindexar(self, row_idx, nf):
+        if nf:
+            self.idx_nf.setdefault(nf, row_idx)
+            if row_idx in self.vazias:
+                self.vazias.remove(row_idx)
+        elif row_idx not in self.vazias:
+            self.vazias.append(row_idx)
+            self.vazias.sort()
+
+_SNAPSHOT = None
+
+def _snapshot(recarregar=False):
+    """Retorna a cópia local da planilha, carregando-a na primeira chamada."""
+    global _SNAPSHOT
+    if _SNAPSHOT is None or recarregar:
+        _SNAPSHOT = PlanilhaSnapshot(_read_sheet())
+        logging.info(f"📄 Planilha carregada: {len(_SNAPSHOT.vals)} linhas, {len(_SNAPSHOT.idx_nf)} NFs.")
+    return _SNAPSHOT
+
+def _coerce_valor(value):
+    """Transforma strings em booleanos apenas se for necessário."""
     if value is True or value is False:
-        value_to_send = value
-    elif isinstance(value, str):
+        return value
+    if isinstance(value, str):
         v = value.strip().upper()
         if v in ("VERDADEIRO", "TRUE", "SIM", "✓"):
-            value_to_send = True
-        elif v in ("FALSO", "FALSE", "NAO", "NÃO", "NO", "X"):
-            value_to_send = False
-        else:
-            value_to_send = value
-    else:
-        value_to_send = value
-    SHEETS.values().update(
-        spreadsheetId=PLANILHA_ID, range=rng,
-        valueInputOption="RAW", body={"values": [[value_to_send]]}
-    ).execute()
+            return True
+        if v in ("FALSO", "FALSE", "NAO", "NÃO", "NO", "X"):
+            return False
+    return value
+
+class EscritorPlanilha:
+    """
+    Escrita *write-behind* na aba de controle.
+    As células ficam num buffer (a última escrita de cada célula vence) e são
+    enviadas num único `spreadsheets.values.batchUpdate` quando `flush()` é
+    chamado — ao fim de cada etapa, a cada `intervalo` segundos ou na saída
+    do processo (atexit).
+    """
+    def __init__(self, intervalo=30.0):
+        self.intervalo = intervalo
+        self.pendentes = {}            # (linha, coluna) -> valor
+        self.ultimo_flush = time.monotonic()
+        self.celulas_escritas = 0      # escritas recebidas
+        self.chamadas_api = 0          # batchUpdates efetivamente enviados
+
+    def escrever(self, row_idx, col_idx, value):
+        self.pendentes[(row_idx, col_idx)] = value
+        self.celulas_escritas += 1
+        if time.monotonic() - self.ultimo_flush >= self.intervalo:
+            self.flush()
+
+    def flush(self):
+        self.ultimo_flush = time.monotonic()
+        if not self.pendentes:
+            return
+        data = [
+            {"range": f"'{ABA_CONTROLE}'!{chr(ord('A')+c)}{r+1}", "values": [[v]]}
+            for (r, c), v in sorted(self.pendentes.items())
+        ]
+        executar(_sheets().values().batchUpdate(
+            spreadsheetId=PLANILHA_ID,
+            body={"valueInputOption": "RAW", "data": data}
+        ), "sheets")
+        self.chamadas_api += 1
+        self.pendentes.clear()
+        logging.info(f"📝 Planilha: {len(data)} célula(s) gravadas em 1 batchUpdate "
+                     f"({self.chamadas_economizadas} chamadas economizadas até agora).")
+
+    @property
+    def chamadas_economizadas(self):
+        return self.celulas_escritas - self.chamadas_api
+
+_ESCRITOR = None
+
+def _escritor():
+    global _ESCRITOR
+    if _ESCRITOR is None:
+        _ESCRITOR = EscritorPlanilha(float(os.environ.get("PLANILHA_FLUSH_SEGUNDOS", "30")))
+        atexit.register(_flush_planilha)
+    return _ESCRITOR
+
+# Cópia local + buffer são compartilhados pelos workers do SGI (sgi_pool)
+_LOCK_PLANILHA = threading.RLock()
+
+@metricas.cronometrado("planilha.flush")
+def _flush_planilha():
+    """Envia as escritas pendentes (fim de etapa / saída)."""
+    if _ESCRITOR is None:
+        return
+    try:
+        with _LOCK_PLANILHA:
+            _ESCRITOR.flush()
+    except Exception:
+        logging.exception("💥 Falha ao gravar escritas pendentes na planilha")
+
+def _update_cell(row_idx, col_idx, value):
+    value_to_send = _coerce_valor(value)
+    with _LOCK_PLANILHA:
+        _escritor().escrever(row_idx, col_idx, value_to_send)
+        # a API devolve booleanos como "TRUE"/"FALSE" na leitura
+        _snapshot().gravar(row_idx, col_idx,
+                           str(value_to_send).upper() if isinstance(value_to_send, bool) else value_to_send)
 
 def _read_cell(row_idx, col_idx, default=""):
     """Lê uma célula da planilha sem estourar IndexError quando a linha é “curta” (trailing empties)."""
-    vals = _read_sheet()
-    if 0 <= row_idx < len(vals):
-        row = vals[row_idx]
-        if col_idx < len(row):
-            return row[col_idx]
-    return default
+    with _LOCK_PLANILHA:
+        return _snapshot().ler(row_idx, col_idx, default)
 
 
 def _get_or_create_row(nf, data_emissao=None):
-    vals = _read_sheet()
-    empty_idx = None
-
-    for idx, row in enumerate(vals[1:], start=1):   # pula cabeçalho
-        if len(row) > 0 and row[0] == nf:
-            # Atualiza data se não estava preenchido
-            if data_emissao and (len(row) < 2 or not row[1]):
-                _update_cell(idx, COL["DATA EMISSÃO NF"], data_emissao)
-            return idx
-        if empty_idx is None and (len(row) == 0 or row[0] == ""):
-            empty_idx = idx
+    with _LOCK_PLANILHA:
+        return _linha_da_nf_ou_nova(nf, data_emissao)
 
-    # --- preenche linha vazia encontrada ---
-    if empty_idx is not None:
-        existing = vals[empty_idx] if empty_idx < len(vals) else []
-        new_row = existing + [""] * (10 - len(existing))
-        new_row[COL["NUMERO NF"]] = nf
-        if data_emissao: new_row[COL["DATA EMISSÃO NF"]] = data_emissao
+def _linha_da_nf_ou_nova(nf, data_emissao):
+    snap = _snapshot()
 
-        SHEETS.values().update(
-            spreadsheetId=PLANILHA_ID,
-            range=f"'{ABA_CONTROLE}'!A{empty_idx+1}:J{empty_idx+1}",
-            valueInputOption="RAW",
-            body={"values": [new_row]}
-        ).execute()
+    idx = snap.linha_da_nf(nf)
+    if idx is not None:
+        # Atualiza data se não estava preenchido
+        if data_emissao and not snap.ler(idx, COL["DATA EMISSÃO NF"]):
+            _update_cell(idx, COL["DATA EMISSÃO NF"], data_emissao)
+        return idx
+
+    # --- preenche linha vazia encontrada ---
+    if snap.vazias:
+        empty_idx = snap.proxima_livre()
+        # só A/B mudam; o resto da linha existente fica como está
+        _escritor().escrever(empty_idx, COL["NUMERO NF"], nf)
+        snap.gravar(empty_idx, COL["NUMERO NF"], nf)
+        if data_emissao:
+            _escritor().escrever(empty_idx, COL["DATA EMISSÃO NF"], data_emissao)
+            snap.gravar(empty_idx, COL["DATA EMISSÃO NF"], data_emissao)
         return empty_idx
 
     # --- se não havia linha vazia, acrescenta ---
-    new = [""] * 10
+    new = [""] * N_COLUNAS
     new[COL["NUMERO NF"]] = nf
     if data_emissao: new[COL["DATA EMISSÃO NF"]] = data_emissao
 
-    SHEETS.values().append(
+    # o append cai logo após a última linha COM DADOS da planilha: linhas vazias
+    # preenchidas só no buffer ainda estão vazias lá, então o buffer vai antes
+    _escritor().flush()
+    resp = executar(_sheets().values().append(
         spreadsheetId=PLANILHA_ID, range=f"'{ABA_CONTROLE}'!A1",
         valueInputOption="RAW", body={"values": [new]}
-    ).execute()
-    return len(vals)
+    ), "sheets")
+    m = re.search(r"![A-Z]+(\d+)", ((resp or {}).get("updates") or {}).get("updatedRange", ""))
+    new_idx = int(m.group(1)) - 1 if m else snap.proxima_livre()
+    snap.gravar_linha(new_idx, new)
+    return new_idx
+
+# =========================================
+# Sessão 2.1 – Catálogo local de XMLs
+# =========================================
+from app import catalogo_xml, prevalidacao
+from app.nfe_parser import ler_nfe
+
+_CATALOGO = None
+
+def _catalogo():
+    """Catálogo SQLite dos XMLs locais (aberto na primeira chamada)."""
+    global _CATALOGO
+    if _CATALOGO is None:
+        _CATALOGO = catalogo_xml.CatalogoXML(CATALOGO_DB, PASTA_LOCAL_XML)
+    return _CATALOGO
 
 # =========================================
 # Sessão 3.0 – Download XMLs (preenche col. XML DRIVE)
 # =========================================
+def _rejeitado_corrigido(reg, f) -> bool:
+    """XML REJEITADO cujo conteúdo no Drive (md5Checksum) difere da cópia local: baixar de novo."""
+    if reg is None or reg["status"] != catalogo_xml.REJEITADO or not f.get("md5Checksum"):
+        return False
+    try:
+        return catalogo_xml.hash_arquivo(reg["caminho"], "md5") != f["md5Checksum"]
+    except OSError:
+        return True
+
+@metricas.cronometrado("drive.baixar")
 def baixar_xmls_drive():
-    from app.google_sheets_auth import load_sa_credentials
     from googleapiclient.errors import HttpError
+    from app import google_clients
+    from app.drive_sync import SincronizadorDrive
+    from app.drive_download import baixar_lote
 
     # 1) valida/normaliza ID da pasta
     if not ID_PASTA_GOOGLE_DRIVE or not str(ID_PASTA_GOOGLE_DRIVE).strip():
@@ -240,24 +425,13 @@ def baixar_xmls_drive():
 
     # 2) credenciais + cliente Drive (somente leitura)
     os.makedirs(PASTA_LOCAL_XML, exist_ok=True)
-    creds_drive = load_sa_credentials(["https://www.googleapis.com/auth/drive.readonly"])
-    drive = build("drive", "v3", credentials=creds_drive, cache_discovery=False)
-
-    # 3) query – pega .xml que não estão marcados como (FEITO)
-    q = (
-        f"'{pasta_id}' in parents "
-        "and trashed = false "
-        "and mimeType != 'application/vnd.google-apps.folder' "
-        "and name contains '.xml' "
-        "and not name contains '(FEITO)'"
-    )
+    drive = google_clients.drive()
 
+    # 3) XMLs pendentes (.xml sem '(FEITO)') – incremental via Changes API
+    sync = SincronizadorDrive(drive, pasta_id, DRIVE_SYNC_ESTADO)
     logging.info(f"🔎 Drive: procurando XMLs na pasta {pasta_id} …")
     try:
-        resp = drive.files().list(
-            q=q, fields="files(id,name)", pageSize=1000, orderBy="modifiedTime desc"
-        ).execute()
-        files = resp.get("files", [])
+        files = sync.pendentes()
     except HttpError as e:
         if getattr(e, "resp", None) and e.resp.status == 404:
             logging.error("❌ DRIVE 404: pasta não encontrada OU conta de serviço sem permissão.")
@@ -270,44 +444,61 @@ def baixar_xmls_drive():
         return
 
     if not files:
+        sync.confirmar()
         logging.info("📭 Drive: nenhum XML pendente (ou todos já estão com '(FEITO)').")
         return
 
-    # 4) download + marcação na planilha
+    # 4) download (paralelo, em blocos) + marcação na planilha
+    ids_ok, a_baixar = [], []
     for f in files:
-        nome    = f["name"]
-        destino = os.path.join(PASTA_LOCAL_XML, nome)
-
-        # evita duplicar se já baixou/renomeou localmente
-        if os.path.exists(destino) or os.path.exists(destino.replace(".xml", "(FEITO).xml")):
-            continue
+        destino = os.path.join(PASTA_LOCAL_XML, f["name"])
+        reg = _catalogo().por_nome(f["name"])
+        # evita duplicar se já baixou/processou localmente, salvo XML rejeitado corrigido no Drive
+        if (reg is not None or os.path.exists(destino)) and not _rejeitado_corrigido(reg, f):
+            ids_ok.append(f["id"])
+        else:
+            a_baixar.append(f)
 
-        data = drive.files().get_media(fileId=f["id"]).execute()
-        with open(destino, "wb") as fh:
-            fh.write(data)
-        logging.info(f"⬇️ Baixado {nome}")
+    try:
+        for f, destino, erro in baixar_lote(google_clients.drive, a_baixar, PASTA_LOCAL_XML):
+            if erro is not None:
+                continue
+            ids_ok.append(f["id"])
+            try:
+                _catalogo().registrar(destino, drive_id=f["id"], nome=f["name"])
+            except Exception as e:
+                logging.warning(f"⚠️ {f['name']} não indexado no catálogo: {e}")
 
-        # tenta extrair NF e data e marcar "XML DRIVE" na planilha
-        try:
-            with open(destino, "rb") as fh:
-                tree = ET.parse(fh)
-            ns = {"nfe": "http://www.portalfiscal.inf.br/nfe"}
-            nf    = tree.find(".//nfe:ide/nfe:nNF", ns).text
-            d_emis = tree.find(".//nfe:ide/nfe:dhEmi", ns).text[:10]  # YYYY-MM-DD
-            linha = _get_or_create_row(
-                nf,
-                dt.strptime(d_emis, "%Y-%m-%d").strftime("%d/%m/%Y")
-            )
-            _update_cell(linha, COL["XML DRIVE"], True)
-        except Exception as e:
-            logging.warning(f"⚠️ Não foi possível extrair dados de {nome}: {e}")
+            # tenta extrair NF e data e marcar "XML DRIVE" na planilha
+            try:
+                nota  = ler_nfe(destino)
+                linha = _get_or_create_row(nota.numero, nota.data_emissao_br)
+                _update_cell(linha, COL["XML DRIVE"], True)
+            except Exception as e:
+                logging.warning(f"⚠️ Não foi possível extrair dados de {f['name']}: {e}")
+    finally:
+        # só o que foi baixado sai da lista de pendentes; o cursor avança
+        sync.confirmar(ids_ok)
 
 # =========================================
 # Sessão 4.0 – Funções SGI genéricas
 # =========================================
-def novo_driver() -> webdriver.Chrome:
+from app import sgi_espera, sgi_pool, sgi_sessao, sgi_dom, sgi_autocomplete
+from app.sgi_leitor import LeitorSGI, SessaoExpirada
+
+SGI_URL = sgi_sessao.URL_BASE
+from app.sgi_espera import esperar, tentar, ajax_ocioso, url_contem, url_muda, bootbox_fechado, qualquer
+
+def _porta_livre() -> int:
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def novo_driver(indice=0) -> "webdriver.Chrome":
+    """Chrome headless isolado: perfil, pasta de download e porta de depuração próprios."""
     import os, tempfile, shutil, glob, time
-    from selenium.webdriver.chrome.service import Service
+    _carregar_selenium()
 
     CHROME_BIN = os.environ.get("CHROME_BIN", "/usr/bin/chromium")
     CHROMEDRIVER_BIN = os.environ.get("CHROMEDRIVER_BIN", "/usr/bin/chromedriver")
@@ -326,7 +517,7 @@ def novo_driver() -> webdriver.Chrome:
     options.add_argument("--disable-dev-shm-usage")
     options.add_argument("--disable-gpu")
     options.add_argument("--window-size=1920,1080")
-    options.add_argument("--remote-debugging-port=9222")
+    options.add_argument(f"--remote-debugging-port={_porta_livre()}")   # uma por instância
     options.add_argument("--disable-software-rasterizer")
     options.add_argument("--disable-features=VizDisplayCompositor")
     options.add_argument("--disable-blink-features=AutomationControlled")
@@ -334,11 +525,11 @@ def novo_driver() -> webdriver.Chrome:
     # PERFIL: gere um diretório ÚNICO por execução para evitar o erro "user data dir in use"
     base_profile = os.environ.get("CHROME_USER_DIR_BASE", "/app/chrome-profile")
     os.makedirs(base_profile, exist_ok=True)
-    unique_profile = tempfile.mkdtemp(prefix="run_", dir=base_profile)
+    unique_profile = tempfile.mkdtemp(prefix=f"run_{indice}_", dir=base_profile)
     options.add_argument(f"--user-data-dir={unique_profile}")
 
-    # Downloads (isolados por execução)
-    dl_dir = os.environ.get("DOWNLOAD_DIR", "/app/downloads")
+    # Downloads (isolados por execução e por worker)
+    dl_dir = os.path.join(os.environ.get("DOWNLOAD_DIR", "/app/downloads"), f"chrome_{indice}")
     os.makedirs(dl_dir, exist_ok=True)
     options.add_experimental_option("prefs", {"download.default_directory": dl_dir})
 
@@ -359,19 +550,27 @@ def novo_driver() -> webdriver.Chrome:
 
     # Anexa o caminho do perfil ao objeto p/ limpar depois, se quiser
     driver._lebebe_profile_dir = unique_profile
+    driver._lebebe_indice = indice     # cookies salvos por worker (sgi_sessao)
     return driver
 
-def login(driver, tentativas_max=3):
+@metricas.cronometrado("sgi.login")
+def login(driver, tentativas_max=3, reaproveitar=True):
     """
     Faz login no SGI e garante que chega à URL /home.
+    Antes tenta a sessão salva (cookies da última execução, um arquivo por
+    worker — cada navegador do pool tem a sua sessão no SGI); só se ela
+    expirou faz o login completo, que é salvo para a próxima vez.
     Se a seleção de filial ou o botão 'Prosseguir' falhar, tenta de novo.
     """
-    url_home = "https://smart.sgisistemas.com.br/home"
+    cookies = sgi_sessao.caminho_do_worker(SGI_COOKIES, getattr(driver, "_lebebe_indice", 0))
+    if reaproveitar and sgi_sessao.restaurar(driver, cookies):
+        return
+    url_home = f"{SGI_URL}/home"
     w = WebDriverWait(driver, 15)
 
     for tentativa in range(1, tentativas_max + 1):
         try:
-            driver.get("https://smart.sgisistemas.com.br/")
+            driver.get(f"{SGI_URL}/")
             # ---------- tela de usuário/senha ----------
             w.until(EC.presence_of_element_located((By.ID, "usuario"))).clear()
             driver.find_element(By.ID, "usuario").send_keys(USUARIO_SGI)
@@ -386,12 +585,16 @@ def login(driver, tentativas_max=3):
             for _ in range(3):
                 try:
                     driver.find_element(By.ID, "botao_prosseguir_informa_local_trabalho").click()
-                    time.sleep(1.0)  # dá um respiro
-                    if driver.current_url.startswith(url_home):
-                        logging.info("Login SGI concluído (tentativa %s).", tentativa)
-                        return
                 except Exception:
                     pass  # botão sumiu / já clicou – tudo bem
+                if tentar(driver, lambda d: d.current_url.startswith(url_home), "login.home", teto=5,
+                          confirmacao=True):
+                    logging.info("Login SGI concluído (tentativa %s).", tentativa)
+                    try:
+                        sgi_sessao.salvar(driver, cookies)
+                    except Exception as e:
+                        logging.warning(f"⚠️ SGI sessão: cookies não salvos ({e})")
+                    return
 
             # Se não chegou na home, força refresh e tenta de novo
             logging.warning("Não chegou à página /home (tentativa %s). Repetindo login…", tentativa)
@@ -420,127 +623,232 @@ def safe_click(elemento, driver, timeout=5):
                     '.bootbox.modal.fade.bootbox-confirm.in button[data-bb-handler="confirm"]'
                 ))
             ).click()
-            time.sleep(0.4)
+            esperar(driver, bootbox_fechado, "bootbox.fechar", teto=timeout)
             elemento.click()   # tenta novamente
         except Exception:
             raise  # se ainda falhar, deixa o erro subir
 
+def _leitor(driver):
+    """Leitor HTTP do SGI com a sessão deste navegador (um por driver/worker)."""
+    leitor = getattr(driver, "_lebebe_leitor", None)
+    if leitor is None:
+        leitor = driver._lebebe_leitor = LeitorSGI.do_driver(driver)
+    return leitor
+
+def _confere_importacao(driver, reg) -> bool:
+    """
+    A tela aberta é a importação deste XML? Vale a chave de acesso na página
+    ou, sem ela, as mesmas referências de fornecedor dos itens do XML (o nº
+    da NF sozinho se repete entre fornecedores).
+    """
+    try:
+        esperar(driver, EC.presence_of_element_located((By.ID, sgi_dom.TABELA_ITENS_IMPORTACAO)),
+                "importar.tela", teto=15)
+    except Exception:
+        return False
+    if reg is None or reg["chave"] in driver.page_source:
+        return True
+    try:
+        esperadas = Counter(it.codigo.strip() for it in ler_nfe(reg["caminho"]).itens)
+    except Exception as e:
+        logging.warning(f"NF {reg['nf']}: XML ilegível, importação aberta sem conferência ({e}).")
+        return True
+    return Counter(it["referencia"].strip() for it in sgi_dom.itens_importacao(driver)) == esperadas
+
+def _procurar_na_lista(driver, nf, reg, tentadas: set) -> bool:
+    """Abre e confere, uma a uma, as importações da lista (lida por HTTP) com o nº `nf`."""
+    leitor = _leitor(driver)
+    chave = reg["chave"] if reg is not None else None
+    for recarregar in (False, True):          # lista em cache por driver; relê uma vez
+        for url in leitor.links_importacao(nf, chave, recarregar):
+            if url in tentadas:
+                continue
+            tentadas.add(url)
+            driver.get(url)
+            if _confere_importacao(driver, reg):
+                _capturar_id_importacao(driver, reg)
+                return True
+    return False
+
+def abrir_importacao(driver, nf) -> bool:
+    """
+    Abre a tela da importação do XML da NF direto pela URL. O id vem do
+    índice persistente chave de acesso → importação (catálogo); se faltar, ou
+    se a tela aberta não for a deste XML (o id sai do índice), a lista é lida
+    por HTTP e as importações com o mesmo nº são conferidas uma a uma. Só a
+    importação conferida vai para o índice. Sessão expirada na leitura →
+    novo login e outra leitura; o navegador só procura na lista se o leitor
+    falhar.
+    False = nenhuma importação da lista corresponde ao XML.
+    """
+    reg = _catalogo().por_nf(nf)
+    chave = reg["chave"] if reg is not None else None
+    achado = _catalogo().importacao_sgi(chave) if chave else None
+    if achado is not None:
+        driver.get(f"{SGI_URL}{achado['caminho_url']}")
+        if _confere_importacao(driver, reg):
+            return True
+        logging.warning(f"⚠️ NF {nf}: importação SGI #{achado['sgi_id']} do índice não é deste XML; "
+                        f"procurando na lista.")
+        _catalogo().esquecer_importacao(chave)
+    tentadas = set()
+    try:
+        try:
+            if _procurar_na_lista(driver, nf, reg, tentadas):
+                return True
+        except SessaoExpirada:
+            logging.warning(f"🔑 NF {nf}: sessão do SGI expirou durante a leitura da lista; novo login.")
+            driver._lebebe_leitor = None
+            login(driver, reaproveitar=False)
+            tentadas.clear()                      # as telas abertas sem sessão não contam
+            if _procurar_na_lista(driver, nf, reg, tentadas):
+                return True
+    except Exception as e:
+        logging.warning(f"⚠️ Leitor SGI indisponível ({e.__class__.__name__}: {e}); usando o navegador.")
+        driver._lebebe_leitor = None
+        driver.get(f"{SGI_URL}/importacoes_xml_nfe")
+        try:
+            link = WebDriverWait(driver, 10).until(EC.element_to_be_clickable(
+                (By.XPATH, f'//tr[td[@data-title="Número NF-e"]/a[text()="{nf}"]]//a')))
+        except Exception:
+            return False
+        driver.execute_script("arguments[0].click();", link)
+        if _confere_importacao(driver, reg):
+            _capturar_id_importacao(driver, reg)
+            return True
+        return False
+    if tentadas:
+        logging.warning(f"⚠️ NF {nf}: {len(tentadas)} importação(ões) com este nº na lista, nenhuma deste XML.")
+    return False
+
 def _garantir_sessao(driver):
-    if "smart.sgisistemas.com.br" not in driver.current_url:
-        try: login(driver)
+    """Confere a sessão com uma requisição leve; expirada → login completo."""
+    if not sgi_sessao.sessao_valida(driver):
+        driver._lebebe_leitor = None   # cookies vão mudar
+        try: login(driver, reaproveitar=False)
         except: pass
 
 
 # =========================================
 # Sessão 5.0 – Importar & Vincular
 # =========================================
-import re
-def extrair_numero_nf(nome_arquivo):
-    return re.match(r"^(\d+)", nome_arquivo).group(1)
+def _capturar_id_importacao(driver, reg):
+    """Se a página principal foi para /importacoes_xml_nfe/<id>, grava chave do XML → id no índice."""
+    from app.sgi_leitor import RE_ID_IMPORTACAO
+    if reg is None:
+        return
+    try:
+        driver.switch_to.default_content()
+        m = tentar(driver, lambda d: RE_ID_IMPORTACAO.search(d.current_url), "importar.id", teto=3)
+    except Exception:
+        m = None
+    if m:
+        _catalogo().registrar_importacao(reg["chave"], reg["nf"], m.group(1), m.group(0))
+        logging.info(f"🔗 NF {reg['nf']}: importação SGI #{m.group(1)}")
+
+def _importacao_na_tela(driver):
+    """Página principal já na importação criada (o iframe do upload some junto)."""
+    from app.sgi_leitor import RE_ID_IMPORTACAO
+    try:
+        caminho = driver.execute_script("return window.top.location.pathname;")
+    except Exception:          # frame descartado pela navegação da página principal
+        driver.switch_to.default_content()
+        caminho = driver.current_url
+    return RE_ID_IMPORTACAO.search(caminho or "")
 
 def importar_xmls_em_lote(driver, arquivos_xml):
+    """`arquivos_xml`: registros do catálogo (status BAIXADO)."""
     logging.info("▶️ Iniciando automação de importação de TODOS os XMLs da pasta.")
     nfs_importadas = []
-    wait = WebDriverWait(driver, 20)
-
-    for arquivo in arquivos_xml:
-        caminho_xml = os.path.join(PASTA_LOCAL_XML, arquivo)
+    for reg in arquivos_xml:
+        arquivo     = reg["nome"]
+        caminho_xml = reg["caminho"]
         logging.info(f"===> Importando arquivo: {arquivo}")
-        numero_nf = extrair_numero_nf(os.path.basename(arquivo))
-
-        driver.get("https://smart.sgisistemas.com.br/importacoes_xml_nfe")
-        time.sleep(2)
-
-        try:
-            # ---------- abre modal ----------
-            botao_buscar = driver.find_element(By.ID, "novo_xml_nfe")
-            botao_buscar.click()
-            time.sleep(1)
-
-            iframe = driver.find_element(By.ID, "iframe_modal")
-            driver.switch_to.frame(iframe)
-            time.sleep(1)
-
-            # ---------- escolhe arquivo ----------
-            botao_escolher = WebDriverWait(driver, 10).until(
-                EC.element_to_be_clickable((By.CLASS_NAME, "botao-upload-arquivo"))
-            )
-            botao_escolher.click()
-            time.sleep(1)
-
-            input_file = WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.ID, "file_field_arquivo"))
-            )
-            input_file.send_keys(caminho_xml)
-            logging.info(f"✅ Arquivo enviado: {caminho_xml}")
+        numero_nf = reg["nf"]
 
-            # ---------- CNPJ diferente? ----------
-            try:
-                botao_sim = WebDriverWait(driver, 5).until(
-                    EC.element_to_be_clickable((By.CSS_SELECTOR, 'button[data-bb-handler="confirm"]'))
-                )
-                botao_sim.click()
-                time.sleep(1)
-            except Exception:
-                pass
-
-            # ---------- importar ----------
-            botao_importar = WebDriverWait(driver, 15).until(
-                EC.element_to_be_clickable((By.CSS_SELECTOR, 'button.btn.btn-success[type="submit"]'))
-            )
-            botao_importar.click()
-            logging.info("✅ Cliquei em 'Importar'.")
-            time.sleep(2)
+        with metricas.medir("importar.arquivo", nf=numero_nf):
+            driver.get(f"{SGI_URL}/importacoes_xml_nfe")
 
-            # ---------- já importado? ----------
-            erro_já_importado = False
             try:
-                alerta = driver.find_element(By.CSS_SELECTOR, ".alert-danger")
-                if "Chave de Acesso já está em uso" in alerta.text:
+                # ---------- abre modal ----------
+                botao_buscar = esperar(driver, EC.element_to_be_clickable((By.ID, "novo_xml_nfe")), "importar.lista", teto=20)
+                botao_buscar.click()
+
+                esperar(driver, EC.frame_to_be_available_and_switch_to_it((By.ID, "iframe_modal")),
+                        "importar.modal", teto=10)
+
+                # ---------- escolhe arquivo ----------
+                botao_escolher = esperar(driver, EC.element_to_be_clickable((By.CLASS_NAME, "botao-upload-arquivo")),
+                                         "importar.botao_upload", teto=10)
+                botao_escolher.click()
+
+                input_file = esperar(driver, EC.presence_of_element_located((By.ID, "file_field_arquivo")),
+                                     "importar.input_arquivo", teto=10)
+                input_file.send_keys(caminho_xml)
+                logging.info(f"✅ Arquivo enviado: {caminho_xml}")
+
+                # ---------- análise do XML → CNPJ diferente? (confirmação) → Importar ----------
+                # o bootbox de CNPJ nasce no retorno da análise (AJAX): decidir antes
+                # dela terminar deixaria clicar em Importar com a confirmação a caminho
+                sel_confirmar = 'button[data-bb-handler="confirm"]'
+                sel_importar  = 'button.btn.btn-success[type="submit"]'
+                analisado = lambda cond: lambda d: ajax_ocioso(d) and cond(d)
+                qual, _el = esperar(driver, qualquer(
+                    confirmar=analisado(EC.presence_of_element_located((By.CSS_SELECTOR, f".bootbox.modal {sel_confirmar}"))),
+                    importar=analisado(EC.element_to_be_clickable((By.CSS_SELECTOR, sel_importar))),
+                ), "importar.analise_xml", teto=15)
+                if qual == "confirmar":
+                    esperar(driver, EC.element_to_be_clickable((By.CSS_SELECTOR, sel_confirmar)),
+                            "importar.cnpj_diferente", teto=5).click()
+                    esperar(driver, bootbox_fechado, "bootbox.fechar", teto=5)
+                botao = esperar(driver, EC.element_to_be_clickable((By.CSS_SELECTOR, sel_importar)),
+                                "importar.botao", teto=15)
+
+                # ---------- importar ----------
+                botao.click()
+                logging.info("✅ Cliquei em 'Importar'.")
+
+                # ---------- resultado: só na página carregada pelo envio ----------
+                # (antes disso o formulário antigo ainda está na tela, sem alerta)
+                esperar(driver, EC.staleness_of(botao), "importar.envio", teto=20, confirmacao=True)
+                erro_já_importado = False
+                qual, alerta = tentar(driver, qualquer(
+                    alerta=EC.presence_of_element_located((By.CSS_SELECTOR, ".alert-danger")),
+                    importada=_importacao_na_tela,
+                ), "importar.resposta", teto=15, confirmacao=True) or (None, None)
+                if qual == "alerta" and "Chave de Acesso já está em uso" in alerta.text:
                     erro_já_importado = True
                     logging.warning("⚠️ XML já havia sido importado!")
-                    driver.find_element(By.CSS_SELECTOR, ".close").click()
-                    time.sleep(1)
-            except Exception:
-                pass
-
-            # ---------- renomeia local ----------
-            def limpar_sufixo(nome):
-                # Remove todos os sufixos FEITO/JÁ_IMPORTADO para não empilhar nomes
-                return re.sub(r"(\(FEITO(_TMP)?\)|\(JA_IMPORTADO(_TMP)?\))", "", nome, flags=re.IGNORECASE).replace("..", ".").replace(" .", ".")
-
-            # ... dentro do importar_xmls_em_lote (no lugar do bloco de renomeio) ...
-            base_nome = limpar_sufixo(os.path.basename(caminho_xml))
-            novo_nome = os.path.join(PASTA_LOCAL_XML, base_nome.replace(
-                ".xml",
-                "(JA_IMPORTADO_TMP).xml" if erro_já_importado else "(FEITO_TMP).xml"
-            ))
-            os.rename(caminho_xml, novo_nome)
-            logging.info(f"Arquivo renomeado para: {novo_nome}")
-
-            # ✅ marca coluna “XML IMPORTADA SGI” (D)
-            try:
-                tree = ET.parse(novo_nome)
-                ns = {"nfe": "http://www.portalfiscal.inf.br/nfe"}
-                d_emis = tree.find(".//nfe:ide/nfe:dhEmi", ns).text[:10]
-                data_emissao = dt.strptime(d_emis, "%Y-%m-%d").strftime("%d/%m/%Y")
-            except Exception as e:
-                logging.warning(f"Não conseguiu extrair data de emissão da NF {numero_nf}: {e}")
-                data_emissao = ""
+                    try:
+                        driver.find_element(By.CSS_SELECTOR, ".close").click()
+                    except Exception:
+                        pass
 
-            linha = _get_or_create_row(numero_nf, data_emissao)
-            _update_cell(linha, COL["XML IMPORTADA SGI"], True)
+                # ---------- registra no catálogo (+ id da importação, se o SGI abriu a tela dela) ----------
+                _catalogo().marcar(reg["chave"], catalogo_xml.JA_IMPORTADO if erro_já_importado else catalogo_xml.IMPORTADO)
+                if not erro_já_importado:
+                    _capturar_id_importacao(driver, reg)
 
-            # ---------- status ----------
-            status = "JÁ IMPORTADA" if erro_já_importado else "OK"
-            nfs_importadas.append((numero_nf, status))   # ←- salva tupla
-            time.sleep(2)
+                # ✅ marca coluna “XML IMPORTADA SGI” (D)
+                try:
+                    data_emissao = ler_nfe(caminho_xml).data_emissao_br
+                except Exception as e:
+                    logging.warning(f"Não conseguiu extrair data de emissão da NF {numero_nf}: {e}")
+                    data_emissao = ""
 
-        except Exception as e:
-            logging.error(f"Erro ao importar {arquivo}: {e}")
-            driver.save_screenshot(f"erro_upload_{numero_nf}.png")
-            nfs_importadas.append((numero_nf, "ERRO"))   # ←- falhou
-            continue
+                linha = _get_or_create_row(numero_nf, data_emissao)
+                _update_cell(linha, COL["XML IMPORTADA SGI"], True)
+
+                # ---------- status ----------
+                status = "JÁ IMPORTADA" if erro_já_importado else "OK"
+                nfs_importadas.append((numero_nf, status))   # ←- salva tupla
+
+            except Exception as e:
+                logging.error(f"Erro ao importar {arquivo}: {e}")
+                driver.save_screenshot(f"erro_upload_{numero_nf}.png")
+                nfs_importadas.append((numero_nf, "ERRO"))   # ←- falhou
+                metricas.contar("importar.erros")
+                continue
 
     logging.info("✅ Todos os XMLs foram processados (importados ou já existiam).")
     return nfs_importadas
@@ -564,11 +872,12 @@ import re  # regex para NF
 # VINCULAÇÃO
 # ------------------------------------------------------------------
 def codigos_equivalentes(ref, codigo_final):
+    zeros = catalogo_xml.ZEROS_TOLERADOS
     if ref == codigo_final:
         return True
-    if ref.lstrip("0") == codigo_final.lstrip("0") and 0 < len(ref) - len(ref.lstrip("0")) <= 2:
+    if ref.lstrip("0") == codigo_final.lstrip("0") and 0 < len(ref) - len(ref.lstrip("0")) <= zeros:
         return True
-    if codigo_final.lstrip("0") == ref.lstrip("0") and 0 < len(codigo_final) - len(codigo_final.lstrip("0")) <= 2:
+    if codigo_final.lstrip("0") == ref.lstrip("0") and 0 < len(codigo_final) - len(codigo_final.lstrip("0")) <= zeros:
         return True
     return False
 
@@ -584,9 +893,62 @@ def esperar_vinculo(linha):
         pass
 
 
-def vincular_produtos(driver) -> bool:
+# Item sem sugestão: o ✏️ abre a busca de produto do SGI (autocomplete + confirmar)
+# e o produto do índice de referências só é escolhido depois de visto N vezes
+REFERENCIA_VEZES_MINIMO = int(os.environ.get("INDICE_REFERENCIAS_VEZES_MINIMO", "2"))
+CAMPO_PRODUTO_VINCULO = "autocompletar_produto_id"
+SEL_CONFIRMAR_VINCULO = 'button[data-bb-handler="confirm"], .modal-footer button.btn-primary'
+
+def _codigo_do_produto(prod_nome):
+    """Último código entre parênteses no nome do produto ('' se não houver)."""
+    cods = re.findall(r"\((\d+)\)", prod_nome)
+    return cods[-1] if cods else ""
+
+def _item_vinculado(item_id):
+    def _cond(d):
+        try:
+            return bool(d.find_element(By.ID, item_id).find_elements(
+                By.XPATH, './/span[contains(@class,"vincular-desvincular-glyphicon-check")]'))
+        except Exception:
+            return False
+    return _cond
+
+def _vincular_pelo_indice(driver, item, codigo):
+    """Vincula o item ao produto `codigo` (índice de referências) pela busca do ✏️."""
+    linha = driver.find_element(By.ID, item["id"])
+    icone_edit = linha.find_element(By.XPATH, './/span[contains(@class,"glyphicon-edit")]')
+    driver.execute_script("arguments[0].scrollIntoView(true);", icone_edit)
+    icone_edit.click()
+    try:
+        campo = esperar(driver, EC.visibility_of_element_located((By.ID, CAMPO_PRODUTO_VINCULO)),
+                        "vincular.busca", teto=10)
+        campo.clear()
+        campo.send_keys(codigo)
+
+        def _sugestao(d):
+            for sug in d.find_elements(By.CSS_SELECTOR, "div.tt-suggestion"):
+                if _codigo_do_produto(sug.text) == codigo:
+                    return sug
+            return False
+
+        esperar(driver, _sugestao, "vincular.sugestao", teto=10).click()
+        esperar(driver, EC.element_to_be_clickable((By.CSS_SELECTOR, SEL_CONFIRMAR_VINCULO)),
+                "vincular.confirmar", teto=5).click()
+        esperar(driver, _item_vinculado(item["id"]), "vincular.item", teto=10, confirmacao=True)
+    except Exception:
+        try:   # fecha a busca para não travar os próximos itens
+            driver.find_element(By.TAG_NAME, "body").send_keys(Keys.ESCAPE)
+        except Exception:
+            pass
+        raise
+
+def vincular_produtos(driver, cnpj_emitente="") -> bool:
     """
-    Tenta vincular itens com caneta vermelha.
+    Tenta vincular itens com caneta vermelha: a sugestão do SGI é aceita se
+    bate com a referência do fornecedor (direto ou pelo índice de
+    referências); sem sugestão, o produto aprendido no índice é escolhido na
+    busca, se o vínculo já se repetiu REFERENCIA_VEZES_MINIMO vezes. Os itens
+    vinculados ao final alimentam o índice.
     Retorna True se, ao final, não sobra NENHUM ícone 'edit' (vermelho).
     """
     WebDriverWait(driver, 15).until(
@@ -598,68 +960,87 @@ def vincular_produtos(driver) -> bool:
         ))
     )
 
-    tabela  = driver.find_element(By.ID, "lista_itens_importacao_xml_nfe")
-    linhas  = tabela.find_elements(By.XPATH, ".//tbody/tr[starts-with(@id,\'xml_nfe_\')]")
-
-    for linha in linhas:
-        # Já vinculado? (ícone ✓)
-        if linha.find_elements(By.XPATH,
-            './/span[contains(@class,"glyphicon-check")]'):
+    cat = _catalogo()
+    # uma leitura da tabela inteira; o navegador só é tocado nas linhas a clicar
+    for item in sgi_dom.itens_importacao(driver):
+        if item["vinculado"] or not item["pendente"]:
             continue
 
-        # Ainda pendente → ícone ✏️
-        icone_edit = linha.find_element(By.XPATH,
-            './/span[contains(@class,"glyphicon-edit")]')
-
-        prod_nome = linha.find_element(By.XPATH,
-            './td[contains(@class,"coluna-produto")]').text.strip()
-        ref = linha.find_element(By.XPATH,
-            './td[@data-title="Referência Fornecedor"]').text.strip()
-        cods = re.findall(r"\((\d+)\)", prod_nome)
-        cod_final = cods[-1] if cods else ""
+        with metricas.medir("vincular.item"):
+            prod_nome, ref = item["produto"], item["referencia"]
+            cod_final = _codigo_do_produto(prod_nome)
+            sugestao = "*(Sugestão)" in prod_nome
+            confere = sugestao and ref and codigos_equivalentes(ref, cod_final)
+            aprendido = cat.produto_da_referencia(cnpj_emitente, ref) if ref and not confere else None
+
+            if sugestao and aprendido and aprendido["codigo"] != cod_final:
+                logging.warning(f"🔴 {ref}: sugestão ({cod_final}) difere do índice ({aprendido['codigo']}) "
+                                f"– ação humana necessária.")
+            elif confere or (sugestao and aprendido):
+                try:
+                    linha = driver.find_element(By.ID, item["id"])
+                    icone_edit = linha.find_element(By.XPATH, './/span[contains(@class,"glyphicon-edit")]')
+                    driver.execute_script("arguments[0].scrollIntoView(true);", icone_edit)
+                    icone_edit.click()
+                    esperar_vinculo(linha)      # aguarda virar ✓
+                    logging.info(f"✅ vinculado {ref}")
+                except Exception as e:
+                    logging.warning(f"⚠️ falhou ao vincular {ref}: {e}")
+            elif aprendido and aprendido["vezes"] < REFERENCIA_VEZES_MINIMO:
+                logging.warning(f"🔴 {ref}: índice → {aprendido['codigo']} visto {aprendido['vezes']} vez(es) "
+                                f"(mínimo {REFERENCIA_VEZES_MINIMO}) – ação humana necessária.")
+            elif aprendido:
+                try:
+                    _vincular_pelo_indice(driver, item, aprendido["codigo"])
+                    logging.info(f"✅ vinculado {ref} pelo índice → {aprendido['produto'] or aprendido['codigo']}")
+                except Exception as e:
+                    logging.warning(f"⚠️ {ref}: índice → {aprendido['codigo']} falhou ({e.__class__.__name__}) "
+                                    f"– ação humana necessária.")
+            else:
+                logging.warning(f"🔴 {ref or '---'} sem sugestão – ação humana necessária.")
 
-        if "*(Sugestão)" in prod_nome and ref and codigos_equivalentes(ref, cod_final):
-            try:
-                driver.execute_script("arguments[0].scrollIntoView(true);", icone_edit)
-                time.sleep(0.15)
-                icone_edit.click()
-                esperar_vinculo(linha)      # aguarda virar ✓
-                logging.info(f"✅ vinculado {ref}")
-            except Exception as e:
-                logging.warning(f"⚠️ falhou ao vincular {ref}: {e}")
-        else:
-            logging.warning(f"🔴 {ref or '---'} sem sugestão – ação humana necessária.")
+    # aprende referência → produto de tudo que está vinculado (inclusive vínculos feitos à mão)
+    itens = sgi_dom.itens_importacao(driver)
+    cat.aprender_referencias(cnpj_emitente, {
+        it["referencia"]: (_codigo_do_produto(it["produto"]), it["produto"])
+        for it in itens if it["vinculado"] and it["referencia"]})
 
     # Se restou QUALQUER ícone ✏️, devolve False
-    pendentes = tabela.find_elements(By.XPATH,
-        './/span[contains(@class,"glyphicon-edit")]')
-    return len(pendentes) == 0
+    return not any(item["pendente"] for item in itens)
+
+
+
+def nfs_em_andamento():
+    return sorted({r["nf"] for r in _catalogo().com_status(*catalogo_xml.EM_ANDAMENTO)})
+
 
+def _cnpj_emitente(nf):
+    """CNPJ do fornecedor da NF (chave do índice de referências); '' se o XML não abre."""
+    reg = _catalogo().por_nf(nf)
+    try:
+        return ler_nfe(reg["caminho"]).cnpj_emitente if reg else ""
+    except Exception:
+        return ""
 
 
-def importar_e_vincular(driver):
-    pendentes = [f for f in os.listdir(PASTA_LOCAL_XML)
-                 if f.lower().endswith("(feito_tmp).xml") or f.lower().endswith("(ja_importado_tmp).xml")]
-    if not pendentes:
+def importar_e_vincular(driver, nfs=None):
+    """Vincula os produtos das NFs `nfs` (padrão: todas as importadas no catálogo)."""
+    nfs = nfs_em_andamento() if nfs is None else nfs
+    if not nfs:
         return []
 
     nfs_status = []
-    nfs = sorted({re.match(r"(\d+)", f).group(1) for f in pendentes})
 
     for nf in nfs:
         try:
-            driver.get("https://smart.sgisistemas.com.br/importacoes_xml_nfe")
-            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "table")))
-            link = WebDriverWait(driver, 10).until(
-                EC.element_to_be_clickable((By.XPATH,
-                    f'//tr[td[@data-title="Número NF-e"]/a[text()="{nf}"]]//a'))
-            )
-            driver.execute_script("arguments[0].click();", link)
+            if not abrir_importacao(driver, nf):
+                raise Exception("não encontrada na lista de importações")
             WebDriverWait(driver, 10).until(
                 EC.presence_of_element_located((By.ID, "lista_itens_importacao_xml_nfe"))
             )
 
-            ok = vincular_produtos(driver)          # ← agora devolve bool
+            with metricas.medir("vincular.nf", nf=nf):
+                ok = vincular_produtos(driver, _cnpj_emitente(nf))   # ← agora devolve bool
 
             linha = _get_or_create_row(nf)
             if ok:
@@ -679,18 +1060,12 @@ def importar_e_vincular(driver):
 # Sessão 6.0 – Gerar Entrada
 # =========================================
 # ---------- DESCONTO / ACRÉSCIMOS ----------
-def verificar_se_tem_desconto(driver):
-    tabela  = driver.find_element(By.ID, "tabela_de_produtos")
-    linhas  = tabela.find_elements(By.XPATH, ".//tbody/tr")
+def verificar_se_tem_desconto(driver, produtos=None):
+    produtos = sgi_dom.produtos_entrada(driver) if produtos is None else produtos
     tem_desc = False
-    for idx, ln in enumerate(linhas, start=1):
-        desc_txt = ln.find_elements(By.TAG_NAME, "td")[9].text.strip()  # 10ª coluna
-        try:
-            desc_val = float(desc_txt.replace('.', '').replace(',', '.'))
-        except:
-            desc_val = 0
-        if desc_val > 0:
-            logging.info(f"[ITEM {idx}] desconto = {desc_val}")
+    for idx, ln in enumerate(produtos, start=1):
+        if ln["desconto"] > 0:   # 10ª coluna
+            logging.info(f"[ITEM {idx}] desconto = {ln['desconto']}")
             tem_desc = True
     if tem_desc:
         logging.info("⚠️ Nota de FEIRA / MOSTRUÁRIO (há desconto nos itens).")
@@ -712,13 +1087,90 @@ def preencher_outros_acrescimos(driver, tem_desconto):
     logging.info(f"Campo Outros Acréscimos = {valor_acrescimos}")
 
 
+# ---------- QUANTIDADE POR LOCAL (tudo no Depósito C.D., local 6) ----------
+LOCAL_DEPOSITO_CD = "6"
+QTDE_EM_LOTE = os.environ.get("SGI_QTDE_EM_LOTE", "1") != "0"
+_XP_MODAL_QTDE = "//div[contains(@class,'modal-content')]//h4[contains(text(),'Quantidade por Local de Estocagem')]"
+
+
+def _qtde_local_modal(driver, idx, qtd_nota):
+    """Caminho interativo: abre o modal da linha `idx`, digita no C.D. e conclui."""
+    linha = driver.find_elements(By.XPATH, "//table[@id='tabela_de_produtos']/tbody/tr")[idx]
+    td_qtde = linha.find_element(By.XPATH, ".//td[contains(@class,'qtde-por-local-estocagem')]")
+    try:
+        td_qtde.click()
+    except:
+        driver.execute_script("arguments[0].click();", td_qtde)
+
+    esperar(driver, EC.presence_of_element_located((By.XPATH, _XP_MODAL_QTDE)), "entrada.abrir_qtde_local", teto=15)
+
+    # Busca apenas o campo realmente visível e habilitado no modal
+    inputs = driver.find_elements(By.XPATH, f"//div[contains(@class,'modal-content')]//input[@data-local_id='{LOCAL_DEPOSITO_CD}']")
+    campo_cd = None
+    for inp in inputs:
+        if inp.is_displayed() and inp.is_enabled():
+            campo_cd = inp
+            break
+
+    if campo_cd:
+        campo_cd.clear()
+        campo_cd.send_keys(qtd_nota)
+    else:
+        logging.warning(f"[ITEM {idx+1}] Não achou campo visível para Depósito C.D. no pop-up.")
+
+    try:
+        btn_concluir = driver.find_element(By.ID, "concluir_quantidade_por_local")
+        btn_concluir.click()
+    except Exception as e:
+        logging.warning(f"[ITEM {idx+1}] Erro ao clicar em concluir: {e}")
+
+    esperar(driver, EC.invisibility_of_element_located((By.XPATH, _XP_MODAL_QTDE)),
+            "entrada.fechar_qtde_local", teto=15)
+
+
+def _qcom_por_linha(nf, produtos):
+    """qCom do XML para cada linha da tela (mesma ordem); sem XML, a coluna Qtde Nota."""
+    reg = _catalogo().por_nf(nf)
+    try:
+        itens = ler_nfe(reg["caminho"]).itens if reg else ()
+    except Exception as e:
+        logging.debug(f"NF {nf}: XML indisponível para validar quantidades ({e})")
+        itens = ()
+    if len(itens) == len(produtos):
+        return [it.quantidade for it in itens]
+    return [sgi_dom.numero_br(p["qtde_nota"], None) for p in produtos]
+
+
+def preencher_qtde_deposito_cd(driver, nf, produtos):
+    """
+    Quantidade de cada item toda no Depósito C.D.: primeiro em lote (um
+    execute_script nos inputs data-local_id das linhas); com o AJAX da tela
+    ocioso, relê os inputs numa segunda chamada e confere contra o qCom do
+    XML. Só as linhas que não batem passam pelo modal "Quantidade por Local
+    de Estocagem".
+    """
+    qtdes = [p["qtde_nota"] for p in produtos]
+    esperado = _qcom_por_linha(nf, produtos)
+    pendentes = list(range(len(produtos)))
+    if QTDE_EM_LOTE and produtos:
+        preenchidos = sgi_dom.preencher_qtde_local(driver, LOCAL_DEPOSITO_CD, qtdes)
+        tentar(driver, ajax_ocioso, "entrada.qtde_lote", teto=5)
+        lidos = sgi_dom.qtde_local(driver, LOCAL_DEPOSITO_CD)   # o que ficou na tela após o JS do SGI
+        pendentes = [
+            i for i in range(len(produtos))
+            if i >= len(preenchidos) or not preenchidos[i] or i >= len(lidos) or esperado[i] is None
+            or abs(sgi_dom.numero_br(lidos[i], -1) - esperado[i]) > 1e-6
+        ]
+        logging.info(f"NF {nf}: quantidade por local em lote — {len(produtos) - len(pendentes)}/{len(produtos)} "
+                     f"linha(s) conferidas; {len(pendentes)} pelo modal.")
+    for idx in pendentes:
+        logging.debug(f"[ITEM {idx+1}] Qtde Nota: [{qtdes[idx]}] | {produtos[idx]['celulas']}")
+        _qtde_local_modal(driver, idx, qtdes[idx])
+
+
 def gerar_entrada(driver,nf):
     w=WebDriverWait(driver,20)
-    driver.get("https://smart.sgisistemas.com.br/importacoes_xml_nfe")
-    try:
-        link_elem = w.until(EC.element_to_be_clickable((By.XPATH,f'//tr[td[@data-title="Número NF-e"]/a[text()="{nf}"]]//a')))
-        link_elem.click()
-    except Exception:
+    if not abrir_importacao(driver, nf):
         logging.warning(f"NF {nf}: não encontrada na lista para geração de entrada.")
         return None
     w.until(EC.element_to_be_clickable((By.ID,"gerar_entrada"))).click()
@@ -727,74 +1179,25 @@ def gerar_entrada(driver,nf):
     w.until(lambda d:"/entrada?xml_nfe_id" in d.current_url)
     # quantidade por local (passa tudo pro CD =6)
     w.until(EC.presence_of_element_located((By.ID,"tabela_de_produtos")))
-    # Preencher quantidades no modal
-    wait = WebDriverWait(driver, 15)
-    tabela = driver.find_element(By.ID, "tabela_de_produtos")
-    linhas = tabela.find_elements(By.XPATH, ".//tbody/tr")
-    for idx, linha in enumerate(linhas):
-        print(f"\n[ITEM {idx+1}]")
-        td_qtde = linha.find_element(By.XPATH, ".//td[contains(@class,'qtde-por-local-estocagem')]")
-        try:
-            td_qtde.click()
-        except:
-            driver.execute_script("arguments[0].click();", td_qtde)
-
-        wait.until(EC.presence_of_element_located(
-            (By.XPATH, "//div[contains(@class,'modal-content')]//h4[contains(text(),'Quantidade por Local de Estocagem')]")
-        ))
+    produtos = sgi_dom.produtos_entrada(driver)          # textos de todas as linhas, 1 chamada
+    preencher_qtde_deposito_cd(driver, nf, produtos)
 
-        tds = linha.find_elements(By.TAG_NAME, "td")
-        print("Valores da linha:")
-        for i, td in enumerate(tds):
-            print(f"  Coluna {i}: {td.text.strip()}")
-
-        qtd_nota = tds[4].text.strip()
-        print(f"Qtde Nota coletada: [{qtd_nota}]")
-
-        # Busca apenas o campo realmente visível e habilitado no modal
-        inputs = driver.find_elements(By.XPATH, "//div[contains(@class,'modal-content')]//input[@data-local_id='6']")
-        campo_cd = None
-        for inp in inputs:
-            if inp.is_displayed() and inp.is_enabled():
-                campo_cd = inp
-                break
-
-        if campo_cd:
-            campo_cd.clear()
-            campo_cd.send_keys(qtd_nota)
-            print(f"Digitado '{qtd_nota}' no campo Depósito C.D.")
-        else:
-            print("ATENÇÃO: Não achou campo visível para Depósito C.D. no pop-up.")
-
-        try:
-            btn_concluir = driver.find_element(By.ID, "concluir_quantidade_por_local")
-            btn_concluir.click()
-        except Exception as e:
-            print(f"ERRO ao clicar em concluir: {e}")
-
-        wait.until(EC.invisibility_of_element_located(
-            (By.XPATH, "//div[contains(@class,'modal-content')]//h4[contains(text(),'Quantidade por Local de Estocagem')]")
-        ))
-        time.sleep(0.5)
-
-
-    tem_desc = verificar_se_tem_desconto(driver)
+    tem_desc = verificar_se_tem_desconto(driver, produtos)
     preencher_outros_acrescimos(driver, tem_desc)
     # forma pagamento boleto
     Select(driver.find_element(By.ID,"forma_pagamento_id_0")).select_by_visible_text("Boleto")
     # salvar
     driver.find_element(By.ID,"botao_salvar_continuar").click()
-    for _ in range(20):
-        time.sleep(0.7)
-        if "numero_lancamento=" in driver.current_url:
-            return driver.current_url
+    if tentar(driver, url_contem("numero_lancamento="), "entrada.salvar", teto=15, confirmacao=True):
+        return driver.current_url
     return None
 
 def gerar_entradas(driver, nfs):
     ok=[]
     for nf in sorted(set(nfs)): # elimina duplicatas
         _garantir_sessao(driver)
-        link=gerar_entrada(driver,nf)
+        with metricas.medir("entrada.nf", nf=nf):
+            link=gerar_entrada(driver,nf)
         if link:
             linha=_get_or_create_row(nf); _update_cell(linha,COL["XML ENTRADA SALVA SGI"],"VERDADEIRO")
             _update_cell(linha,COL["LINK LANÇAMENTO SGI"],link)
@@ -806,8 +1209,6 @@ def gerar_entradas(driver, nfs):
 # =========================================
 # Sessão 7.0 – Boletos (VERSÃO ROBUSTA)
 # =========================================
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.common.exceptions import ElementNotInteractableException
 
 # ---------- Utilidades ----------
 def apagar_e_digitar(element, texto):
@@ -818,11 +1219,9 @@ def apagar_e_digitar(element, texto):
     except ElementNotInteractableException:
         element._parent.execute_script("arguments[0].click();", element)
     element.send_keys(Keys.CONTROL, 'a')
-    time.sleep(0.1)
     element.send_keys(Keys.BACKSPACE)
-    time.sleep(0.1)
     element.send_keys(str(texto))
-    time.sleep(0.2)
+    tentar(element.parent, ajax_ocioso, "campo.digitar", teto=3)
 
 def _celula_true(valor):
     return str(valor).strip().upper() in ("TRUE", "VERDADEIRO")
@@ -837,72 +1236,117 @@ def autocomp(driver, campo_id, texto_digitado):
         driver.find_elements(By.CSS_SELECTOR, "div.tt-suggestion")[0].click()
     except Exception:
         el.send_keys(Keys.ARROW_DOWN, Keys.ENTER)
-    time.sleep(0.3)
+    tentar(driver, EC.invisibility_of_element_located((By.CSS_SELECTOR, "div.tt-suggestion")),
+           "autocomplete.fechar", teto=3)
 
 def selecionar_autocomplete_exato(driver, campo_id, texto_digitado, texto_exato):
     """Seleciona exatamente a sugestão desejada (ex.: 'Pagamento de Fornecedor')."""
     el = WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.ID, campo_id)))
     el.clear()
     el.send_keys(texto_digitado)
-    time.sleep(1.5)
-    for sug in driver.find_elements(By.CSS_SELECTOR, "div.tt-suggestion"):
-        if sug.text.strip().lower() == texto_exato.strip().lower():
-            sug.click()
-            time.sleep(0.3)
-            return
-    raise Exception(f"Sugestão '{texto_exato}' não encontrada em {campo_id}.")
+    alvo = texto_exato.strip().lower()
+
+    def _sugestao(d):
+        for sug in d.find_elements(By.CSS_SELECTOR, "div.tt-suggestion"):
+            if sug.text.strip().lower() == alvo:
+                return sug
+        return False
+
+    sug = tentar(driver, _sugestao, "autocomplete.sugestao_exata", teto=5)
+    if not sug:
+        raise Exception(f"Sugestão '{texto_exato}' não encontrada em {campo_id}.")
+    sug.click()
+    tentar(driver, EC.invisibility_of_element_located((By.CSS_SELECTOR, "div.tt-suggestion")),
+           "autocomplete.fechar", teto=3)
+
+_AUTOCOMPLETES = None
+_LOCK_AUTOCOMPLETES = threading.Lock()
+
+def _cache_autocomplete():
+    """Cache dos autocompletes fixos; criado em main() antes do pool (um só para todos os workers)."""
+    global _AUTOCOMPLETES
+    with _LOCK_AUTOCOMPLETES:
+        if _AUTOCOMPLETES is None:
+            _AUTOCOMPLETES = sgi_autocomplete.CacheAutocomplete(SGI_AUTOCOMPLETE_CACHE)
+        return _AUTOCOMPLETES
+
+def autocomp_cacheado(driver, campo_id, texto_digitado, texto_exato=None):
+    """
+    Autocomplete de valor fixo: usa o id já resolvido (cache com TTL) e só
+    cai no fluxo digita-e-escolhe na primeira vez ou quando o id venceu.
+    """
+    cache = _cache_autocomplete()
+    item = cache.obter(campo_id, texto_digitado)
+    if item and sgi_autocomplete.definir(driver, campo_id, item):
+        return
+    if texto_exato:
+        selecionar_autocomplete_exato(driver, campo_id, texto_digitado, texto_exato)
+    else:
+        autocomp(driver, campo_id, texto_digitado)
+    lido = sgi_autocomplete.ler(driver, campo_id)
+    if lido and lido["id"]:
+        cache.guardar(campo_id, texto_digitado, lido["id"], lido["texto"], lido["oculto"])
+        logging.info(f"🔖 Autocomplete {campo_id}: '{lido['texto']}' → id {lido['id']} (em cache)")
 
-# ---------- XML ----------
 # ---------- XML ----------
 def extrair_info_xml(xml_path):
-    tree = ET.parse(xml_path)
-    ns   = {'nfe': 'http://www.portalfiscal.inf.br/nfe'}
-
-    ide   = tree.find('.//nfe:infNFe/nfe:ide', ns)
-    nf    = ide.find('nfe:nNF', ns).text
-    data  = dt.strptime(ide.find('nfe:dhEmi', ns).text[:10],
-                        "%Y-%m-%d").strftime("%d/%m/%Y")
-
-    # ----- detecta desconto em QUALQUER item -----
-    tem_desconto = any(
-        float( (det.find('nfe:vDesc', ns).text or '0').replace(',', '.') ) > 0
-        for det in tree.findall('.//nfe:det', ns)
-        if det.find('nfe:vDesc', ns) is not None
-    )
-    fator = 3 if tem_desconto else 1
-
-    # ----- duplicatas (já ajustadas) -----
-    dups = []
-    for d in tree.findall('.//nfe:dup', ns):
-        valor = float(d.find('nfe:vDup', ns).text.replace(',', '.')) * fator
-        dups.append({
-            "nDup":  d.find('nfe:nDup', ns).text,
-            "vDup":  f"{valor:.2f}",                 # string pt-BR depois
-            "dVenc": dt.strptime(
-                        d.find('nfe:dVenc', ns).text[:10],
-                        "%Y-%m-%d").strftime("%d/%m/%Y")
-        })
-
-    # converte ponto→vírgula para o SGI
-    for dup in dups:
-        dup["vDup"] = dup["vDup"].replace('.', ',')
-
-    return {"numero_nf": nf,
-            "data_emissao": data,
-            "duplicatas":   dups}
+    """NF, data de emissão e duplicatas (×3 se houver desconto) no formato do SGI."""
+    nota = ler_nfe(xml_path)
+    return {"numero_nf": nota.numero,
+            "data_emissao": nota.data_emissao_br,
+            "duplicatas":   nota.parcelas_sgi()}
 
 # ---------- Tabela de parcelas ----------
+TABELA_PARCELAS = "tabela_vencimentos_titulo"
+PARCELAS_EM_LOTE = os.environ.get("SGI_PARCELAS_EM_LOTE", "1") != "0"
+# (coluna, seletor do editor inline, campo da duplicata); complemento é sempre "X"
+_CELULAS_PARCELA = ((1, "input[id*='data_vencimento']", "dVenc"),
+                    (-2, "input[id*='valor_nominal']", "vDup"),
+                    (4, "input[id*='complemento']", None))
+
+
+def _parcela_confere(celulas, dup) -> bool:
+    """Linha da grade lida de volta bate com a duplicata (vencimento e valor)?"""
+    if len(celulas) < 5:
+        return False
+    return (dup["dVenc"] in celulas[1]
+            and abs(sgi_dom.numero_br(celulas[-2], -1) - sgi_dom.numero_br(dup["vDup"])) < 0.005)
+
+
+def _preencher_parcelas_em_lote(driver, duplicatas) -> list:
+    """
+    Escreve vencimento, valor e complemento de todas as parcelas (a partir da
+    2ª) numa passada de script; lê a grade de volta UMA vez e devolve os
+    índices das linhas que não conferem com as duplicatas.
+    """
+    edicoes = [
+        {"linha": i, "coluna": col, "seletor": sel,
+         "valor": dup[campo].replace('.', ',') if campo == "vDup" else (dup[campo] if campo else "X")}
+        for i, dup in enumerate(duplicatas[1:], start=1)
+        for col, sel, campo in _CELULAS_PARCELA
+    ]
+    sgi_dom.editar_celulas(driver, TABELA_PARCELAS, edicoes)
+    tentar(driver, ajax_ocioso, "boleto.parcelas_lote", teto=5)
+    grade = sgi_dom.valores_tabela(driver, TABELA_PARCELAS)
+    return [i for i, dup in enumerate(duplicatas[1:], start=1)
+            if i >= len(grade) or not _parcela_confere(grade[i], dup)]
+
+
 def preencher_parcelas(driver, duplicatas):
-    tabela = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "tabela_vencimentos_titulo")))
+    tabela = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, TABELA_PARCELAS)))
     expected = len(duplicatas)
-    for _ in range(20):
-        if len(tabela.find_elements(By.XPATH, ".//tbody/tr")) >= expected:
-            break
-        time.sleep(0.5)
-    else:
+    if not tentar(driver, lambda d: len(tabela.find_elements(By.XPATH, ".//tbody/tr")) >= expected,
+                  "boleto.linhas_parcelas", teto=10):
         raise Exception("Tabela de parcelas não carregou linhas suficientes.")
-    # começa do segundo boleto
-    for i, dup in enumerate(duplicatas[1:], start=1):
+
+    # começa do segundo boleto; em lote primeiro, célula a célula só o que não conferiu
+    indices = list(range(1, len(duplicatas)))
+    if PARCELAS_EM_LOTE and indices:
+        indices = _preencher_parcelas_em_lote(driver, duplicatas)
+        logging.info(f"Parcelas em lote: {len(duplicatas) - 1 - len(indices)}/{len(duplicatas) - 1} "
+                     f"conferidas; {len(indices)} célula a célula.")
+    for i in indices:
+        dup = duplicatas[i]
         linha = tabela.find_elements(By.XPATH, ".//tbody/tr")[i]
 
         cell_venc = linha.find_elements(By.TAG_NAME, "td")[1]
@@ -929,18 +1373,18 @@ def preencher_parcelas(driver, duplicatas):
 
 # ---------- Cadastro de Título ----------
 def cadastrar_titulo(driver, info):
-    driver.get("https://smart.sgisistemas.com.br/titulos/new")
+    driver.get(f"{SGI_URL}/titulos/new")
 
-    # Autocompletes principais
-    autocomp(driver, "autocompletar_tipo_titulo_id", "Pagar")
-    autocomp(driver, "autocompletar_pessoa_cliente_fornecedor_id", "MATIC INDUSTRIA DE MÓVEIS LTDA")
+    # Autocompletes principais (valores fixos → ids em cache, sem ida ao servidor)
+    autocomp_cacheado(driver, "autocompletar_tipo_titulo_id", "Pagar")
+    autocomp_cacheado(driver, "autocompletar_pessoa_cliente_fornecedor_id", "MATIC INDUSTRIA DE MÓVEIS LTDA")
     Select(driver.find_element(By.ID, "conta_financeira_id")).select_by_value("2")
     driver.find_element(By.ID, "numero_titulo").send_keys(info["numero_nf"])
     driver.find_element(By.ID, "complemento").send_keys("X")
-    autocomp(driver, "autocompletar_forma_pagamento_id", "Boleto *")
-    autocomp(driver, "autocompletar_portador_titulo_id", "Carteira")
-    selecionar_autocomplete_exato(driver, "autocompletar_historico_receita_despesa_id",
-                                  "Pagamento de Fornecedor", "Pagamento de Fornecedor")
+    autocomp_cacheado(driver, "autocompletar_forma_pagamento_id", "Boleto *")
+    autocomp_cacheado(driver, "autocompletar_portador_titulo_id", "Carteira")
+    autocomp_cacheado(driver, "autocompletar_historico_receita_despesa_id",
+                      "Pagamento de Fornecedor", "Pagamento de Fornecedor")
 
     # Datas e valores
     elem_data = driver.find_element(By.ID, "data_emissao"); elem_data.clear(); elem_data.send_keys(info["data_emissao"])
@@ -952,13 +1396,16 @@ def cadastrar_titulo(driver, info):
     campo_parcelas = driver.find_element(By.ID, "quantidade_parcelas")
     apagar_e_digitar(campo_parcelas, str(len(info["duplicatas"])))
     campo_parcelas.send_keys(Keys.TAB)
-    time.sleep(1.5)
+    tentar(driver, ajax_ocioso, "boleto.gerar_parcelas", teto=5)
 
     if len(info["duplicatas"]) > 1:
         preencher_parcelas(driver, info["duplicatas"])
 
+    url_form = driver.current_url
     driver.find_element(By.XPATH, '//input[@type="submit" and @value="Salvar"]').click()
-    time.sleep(1.5)
+    tentar(driver, qualquer(saiu=url_muda(url_form),
+                            alerta=EC.presence_of_element_located((By.CSS_SELECTOR, '.alert-danger'))),
+           "boleto.salvar", teto=10, confirmacao=True)
     # Retorna True se não há alerta de erro
     return not driver.find_elements(By.CSS_SELECTOR, '.alert-danger')
 
@@ -970,28 +1417,29 @@ def cadastrar_boletos(driver, lista_nf_link):
         valor_boleto = _read_cell(linha, COL["XML BOLETO SALVO SGI"], default="")
         if _celula_true(valor_boleto):
             continue
-        possiveis = [f for f in os.listdir(PASTA_LOCAL_XML)
-             if f.startswith(nf) and f.lower().endswith('.xml')
-             and ('feito' in f.lower() or 'ja_importado' in f.lower())]
-        xml_path = os.path.join(PASTA_LOCAL_XML, possiveis[0]) if possiveis else None
-        if not xml_path:
+        reg = _catalogo().por_nf(nf)
+        xml_path = reg["caminho"] if reg and reg["status"] != catalogo_xml.BAIXADO else None
+        if not xml_path or not os.path.exists(xml_path):
             logging.warning(f"XML {nf} não encontrado para boleto"); continue
 
         info = extrair_info_xml(xml_path)
         _garantir_sessao(driver)
-        tentativas, sucesso = 0, False
-        while tentativas < 3 and not sucesso:
-            try:
-                sucesso = cadastrar_titulo(driver, info)
-                if not sucesso:
-                    logging.error(f"NF {nf} – erro ao salvar (alerta na página).")
-                else:
-                    _update_cell(linha, COL["XML BOLETO SALVO SGI"], "VERDADEIRO")
-                    boletos_ok.append(nf)
-            except Exception as e:
-                logging.error(f"NF {nf} – erro inesperado: {e}")
-                driver.refresh()
-            tentativas += 1
+        with metricas.medir("boleto.nf", nf=nf):
+            tentativas, sucesso = 0, False
+            while tentativas < 3 and not sucesso:
+                try:
+                    sucesso = cadastrar_titulo(driver, info)
+                    if not sucesso:
+                        logging.error(f"NF {nf} – erro ao salvar (alerta na página).")
+                        metricas.contar("boleto.tentativas_falhas")
+                        _cache_autocomplete().limpar()   # próxima tentativa resolve os ids de novo
+                    else:
+                        _update_cell(linha, COL["XML BOLETO SALVO SGI"], "VERDADEIRO")
+                        boletos_ok.append(nf)
+                except Exception as e:
+                    logging.error(f"NF {nf} – erro inesperado: {e}")
+                    driver.refresh()
+                tentativas += 1
         if not sucesso:
             logging.error(f"NF {nf} – falhou após 3 tentativas.")
     return boletos_ok
@@ -1000,7 +1448,7 @@ def cadastrar_boletos(driver, lista_nf_link):
 def cadastrar_boletos_para_nfs(driver, nfs_importadas):
     """
     Recebe uma lista de números de NF (strings) e cadastra os boletos
-    para cada uma, usando o XML da pasta local (FEITO_TMP/JA_IMPORTADO_TMP também serve).
+    para cada uma, usando o XML indexado no catálogo local.
     Reaproveita a função cadastrar_boletos existente.
     """
     # elimina duplicatas e transforma em tuplas (nf, None) para compatibilidade
@@ -1010,52 +1458,176 @@ def cadastrar_boletos_para_nfs(driver, nfs_importadas):
 # =========================================
 # Sessão 8.0 – Renomear XMLs e Drive
 # =========================================
-def renomear_xmls():
-    for f in glob.glob(os.path.join(PASTA_LOCAL_XML, "*(FEITO_TMP).xml")) \
-            + glob.glob(os.path.join(PASTA_LOCAL_XML, "*(JA_IMPORTADO_TMP).xml")):
-        os.rename(f, f.replace("(FEITO_TMP)", "(FEITO)").replace("(JA_IMPORTADO_TMP)", "(FEITO)"))
-
-    from app.google_sheets_auth import load_sa_credentials
-    creds_drive=load_sa_credentials(["https://www.googleapis.com/auth/drive"])
-    drive=build("drive","v3",credentials=creds_drive, cache_discovery=False)
-    for f in drive.files().list(q=f"'{ID_PASTA_GOOGLE_DRIVE}' in parents and trashed=false and name contains '(FEITO_TMP)'",
-                                fields="files(id,name)").execute().get("files",[]):
-        novo = f["name"].replace("(FEITO_TMP)","(FEITO)")
-        drive.files().update(fileId=f["id"],body={'name':novo}).execute()
+def encerrar_xml(reg):
+    """Marca um XML como FEITO, arquiva o arquivo local e devolve o nome "(FEITO)"."""
+    cat = _catalogo()
+    cat.marcar(reg["chave"], catalogo_xml.FEITO)
+    cat.arquivar(reg["chave"])
+    return reg["nome"].replace(".xml", "(FEITO).xml")
 
 # =========================================
 # Sessão 8.1 – Renomear também no Google Drive
 # =========================================
-def renomear_feitos_no_drive():
+def renomear_feitos_no_drive(renomeados=None):
     """
-    Procura no Drive o XML original e o renomeia para (FEITO).xml
-    usando o mesmo nome já renomeado localmente.
+    Renomeia no Drive o XML original para (FEITO).xml, usando o mesmo nome
+    já renomeado localmente. Lista a pasta UMA vez (nome → id), cruza com os
+    arquivos encerrados nesta execução (`renomeados`; se None, todos os
+    FEITO do catálogo) e aplica as alterações em lotes de 100.
+    Devolve os nomes de `renomeados` que já estão certos no Drive (renomeados
+    agora ou ausentes da pasta).
     """
-    from app.google_sheets_auth import load_sa_credentials
-    SCOPES = ['https://www.googleapis.com/auth/drive']
-    creds  = load_sa_credentials(SCOPES)
-    drive  = build('drive', 'v3', credentials=creds, cache_discovery=False)
-
-    arquivos_feitos = [
-        f for f in os.listdir(PASTA_LOCAL_XML)
-        if f.lower().endswith('(feito).xml')
-    ]
-    for nome_feito in arquivos_feitos:
-        nome_original     = nome_feito.replace('(FEITO)', '').strip()
-        nome_novo_drive   = nome_feito
-        query = (
-            f"'{ID_PASTA_GOOGLE_DRIVE}' in parents and trashed=false "
-            f"and name = '{nome_original}'"
-        )
-        files = drive.files().list(q=query, fields="files(id,name)").execute().get('files', [])
-        if files:
-            drive.files().update(
-                fileId=files[0]['id'],
-                body={'name': nome_novo_drive}
-            ).execute()
-            logging.info(f"Drive: {nome_original} → {nome_novo_drive}")
+    from app import google_clients
+    from app.drive_sync import listar_pasta, renomear_em_lote
+    drive  = google_clients.drive(escrita=True)
+
+    if renomeados is None:
+        renomeados = [r["nome"].replace(".xml", "(FEITO).xml")
+                      for r in _catalogo().com_status(catalogo_xml.FEITO)]
+    if not renomeados:
+        return []
+
+    # nome → id dos XMLs da pasta ainda sem (FEITO) (inclui sobras "(FEITO_TMP)")
+    por_nome = {}
+    for f in listar_pasta(drive, ID_PASTA_GOOGLE_DRIVE,
+                          "name contains '.xml' and not name contains '(FEITO)'", campos="id,name"):
+        por_nome.setdefault(f["name"], f["id"])
+
+    renomes = {}   # id -> novo nome
+    for nome, fid in por_nome.items():
+        if "(FEITO_TMP)" in nome:
+            renomes[fid] = nome.replace("(FEITO_TMP)", "(FEITO)")
+    prontos = []
+    for nome_feito in renomeados:
+        nome_original = nome_feito.replace('(FEITO)', '').strip()
+        fid = por_nome.get(nome_original)
+        if fid:
+            renomes[fid] = nome_feito
         else:
             logging.info(f"Drive: {nome_original} já renomeado ou não encontrado.")
+            prontos.append(nome_feito)
+
+    if not renomes:
+        return prontos
+    falhas = renomear_em_lote(drive, renomes)
+    for fid, novo in renomes.items():
+        if fid in falhas:
+            logging.warning(f"⚠️ Drive: falha ao renomear para {novo}: {falhas[fid]}")
+        else:
+            logging.info(f"Drive: → {novo}")
+    logging.info(f"Drive: {len(renomes) - len(falhas)}/{len(renomes)} renomeado(s) "
+                 f"em {(len(renomes) + 99) // 100} requisição(ões) batch.")
+    return prontos + [novo for fid, novo in renomes.items() if fid not in falhas]
+
+
+# =========================================
+# Sessão 8.2 – Pipeline por NF (diário retomável)
+# =========================================
+from app import diario_nf
+
+_DIARIO = None
+_LOCK_DIARIO = threading.Lock()
+
+def _diario():
+    """Diário das etapas por NF (mesmo arquivo SQLite do catálogo); um só para todos os workers."""
+    global _DIARIO
+    with _LOCK_DIARIO:
+        if _DIARIO is None:
+            _DIARIO = diario_nf.DiarioNF(CATALOGO_DB)
+        return _DIARIO
+
+def _etapa_nf(driver, etapa, reg):
+    """Executa `etapa` para a NF de `reg`. Devolve (resultado, concluída?)."""
+    nf = reg["nf"]
+    if etapa == diario_nf.IMPORTAR:
+        (_nf, st), = importar_xmls_em_lote(driver, [reg])
+        return st, st != "ERRO"          # ERRO: continua BAIXADO e volta na próxima execução
+
+    if etapa == diario_nf.VINCULAR:
+        (_nf, st), = importar_e_vincular(driver, [nf])
+        return st, True
+
+    linha = _get_or_create_row(nf)
+    if etapa == diario_nf.ENTRADA:
+        if _diario().ultimo_resultado(reg["chave"], diario_nf.VINCULAR) != "OK":
+            return "PULADA", True        # entrada só nas NFs que vincularam OK
+        if _celula_true(_read_cell(linha, COL["XML ENTRADA SALVA SGI"])):   # salva antes de uma queda
+            return _read_cell(linha, COL["LINK LANÇAMENTO SGI"]) or "OK", True
+        ok = gerar_entradas(driver, [nf])
+        return (ok[0][1] if ok else "ERRO"), True
+
+    if etapa == diario_nf.BOLETO:
+        if _celula_true(_read_cell(linha, COL["XML BOLETO SALVO SGI"])):
+            return "OK", True
+        return ("OK" if cadastrar_boletos_para_nfs(driver, [nf]) else "ERRO"), True
+
+    # RENOMEAR: encerra o XML local; a etapa só conclui após o lote no Drive (fim da execução)
+    encerrar_xml(reg)
+    return None, False
+
+def processar_nfs(driver, regs):
+    """
+    Leva cada NF (registro do catálogo) por importar → vincular → entrada →
+    boleto → renomear sem esperar as outras NFs. Cada transição vai para o
+    diário (pela chave de acesso); uma NF começada numa execução anterior
+    continua a partir da etapa seguinte à última concluída. Um XML cujo nº
+    de NF também é de outra chave segue normalmente; a colisão sai no
+    relatório (a planilha tem uma linha por nº, compartilhada pelos dois).
+    Devolve [(nf, {etapa: resultado})].
+    """
+    diario, saidas = _diario(), []
+    for reg in regs:
+        nf, chave = reg["nf"], reg["chave"]
+        resultados = {}
+        outra = diario.reservar(chave, nf)
+        if outra is not None:
+            aviso = f"NF REPETIDA (nº também no XML {outra}; linha da planilha compartilhada)"
+            logging.warning(f"⚠️ NF {nf}: {reg['nome']} – {aviso}")
+            resultados["PRÉ-VALIDAÇÃO"] = aviso
+        etapa = diario.proxima_etapa(chave)
+        if etapa == diario_nf.IMPORTAR and reg["status"] in catalogo_xml.EM_ANDAMENTO:
+            etapa = diario_nf.VINCULAR   # importada antes de existir o diário
+        if etapa is None:
+            logging.info(f"NF {nf}: pipeline já concluído para este XML.")
+            continue
+        logging.info(f"▶️ NF {nf}: a partir de {etapa}")
+
+        _garantir_sessao(driver)
+        for etapa in diario_nf.ETAPAS[diario_nf.ETAPAS.index(etapa):]:
+            diario.iniciar(chave, etapa)
+            try:
+                resultado, concluida = _etapa_nf(driver, etapa, reg)
+            except Exception as e:
+                logging.error(f"NF {nf}: erro em {etapa} – {e}")
+                # importar/renomear com erro voltam na próxima execução; as demais não se repetem
+                resultado, concluida = "ERRO", etapa not in (diario_nf.IMPORTAR, diario_nf.RENOMEAR)
+            if resultado is None:
+                break
+            resultados[etapa] = resultado
+            if concluida:
+                diario.concluir(chave, etapa, resultado)
+            else:
+                diario.falhar(chave, etapa, resultado)
+                break
+        _flush_planilha()   # a planilha acompanha o diário NF a NF
+        saidas.append((nf, resultados))
+    return saidas
+
+def renomear_pendentes_no_drive():
+    """
+    Aplica no Drive, em lote, o "(FEITO)" das NFs encerradas localmente (desta
+    execução ou de uma anterior interrompida) e conclui a etapa no diário.
+    """
+    diario, cat = _diario(), _catalogo()
+    chave_por_nome = {}
+    for chave, _nf in diario.na_etapa(diario_nf.RENOMEAR):
+        reg = cat.por_chave(chave)
+        if reg is not None and reg["status"] == catalogo_xml.FEITO:
+            chave_por_nome[reg["nome"].replace(".xml", "(FEITO).xml")] = chave
+    if not chave_por_nome:
+        return
+    for nome in renomear_feitos_no_drive(list(chave_por_nome)):
+        diario.concluir(chave_por_nome[nome], diario_nf.RENOMEAR)
 
 
 # =========================================
@@ -1067,10 +1639,8 @@ def enviar_whatsapp_texto(mensagem, chrome_user_dir):
     usando o perfil persistente do Chrome (chrome_user_dir).
     Mantém o loop de verificação “Carregando conversas…” e screenshot de erro.
     """
-    from selenium.webdriver.common.by import By
-    from selenium.webdriver.common.keys import Keys
-    from selenium.webdriver.support.ui import WebDriverWait
     import time
+    _carregar_selenium()
 
     options = webdriver.ChromeOptions()
     options.add_argument(f"--user-data-dir={chrome_user_dir}")
@@ -1157,9 +1727,28 @@ def _release_lock():
     except Exception:
         pass
 
+def _exportar_metricas(duracao_s):
+    """Fecha o span da execução, junta os contadores da planilha/APIs e grava JSON + textfile."""
+    metricas.registrar("execucao", duracao_s)
+    if _ESCRITOR is not None:
+        metricas.contar("planilha.celulas", _ESCRITOR.celulas_escritas)
+        metricas.contar("planilha.batch_updates", _ESCRITOR.chamadas_api)
+    from app import google_exec
+    for api, e in google_exec.ESTATISTICAS.items():
+        metricas.contar(f"google.{api}.chamadas", e["chamadas"])
+        metricas.contar(f"google.{api}.retries", e["retries"])
+    try:
+        caminho = metricas.exportar(METRICAS_DIR, METRICAS_PROM)
+        logging.info(f"📈 Métricas da execução: {caminho}")
+    except Exception as e:
+        logging.warning(f"⚠️ Métricas não exportadas: {e}")
+
 # --- MAIN (versão com validação de ENV, logs claros e fallback robusto) -------
 def main():
+    from googleapiclient.errors import HttpError
+    _configurar_logging()
     logging.info("🚀 main() — INÍCIO")
+    inicio_execucao = time.monotonic()
 
     # Normaliza e valida ENV (inclui URL→ID da pasta do Drive)
     global ID_PASTA_GOOGLE_DRIVE
@@ -1175,10 +1764,14 @@ def main():
         return
     
     try:
+        # Uma única leitura da planilha por execução (as etapas usam a cópia local)
+        _snapshot(recarregar=True)
+
         # Baixa do Drive (com logs bem visíveis caso falhe)
         logging.info("🔎 Iniciando baixar_xmls_drive()")
         try:
             baixar_xmls_drive()
+            _flush_planilha()
             logging.info("✅ baixar_xmls_drive() concluiu")
         except HttpError as e:
             if getattr(e, "resp", None) and e.resp.status == 404:
@@ -1190,99 +1783,73 @@ def main():
             logging.exception("💥 Erro inesperado em baixar_xmls_drive()")
             return
 
-        # 1) Existe algo pra processar?
-        arquivos = [
-            a for a in os.listdir(PASTA_LOCAL_XML)
-            if a.lower().endswith(".xml")
-            and "(feito" not in a.lower()
-            and "(ja_importado" not in a.lower()
-        ]
-        if not arquivos:
+        # 1) Existe algo pra processar? (pré-validação local antes de abrir o navegador)
+        arquivos, rejeitados = prevalidacao.prevalidar(
+            _catalogo(), _catalogo().com_status(catalogo_xml.BAIXADO))
+        rel = {etapa: [] for etapa in
+               ("PRÉ-VALIDAÇÃO", "IMPORTAR XML", "VINCULAR PRODUTOS", "GERAR ENTRADA", "GERAR BOLETO")}
+        for res in rejeitados:
+            rel["PRÉ-VALIDAÇÃO"].append(f"- {res.nf or os.path.basename(res.caminho)} {res.motivo}")
+
+        # NFs já importadas que uma execução interrompida deixou no meio do caminho
+        chaves = {reg["chave"] for reg in arquivos}
+        retomadas = [reg for reg in _catalogo().com_status(*catalogo_xml.EM_ANDAMENTO)
+                     if reg["chave"] not in chaves]
+        if retomadas:
+            logging.info(f"↩️ Retomando {len(retomadas)} NF(s) de execução anterior (diário).")
+        pendentes = list(arquivos) + retomadas
+        if not pendentes:
+            if rejeitados:
+                logging.info("Relatório gerado:\n*PRÉ-VALIDAÇÃO*\n" + "\n".join(rel["PRÉ-VALIDAÇÃO"]))
             logging.info("📭 Nenhum XML pendente para processar (pasta local vazia após baixar do Drive).")
+            renomear_pendentes_no_drive()
             return
 
-        driver = novo_driver()
-        rel = {etapa: [] for etapa in
-               ("IMPORTAR XML", "VINCULAR PRODUTOS", "GERAR ENTRADA", "GERAR BOLETO")}
-        texto = ""
+        # estado compartilhado pelos workers: criado aqui, antes das threads do pool
+        _diario()
+        _cache_autocomplete()
 
-        # placeholders p/ não dar NameError no relatório
-        nfs_imp = []
-        nfs_vinc = []
-        entradas_ok = []
-        boletos_ok = []
+        # N sessões (SGI_WORKERS), nunca mais que o número de NFs
+        pool = sgi_pool.PoolSGI(min(sgi_pool.WORKERS, len(pendentes)), novo_driver, login)
+        texto = ""
+        resultados = []   # [(nf, {etapa: resultado})]
 
         try:
-            login(driver)
-
-            # 3) IMPORTAR TODOS OS XMLs
-            nfs_imp = importar_xmls_em_lote(driver, arquivos)   # list[(nf, status)]
+            pool.abrir()                                        # abre e loga cada sessão
 
-            # 4) VINCULAR (best effort)
-            nfs_vinc = importar_e_vincular(driver)              # list[(nf, "OK"|"ERRO")]
-
-            # 5) GERAR ENTRADA (somente nas que vincularam OK)
-            try:
-                entradas_ok = gerar_entradas(driver, [nf for nf, st in nfs_vinc if st == "OK"])  # list[(nf, link)]
-            except Exception:
-                logging.exception("Erro ao gerar entradas; prosseguindo mesmo assim para boletos.")
+            # 3) Cada NF segue sozinha: importar → vincular → entrada → boleto → renomear
+            with metricas.medir("pipeline"):
+                resultados = pool.mapear("PIPELINE NF", processar_nfs, pendentes)
+            metricas.contar("nfs.processadas", len(resultados))
+            _flush_planilha()
 
         finally:
-            # 6) BOLETOS (SEMPRE) – para TODAS as NFs importadas, mesmo com erros anteriores
-            try:
-                nfs_para_boleto = [nf for nf, _st in nfs_imp] if nfs_imp else []
-                if nfs_para_boleto:
-                    boletos_ok = cadastrar_boletos_para_nfs(driver, nfs_para_boleto)  # list[nf]
-            except Exception:
-                logging.exception("Erro ao cadastrar boletos (bloco finally).")
-
             # ======= Montagem do relatório =======
             try:
                 cabecalho = "*MATIC - ENTRADA DE XML FINALIZADA*\n"
 
-                # Importação
-                for _nf, *status in nfs_imp:
-                    rel["IMPORTAR XML"].append(f"- {_nf} {status[0] if status else 'OK'}")
-
-                # Vincular
-                for _nf, st in nfs_vinc:
-                    rel["VINCULAR PRODUTOS"].append(f"- {_nf} {st}")
-
-                # Entrada
-                nfs_que_viraram_entrada = {nf for nf, _link in entradas_ok}
-                for _nf, _link in entradas_ok:
-                    rel["GERAR ENTRADA"].append(f"- {_nf} OK ({_link})")
-                for _nf, st in nfs_vinc:
-                    if st == "OK" and _nf not in nfs_que_viraram_entrada:
-                        rel["GERAR ENTRADA"].append(f"- {_nf} ERRO")
-
-                # Boletos
-                for _nf in boletos_ok:
-                    rel["GERAR BOLETO"].append(f"- {_nf} OK")
-                for _nf in (set([nf for nf, _ in nfs_imp]) - set(boletos_ok)):
-                    rel["GERAR BOLETO"].append(f"- {_nf} ERRO")
+                for _nf, res in resultados:
+                    for etapa, st in res.items():
+                        if etapa not in rel or st == "PULADA":
+                            continue
+                        if etapa == diario_nf.ENTRADA and st not in ("OK", "ERRO"):
+                            st = f"OK ({st})"                  # resultado da entrada = link do lançamento
+                        rel[etapa].append(f"- {_nf} {st}")
 
                 houve_atividade = any(rel[etapa] for etapa in rel)
                 if houve_atividade:
                     texto = cabecalho + "\n\n" + "\n\n".join(
                         f"*{etapa}*\n" + "\n".join(rel[etapa])
-                        for etapa in ("IMPORTAR XML", "VINCULAR PRODUTOS", "GERAR ENTRADA", "GERAR BOLETO")
+                        for etapa in rel
                         if rel[etapa]
                     )
             finally:
                 # encerra e rotinas finais
-                try:
-                    # Limpar perfil único do Chrome
-                    prof = getattr(driver, "_lebebe_profile_dir", None)
-                    if prof and os.path.isdir(prof):
-                        import shutil
-                        shutil.rmtree(prof, ignore_errors=True)
-                    driver.quit()
-                except Exception:
-                    pass
+                logging.info(f"🧵 SGI por worker: {pool.relatorio()}")
+                pool.fechar()   # fecha os navegadores e apaga os perfis únicos
 
-                renomear_xmls()
-                renomear_feitos_no_drive()
+                with metricas.medir("drive.renomear"):
+                    renomear_pendentes_no_drive()   # lote único no Drive; conclui RENOMEAR no diário
 
                 # WhatsApp notification desabilitado em container
                 if texto.strip():
@@ -1292,11 +1859,23 @@ def main():
         logging.info("Processo COMPLETO concluído!")
     
     finally:
+        _flush_planilha()
+        if _ESCRITOR is not None:
+            logging.info(f"📊 Planilha: {_ESCRITOR.celulas_escritas} célula(s), "
+                         f"{_ESCRITOR.chamadas_api} batchUpdate(s), "
+                         f"{_ESCRITOR.chamadas_economizadas} chamadas economizadas.")
+        from app import google_exec
+        logging.info(f"📊 APIs Google: {google_exec.resumo()}")
+        logging.info(f"⏱️ Esperas SGI: {sgi_espera.resumo()}")
+        if _CATALOGO is not None:
+            logging.info(f"🔗 Índice de referências: {_CATALOGO.resumo_referencias()}")
+        _exportar_metricas(time.monotonic() - inicio_execucao)
         _release_lock()
         logging.info("✅ main() — FIM")
 
 # --- Entry point (chama selftests e depois o fluxo) ---------------------------
 if __name__ == "__main__":
+    _configurar_logging()
     logging.getLogger("googleapiclient.discovery").setLevel(logging.ERROR)
     logging.info("==== Iniciando vincular_notas_entrada_matic ====")
 
@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+"""
+drive_mock.py
+Servidor HTTP local que imita o pedaço da API do Google Drive v3 usado por
+app.drive_sync e app.drive_download (nada aqui é o Drive de verdade):
+1) files.list com o subconjunto de `q` que a automação monta ('<id>' in
+   parents, trashed, mimeType, name contains / not name contains) e paginação
+   por pageSize/pageToken
+2) files.get (metadados ou alt=media com Range → 206 + Content-Range) e
+   files.update (PATCH, renomear)
+3) changes.getStartPageToken / changes.list sobre um log de mudanças; cursor
+   desconhecido → 400, como o Drive
+4) Endpoint batch (POST /batch/drive/v3, multipart/mixed) executando cada
+   parte pelo mesmo roteamento
+5) Falhas injetáveis: as próximas N requisições (ou partes de batch) → 503
+Cada requisição espera --latencia-ms (± --jitter-ms) antes de responder.
+
+Uso (na raiz do repositório):
+    python bench/drive_mock.py [--porta 8766] [--xmls 250] [--latencia-ms 50]
+e aponte a automação para ele com
+    DRIVE_API_ENDPOINT=http://127.0.0.1:8766/drive/v3/ GOOGLE_CREDENCIAIS_ANONIMAS=1
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import secrets
+import argparse
+import tempfile
+import threading
+from email import message_from_bytes
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+MIME_PASTA = "application/vnd.google-apps.folder"
+PASTA_PADRAO = "pasta-xmls"
+PREFIXO = "/drive/v3"
+
+
+def _agora() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def _erro(status: int, motivo: str, mensagem: str) -> tuple:
+    """Corpo de erro no formato do Google (HttpError lê `error.errors[].reason`)."""
+    corpo = {"error": {"code": status, "message": mensagem,
+                       "errors": [{"domain": "global", "reason": motivo, "message": mensagem}]}}
+    return status, {"Content-Type": "application/json; charset=UTF-8"}, json.dumps(corpo).encode()
+
+
+def _json(dados, status: int = 200) -> tuple:
+    return status, {"Content-Type": "application/json; charset=UTF-8"}, \
+        json.dumps(dados, ensure_ascii=False).encode("utf-8")
+
+
+# =========================================
+# Consulta `q`
+# =========================================
+_CLAUSULAS = [
+    (re.compile(r"'([^']+)' in parents"), lambda f, v: v in f["parents"]),
+    (re.compile(r"trashed = (true|false)"), lambda f, v: f["trashed"] == (v == "true")),
+    (re.compile(r"mimeType = '([^']+)'"), lambda f, v: f["mimeType"] == v),
+    (re.compile(r"mimeType != '([^']+)'"), lambda f, v: f["mimeType"] != v),
+    (re.compile(r"not name contains '([^']+)'"), lambda f, v: v not in f["name"]),
+    (re.compile(r"name contains '([^']+)'"), lambda f, v: v in f["name"]),
+]
+
+
+def filtro_q(q: str):
+    """`q` (cláusulas unidas por ' and ') → predicado; ValueError se não souber avaliar."""
+    testes = []
+    for clausula in filter(None, (c.strip() for c in (q or "").split(" and "))):
+        for regex, teste in _CLAUSULAS:
+            m = regex.fullmatch(clausula)
+            if m:
+                testes.append((teste, m.group(1)))
+                break
+        else:
+            raise ValueError(f"Invalid Value: {clausula}")
+    return lambda f: all(teste(f, v) for teste, v in testes)
+
+
+# =========================================
+# Estado
+# =========================================
+class EstadoDrive:
+    """Arquivos + log de mudanças do Drive simulado (thread-safe)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.arquivos = {}      # id -> metadados (+ "_conteudo")
+        self.mudancas = []      # [(fileId, removido)]; o cursor é a posição no log
+        self.falhas_503 = 0
+        self.requisicoes = Counter()
+
+    def _mudou(self, fid: str, removido: bool = False):
+        self.mudancas.append((fid, removido))
+
+    def adicionar(self, nome: str, conteudo: bytes = b"", pasta: str = PASTA_PADRAO,
+                  mime: str = "text/xml") -> str:
+        """Cria um arquivo (aparece na Changes API). Retorna o id."""
+        with self.lock:
+            fid = secrets.token_hex(8)
+            self.arquivos[fid] = {
+                "id": fid, "name": nome, "parents": [pasta], "trashed": False, "mimeType": mime,
+                "md5Checksum": hashlib.md5(conteudo).hexdigest(), "size": str(len(conteudo)),
+                "modifiedTime": _agora(), "_conteudo": conteudo,
+            }
+            self._mudou(fid)
+            return fid
+
+    def renomear(self, fid: str, nome: str):
+        with self.lock:
+            self.arquivos[fid].update(name=nome, modifiedTime=_agora())
+            self._mudou(fid)
+
+    def lixeira(self, fid: str):
+        with self.lock:
+            self.arquivos[fid].update(trashed=True, modifiedTime=_agora())
+            self._mudou(fid)
+
+    def remover(self, fid: str):
+        with self.lock:
+            self.arquivos.pop(fid, None)
+            self._mudou(fid, removido=True)
+
+    def falhar(self, n: int = 1):
+        """As próximas `n` requisições (ou partes de batch) respondem 503."""
+        with self.lock:
+            self.falhas_503 += n
+
+    def _consumir_falha(self) -> bool:
+        with self.lock:
+            if self.falhas_503 > 0:
+                self.falhas_503 -= 1
+                return True
+            return False
+
+    def resumo(self) -> dict:
+        with self.lock:
+            return {"arquivos": len(self.arquivos), "mudancas": len(self.mudancas),
+                    "requisicoes": dict(self.requisicoes)}
+
+
+def _publico(f: dict) -> dict:
+    return {k: v for k, v in f.items() if not k.startswith("_")}
+
+
+# =========================================
+# API (independente do transporte: HTTP direto ou parte de batch)
+# =========================================
+class APIDrive:
+    ROTAS = [
+        ("GET", r"/files", "listar"),
+        ("GET", r"/files/([\w-]+)", "obter"),
+        ("PATCH", r"/files/([\w-]+)", "atualizar"),
+        ("GET", r"/changes/startPageToken", "start_page_token"),
+        ("GET", r"/changes", "listar_mudancas"),
+    ]
+
+    def __init__(self, estado: EstadoDrive):
+        self.estado = estado
+
+    def despachar(self, metodo: str, caminho: str, query: dict, corpo: bytes, cabecalhos) -> tuple:
+        """→ (status, cabeçalhos, corpo)."""
+        if caminho.startswith(PREFIXO):
+            for verbo, padrao, nome in self.ROTAS:
+                m = re.fullmatch(padrao, caminho[len(PREFIXO):])
+                if verbo == metodo and m:
+                    with self.estado.lock:
+                        self.estado.requisicoes[nome] += 1
+                    if self.estado._consumir_falha():
+                        return _erro(503, "backendError", "Backend Error")
+                    return getattr(self, nome)(query, corpo, cabecalhos, *m.groups())
+        return _erro(404, "notFound", f"Not Found: {metodo} {caminho}")
+
+    def listar(self, query, _corpo, _cab):
+        try:
+            filtro = filtro_q(query.get("q", ""))
+        except ValueError as e:
+            return _erro(400, "invalid", str(e))
+        tamanho = min(int(query.get("pageSize", 100)), 1000)
+        inicio = int(query.get("pageToken") or 0)
+        with self.estado.lock:
+            todos = [_publico(f) for f in sorted(self.estado.arquivos.values(), key=lambda f: f["id"])
+                     if filtro(f)]
+        resp = {"files": todos[inicio:inicio + tamanho]}
+        if inicio + tamanho < len(todos):
+            resp["nextPageToken"] = str(inicio + tamanho)
+        return _json(resp)
+
+    def obter(self, query, _corpo, cab, fid):
+        with self.estado.lock:
+            f = self.estado.arquivos.get(fid)
+        if f is None:
+            return _erro(404, "notFound", f"File not found: {fid}")
+        if query.get("alt") != "media":
+            return _json(_publico(f))
+        conteudo, total = f["_conteudo"], len(f["_conteudo"])
+        m = re.fullmatch(r"bytes=(\d+)-(\d*)", cab.get("range") or "")
+        if not m:
+            return 200, {"Content-Type": f["mimeType"]}, conteudo
+        ini = int(m.group(1))
+        fim = min(int(m.group(2)) if m.group(2) else total - 1, total - 1)
+        if ini >= total:
+            return 416, {"Content-Range": f"bytes */{total}"}, b""
+        return 206, {"Content-Type": f["mimeType"], "Content-Range": f"bytes {ini}-{fim}/{total}"}, \
+            conteudo[ini:fim + 1]
+
+    def atualizar(self, _query, corpo, _cab, fid):
+        if fid not in self.estado.arquivos:
+            return _erro(404, "notFound", f"File not found: {fid}")
+        dados = json.loads(corpo or b"{}")
+        if "name" in dados:
+            self.estado.renomear(fid, dados["name"])
+        with self.estado.lock:
+            return _json(_publico(self.estado.arquivos[fid]))
+
+    def start_page_token(self, _query, _corpo, _cab):
+        with self.estado.lock:
+            return _json({"kind": "drive#startPageToken", "startPageToken": str(len(self.estado.mudancas))})
+
+    def listar_mudancas(self, query, _corpo, _cab):
+        token = query.get("pageToken", "")
+        with self.estado.lock:
+            total = len(self.estado.mudancas)
+            if not token.isdigit() or int(token) > total:
+                return _erro(400, "invalid", f"Invalid Value: pageToken {token}")
+            inicio = int(token)
+            tamanho = min(int(query.get("pageSize", 100)), 1000)
+            mudancas = []
+            for fid, removido in self.estado.mudancas[inicio:inicio + tamanho]:
+                f = self.estado.arquivos.get(fid)
+                ch = {"kind": "drive#change", "fileId": fid, "removed": removido or f is None}
+                if f is not None:
+                    ch["file"] = _publico(f)
+                mudancas.append(ch)
+        resp = {"changes": mudancas}
+        if inicio + tamanho < total:
+            resp["nextPageToken"] = str(inicio + tamanho)
+        else:
+            resp["newStartPageToken"] = str(total)
+        return _json(resp)
+
+
+# =========================================
+# HTTP
+# =========================================
+class HandlerDrive(BaseHTTPRequestHandler):
+    server_version = "DriveMock/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, formato, *args):
+        if self.server.verboso:
+            super().log_message(formato, *args)
+
+    def _latencia(self):
+        lat = self.server.latencia_s + random.uniform(-1, 1) * self.server.jitter_s
+        if lat > 0:
+            time.sleep(lat)
+
+    def _responder(self, status, cabecalhos, corpo):
+        self.send_response(status)
+        for nome, valor in cabecalhos.items():
+            self.send_header(nome, valor)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _despachar(self):
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        corpo = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if url.path == "/_mock/estado":
+            return self._responder(*_json(self.server.estado.resumo()))
+        self._latencia()
+        if self.command == "POST" and url.path == "/batch/drive/v3":
+            return self._responder(*self._batch(corpo))
+        cabecalhos = {k.lower(): v for k, v in self.headers.items()}
+        self._responder(*self.server.api.despachar(self.command, url.path, query, corpo, cabecalhos))
+
+    def _batch(self, corpo: bytes) -> tuple:
+        """Cada parte application/http vira uma chamada; resposta multipart/mixed na mesma ordem."""
+        with self.server.estado.lock:
+            self.server.estado.requisicoes["batch"] += 1
+        msg = message_from_bytes(b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + corpo)
+        if not msg.is_multipart():
+            return _erro(400, "badRequest", "Batch sem multipart/mixed")
+        fronteira = "batch_" + secrets.token_hex(8)
+        saida = []
+        for parte in msg.get_payload():
+            bruto = parte.get_payload(decode=True).replace(b"\r\n", b"\n")
+            cabeca, _, corpo_parte = bruto.partition(b"\n\n")
+            linha, *linhas = cabeca.decode("utf-8").split("\n")
+            metodo, alvo, _versao = linha.split(" ", 2)
+            url = urlsplit(alvo)
+            cabecalhos = dict((k.strip().lower(), v.strip()) for k, _, v in
+                              (ln.partition(":") for ln in linhas if ln.strip()))
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            status, cab, resposta = self.server.api.despachar(metodo, url.path, query, corpo_parte, cabecalhos)
+            content_id = (parte["Content-ID"] or "<>")[1:-1]
+            saida.append(
+                f"--{fronteira}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status < 300 else 'Error'}\r\n"
+                + "".join(f"{k}: {v}\r\n" for k, v in cab.items())
+                + "\r\n" + resposta.decode("utf-8") + "\r\n")
+        saida.append(f"--{fronteira}--\r\n")
+        return 200, {"Content-Type": f"multipart/mixed; boundary={fronteira}"}, "".join(saida).encode("utf-8")
+
+    def do_GET(self):
+        self._despachar()
+
+    def do_POST(self):
+        self._despachar()
+
+    def do_PATCH(self):
+        self._despachar()
+
+
+class ServidorDrive(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, porta=0, latencia_ms=0.0, jitter_ms=0.0, verboso=False):
+        super().__init__(("127.0.0.1", porta), HandlerDrive)
+        self.estado = EstadoDrive()
+        self.api = APIDrive(self.estado)
+        self.latencia_s, self.jitter_s = latencia_ms / 1000, jitter_ms / 1000
+        self.verboso = verboso
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    @property
+    def endpoint(self) -> str:
+        """Valor para DRIVE_API_ENDPOINT."""
+        return f"{self.url}{PREFIXO}/"
+
+    def iniciar(self) -> "ServidorDrive":
+        """Atende numa thread em segundo plano (para testes/benchmarks no mesmo processo)."""
+        threading.Thread(target=self.serve_forever, name="drive-mock", daemon=True).start()
+        return self
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--porta", type=int, default=8766)
+    ap.add_argument("--xmls", type=int, default=0, help=f"XMLs sintéticos criados na pasta '{PASTA_PADRAO}'")
+    ap.add_argument("--latencia-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("-v", "--verboso", action="store_true")
+    args = ap.parse_args()
+
+    servidor = ServidorDrive(args.porta, args.latencia_ms, args.jitter_ms, args.verboso)
+    if args.xmls:
+        from bench.gerar_nfe_sintetica import gerar_nfe
+        with tempfile.TemporaryDirectory() as tmp:
+            for nf in range(300000, 300000 + args.xmls):
+                caminho = gerar_nfe(os.path.join(tmp, f"{nf}_NFe.xml"), nf, 10, 1, False)
+                with open(caminho, "rb") as fh:
+                    servidor.estado.adicionar(os.path.basename(caminho), fh.read())
+    print(f"Drive (mock) em {servidor.endpoint} — pasta '{PASTA_PADRAO}', "
+          f"{args.xmls} XML(s), latência {args.latencia_ms:.0f}±{args.jitter_ms:.0f} ms")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+gerar_nfe_sintetica.py
+Gera XMLs de NF-e sintéticos (layout nfeProc 4.00) de tamanho configurável,
+para benchmarks e ensaios locais — nada aqui é uma nota fiscal válida.
+
+Uso:
+    python bench/gerar_nfe_sintetica.py PASTA [--notas 10] [--itens 300]
+                                              [--duplicatas 6] [--desconto]
+"""
+import os
+import random
+import argparse
+from datetime import date, timedelta
+from xml.sax.saxutils import escape
+
+NS = "http://www.portalfiscal.inf.br/nfe"
+CNPJ_EMIT = "12345678000199"
+CNPJ_DEST = "98765432000155"
+
+
+def _dv_chave(chave43: str) -> str:
+    """Dígito verificador (módulo 11) da chave de acesso."""
+    soma = sum(int(d) * p for d, p in zip(reversed(chave43), [2, 3, 4, 5, 6, 7, 8, 9] * 6))
+    dv = 11 - soma % 11
+    return "0" if dv >= 10 else str(dv)
+
+
+def chave_acesso(nf: int, emissao: date, cnpj: str = CNPJ_EMIT) -> str:
+    base = f"35{emissao:%y%m}{cnpj}55001{nf:09d}1{nf % 10**8:08d}"
+    return base + _dv_chave(base)
+
+
+def gerar_nfe(caminho: str, nf: int, itens: int = 50, duplicatas: int = 3,
+              desconto: bool = False, emissao: date = None, semente: int = None) -> str:
+    """Escreve uma NF-e com `itens` det e `duplicatas` dup em `caminho`."""
+    rnd = random.Random(semente if semente is not None else nf)
+    emissao = emissao or date(2024, 1, 1) + timedelta(days=nf % 365)
+    chave = chave_acesso(nf, emissao)
+    total = 0.0
+    with open(caminho, "w", encoding="utf-8") as fh:
+        fh.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<nfeProc xmlns="{NS}" versao="4.00"><NFe>'
+                 f'<infNFe Id="NFe{chave}" versao="4.00">'
+                 f'<ide><cUF>35</cUF><natOp>VENDA</natOp><mod>55</mod><serie>1</serie><nNF>{nf}</nNF>'
+                 f'<dhEmi>{emissao:%Y-%m-%d}T10:00:00-03:00</dhEmi><tpNF>1</tpNF></ide>'
+                 f'<emit><CNPJ>{CNPJ_EMIT}</CNPJ><xNome>MATIC INDUSTRIA DE MÓVEIS LTDA</xNome></emit>'
+                 f'<dest><CNPJ>{CNPJ_DEST}</CNPJ><xNome>LEBEBE DEPÓSITO</xNome></dest>')
+        for i in range(1, itens + 1):
+            qtd = rnd.randint(1, 20)
+            unit = round(rnd.uniform(50, 2500), 2)
+            vprod = round(qtd * unit, 2)
+            vdesc = round(vprod * 0.1, 2) if desconto and i % 3 == 0 else 0.0
+            total += vprod - vdesc
+            fh.write(f'<det nItem="{i}"><prod><cProd>{rnd.randint(1, 99999):05d}</cProd>'
+                     f'<cEAN>SEM GTIN</cEAN><xProd>{escape(f"MOVEL SINTETICO {i} - COR {rnd.randint(1, 40)}")}</xProd>'
+                     f'<NCM>94036000</NCM><CFOP>6101</CFOP><uCom>UN</uCom><qCom>{qtd:.4f}</qCom>'
+                     f'<vUnCom>{unit:.10f}</vUnCom><vProd>{vprod:.2f}</vProd>'
+                     + (f'<vDesc>{vdesc:.2f}</vDesc>' if vdesc else '') +
+                     f'<indTot>1</indTot></prod><imposto><ICMS><ICMS00><orig>0</orig><CST>00</CST>'
+                     f'<vBC>{vprod:.2f}</vBC><pICMS>12.00</pICMS><vICMS>{vprod * 0.12:.2f}</vICMS>'
+                     f'</ICMS00></ICMS></imposto></det>')
+        fh.write(f'<total><ICMSTot><vNF>{total:.2f}</vNF></ICMSTot></total><cobr>')
+        parcela = round(total / max(1, duplicatas), 2)
+        for d in range(1, duplicatas + 1):
+            fh.write(f'<dup><nDup>{d:03d}</nDup><dVenc>{emissao + timedelta(days=30 * d):%Y-%m-%d}</dVenc>'
+                     f'<vDup>{parcela:.2f}</vDup></dup>')
+        fh.write('</cobr></infNFe></NFe></nfeProc>\n')
+    return caminho
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("pasta")
+    ap.add_argument("--notas", type=int, default=10)
+    ap.add_argument("--itens", type=int, default=300)
+    ap.add_argument("--duplicatas", type=int, default=6)
+    ap.add_argument("--desconto", action="store_true")
+    ap.add_argument("--nf-inicial", type=int, default=100000)
+    args = ap.parse_args()
+
+    os.makedirs(args.pasta, exist_ok=True)
+    for nf in range(args.nf_inicial, args.nf_inicial + args.notas):
+        caminho = os.path.join(args.pasta, f"{nf}_NFe_sintetica.xml")
+        gerar_nfe(caminho, nf, args.itens, args.duplicatas, args.desconto)
+    print(f"{args.notas} NF-e sintética(s) com {args.itens} itens em {args.pasta}")
+
+
+if __name__ == "__main__":
+    main()
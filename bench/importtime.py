@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+importtime.py
+Mede o custo de `import app.vincular_notas_entrada_matic` com `python -X importtime`.
+
+Uso (na raiz do repositório):
+    python bench/importtime.py [--modulo app.vincular_notas_entrada_matic]
+                               [--repeticoes 5] [--top 10] [--limite-ms 150]
+
+Cada repetição roda num processo novo (sem cache de import). Imprime a mediana
+do tempo cumulativo do módulo e os maiores imports da última rodada. Com
+--limite-ms, sai com código 1 se a mediana passar do limite.
+"""
+import os
+import re
+import sys
+import argparse
+import statistics
+import subprocess
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LINHA = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def medir(modulo: str):
+    """Roda um import isolado e devolve {módulo: (self_us, cumulativo_us)}."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=RAIZ, capture_output=True, text=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"Import falhou:\n{proc.stderr[-2000:]}")
+    tempos = {}
+    for ln in proc.stderr.splitlines():
+        m = LINHA.match(ln)
+        if m:
+            tempos[m.group(4)] = (int(m.group(1)), int(m.group(2)))
+    return tempos
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--modulo", default="app.vincular_notas_entrada_matic")
+    ap.add_argument("--repeticoes", type=int, default=5)
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--limite-ms", type=float, default=None)
+    args = ap.parse_args()
+
+    totais = []
+    for _ in range(args.repeticoes):
+        tempos = medir(args.modulo)
+        totais.append(tempos[args.modulo][1] / 1000)
+
+    mediana = statistics.median(totais)
+    print(f"{args.modulo}: mediana {mediana:.1f} ms "
+          f"(mín {min(totais):.1f} / máx {max(totais):.1f}, {args.repeticoes} rodadas)")
+    print("\nMaiores imports (self, última rodada):")
+    for nome, (proprio, cumul) in sorted(tempos.items(), key=lambda kv: -kv[1][0])[:args.top]:
+        print(f"  {proprio / 1000:8.1f} ms  (cumul. {cumul / 1000:8.1f} ms)  {nome}")
+
+    pesados = [m for m in ("selenium", "googleapiclient", "google.auth", "xml.etree.ElementTree") if m in tempos]
+    if pesados:
+        print(f"\n⚠️ Importados de forma ansiosa: {', '.join(pesados)}")
+
+    if args.limite_ms is not None and mediana > args.limite_ms:
+        print(f"\n❌ Acima do limite de {args.limite_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+parser_nfe.py
+Compara, em tempo e pico de memória, o parser streaming (app.nfe_parser)
+com a leitura DOM original de `extrair_info_xml` (ET.parse + findall), sobre
+NF-e sintéticas de tamanhos crescentes.
+
+O ganho do streaming é de memória, não de tempo: o parse da árvore inteira
+roda em C e é mais rápido. Medido (mediana / pico tracemalloc):
+    500 itens  (~200 KB): DOM 10,7 ms / 1.664 KB × iterparse 17,8 ms / 351 KB
+    2000 itens (~800 KB): DOM 59,4 ms / 6.031 KB × iterparse 93,2 ms / 949 KB
+isto é, ~1,5× mais lento e ~5-6× menos memória; o cache de ler_nfe() faz
+cada arquivo ser lido uma vez por execução.
+A mesma comparação como suíte pytest-benchmark: tests/bench_parser_nfe.py.
+
+Uso (na raiz do repositório):
+    python bench/parser_nfe.py [--itens 10,100,500,2000] [--repeticoes 7]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from bench.gerar_nfe_sintetica import gerar_nfe   # noqa: E402
+from app import nfe_parser                        # noqa: E402
+
+
+def extrair_info_xml_dom(xml_path):
+    """Referência: leitura DOM exatamente como era em extrair_info_xml (vDesc direto em det)."""
+    import xml.etree.ElementTree as ET
+    from datetime import datetime as dt
+    tree = ET.parse(xml_path)
+    ns = {'nfe': 'http://www.portalfiscal.inf.br/nfe'}
+    ide = tree.find('.//nfe:infNFe/nfe:ide', ns)
+    nf = ide.find('nfe:nNF', ns).text
+    data = dt.strptime(ide.find('nfe:dhEmi', ns).text[:10], "%Y-%m-%d").strftime("%d/%m/%Y")
+    tem_desconto = any(
+        float((det.find('nfe:vDesc', ns).text or '0').replace(',', '.')) > 0
+        for det in tree.findall('.//nfe:det', ns)
+        if det.find('nfe:vDesc', ns) is not None
+    )
+    fator = 3 if tem_desconto else 1
+    dups = []
+    for d in tree.findall('.//nfe:dup', ns):
+        valor = float(d.find('nfe:vDup', ns).text.replace(',', '.')) * fator
+        dups.append({"nDup": d.find('nfe:nDup', ns).text,
+                     "vDup": f"{valor:.2f}".replace('.', ','),
+                     "dVenc": dt.strptime(d.find('nfe:dVenc', ns).text[:10], "%Y-%m-%d").strftime("%d/%m/%Y")})
+    return {"numero_nf": nf, "data_emissao": data, "duplicatas": dups}
+
+
+def extrair_info_streaming(xml_path):
+    nota = nfe_parser._parse(xml_path)   # sem cache: mede o parse em si
+    return {"numero_nf": nota.numero, "data_emissao": nota.data_emissao_br,
+            "duplicatas": nota.parcelas_sgi()}
+
+
+def contar_itens_streaming(xml_path):
+    return sum(1 for _ in nfe_parser.iterar_itens(xml_path))
+
+
+def medir(fn, caminho, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        fn(caminho)
+        tempos.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    fn(caminho)
+    _atual, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(tempos) * 1000, pico / 1024
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--itens", default="10,100,500,2000")
+    ap.add_argument("--repeticoes", type=int, default=7)
+    args = ap.parse_args()
+
+    candidatos = (
+        ("DOM (extrair_info_xml original)", extrair_info_xml_dom),
+        ("iterparse (nfe_parser)", extrair_info_streaming),
+        ("iterparse só itens (lazy)", contar_itens_streaming),
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'itens':>6} {'KB':>7}  {'parser':<34} {'mediana ms':>11} {'pico KB':>9} {'tempo':>7} {'memória':>8}")
+        for n in (int(x) for x in args.itens.split(",")):
+            caminho = gerar_nfe(os.path.join(tmp, f"nfe_{n}.xml"), 100000 + n, itens=n,
+                                duplicatas=6, desconto=True)
+            assert extrair_info_xml_dom(caminho) == extrair_info_streaming(caminho), "resultados divergem"
+            kb = os.path.getsize(caminho) / 1024
+            ref = None
+            for nome, fn in candidatos:
+                ms, pico = medir(fn, caminho, args.repeticoes)
+                ref = ref or (ms, pico)   # relativos à leitura DOM (1ª linha)
+                print(f"{n:>6} {kb:>7.0f}  {nome:<34} {ms:>11.2f} {pico:>9.0f} "
+                      f"{ms / ref[0]:>6.2f}× {pico / ref[1]:>7.2f}×")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,797 @@
+# -*- coding: utf-8 -*-
+"""
+sgi_mock.py
+Servidor HTTP local que imita as telas do SGI usadas pela automação, com os
+mesmos ids/classes que o código procura (nada aqui é o SGI de verdade):
+1) Login (usuário/senha → filial → /home) com sessão por cookie; sem sessão,
+   as páginas redirecionam para o login, como o SGI
+2) /importacoes_xml_nfe: lista paginada (rel="next"), modal de upload
+   (iframe_modal) e "Chave de Acesso já está em uso" para XML repetido
+3) Tela da importação: itens com sugestão (✏️ → ✓), busca de produto para
+   itens sem sugestão e "Gerar entrada" com confirmação (bootbox)
+4) /entrada: produtos, quantidade por local (inputs da linha e modal),
+   forma de pagamento e salvar → URL com numero_lancamento=
+5) /titulos/new: autocompletes (typeahead), grade de parcelas com editor
+   inline (duplo clique) e salvar; o servidor confere o que recebeu
+Cada requisição espera --latencia-ms (± --jitter-ms) antes de responder.
+
+Uso (na raiz do repositório):
+    python bench/sgi_mock.py [--porta 8765] [--latencia-ms 150] [--sem-sugestao 0.1]
+e aponte a automação para ele com SGI_URL_BASE=http://127.0.0.1:8765
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import secrets
+import argparse
+import tempfile
+import threading
+from html import escape
+from collections import Counter
+from datetime import datetime
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from app import nfe_parser   # noqa: E402
+
+COOKIE = "_sgi_mock_session"
+FILIAL = "LEBEBE DEPÓSITO (CD)"
+LOCAL_CD = "6"
+POR_PAGINA = 20
+
+# autocompletes fixos do cadastro de títulos: campo -> [(id, texto)]
+AUTOCOMPLETES = {
+    "tipo_titulo": [(1, "Pagar"), (2, "Receber")],
+    "pessoa_cliente_fornecedor": [(501, "MATIC INDUSTRIA DE MÓVEIS LTDA")],
+    "forma_pagamento": [(3, "Boleto *"), (5, "Cartão de Crédito")],
+    "portador_titulo": [(7, "Carteira")],
+    "historico_receita_despesa": [(12, "Pagamento de Fornecedor - Frete"), (11, "Pagamento de Fornecedor")],
+}
+
+
+def _br(valor: float, casas: int = 2) -> str:
+    """1234.5 → '1.234,50'."""
+    return f"{valor:,.{casas}f}".replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def _num(txt) -> float:
+    try:
+        return float((txt or "").strip().replace(".", "").replace(",", "."))
+    except ValueError:
+        return float("nan")
+
+
+class EstadoSGI:
+    """Dados do SGI simulado (thread-safe)."""
+
+    def __init__(self, sem_sugestao: float = 0.0, semente: int = 1):
+        self.sem_sugestao = sem_sugestao
+        self.rnd = random.Random(semente)
+        self.lock = threading.Lock()
+        self.sessoes = {}       # token -> {"filial": bool}
+        self.importacoes = {}   # id -> {"nf", "chave", "itens", "lancamento"}
+        self.por_chave = {}     # chave de acesso -> id da importação
+        self.produtos = {}      # código do produto -> nome
+        self.lancamentos = {}   # número do lançamento -> id da importação
+        self.titulos = []       # títulos salvos
+        self.recusas = Counter()      # motivo -> quantidade (o que o servidor rejeitou)
+        self.requisicoes = Counter()  # "MÉTODO rota" -> quantidade
+
+    def importar(self, nota) -> int:
+        with self.lock:
+            id_ = 1000 + len(self.importacoes) + 1
+            itens = []
+            for it in nota.itens:
+                codigo = it.codigo.lstrip("0") or it.codigo
+                self.produtos[codigo] = it.descricao
+                itens.append({"n": it.n_item, "referencia": it.codigo, "codigo": codigo,
+                              "descricao": it.descricao, "qtde": it.quantidade, "valor": it.valor,
+                              "desconto": it.desconto, "vinculado": False,
+                              "sugestao": self.rnd.random() >= self.sem_sugestao})
+            self.importacoes[id_] = {"nf": nota.numero, "chave": nota.chave, "itens": itens,
+                                     "lancamento": None}
+            self.por_chave[nota.chave] = id_
+            return id_
+
+    def resumo(self) -> dict:
+        with self.lock:
+            itens = [it for imp in self.importacoes.values() for it in imp["itens"]]
+            return {"importacoes": len(self.importacoes),
+                    "itens": len(itens),
+                    "itens_vinculados": sum(it["vinculado"] for it in itens),
+                    "itens_sem_sugestao": sum(not it["sugestao"] for it in itens),
+                    "lancamentos": len(self.lancamentos),
+                    "titulos": len(self.titulos),
+                    "recusas": dict(self.recusas),
+                    "requisicoes": sum(self.requisicoes.values()),
+                    "por_rota": dict(self.requisicoes.most_common())}
+
+
+# =========================================
+# HTML
+# =========================================
+_CSS = """
+body { font-family: sans-serif; margin: 1em; }
+.modal { display: none; position: fixed; top: 10%; left: 20%; width: 60%; background: #fff;
+         border: 1px solid #999; z-index: 10; }
+.modal.in { display: block; }
+.tt-menu { border: 1px solid #ccc; background: #fff; }
+.tt-suggestion { padding: 2px 6px; cursor: pointer; }
+.tt-suggestion.tt-cursor { background: #def; }
+.alert-danger { color: #a00; border: 1px solid #a00; padding: .5em; }
+td { border: 1px solid #ddd; padding: 2px 6px; min-width: 2em; }
+"""
+
+_JS_COMUM = r"""
+function $(id) { return document.getElementById(id); }
+function pedir(metodo, url, dados, pronto) {
+    var x = new XMLHttpRequest();
+    x.open(metodo, url);
+    x.setRequestHeader('Content-Type', 'application/json');
+    x.onload = function () { pronto(x.status, x.responseText ? JSON.parse(x.responseText) : null); };
+    x.send(dados ? JSON.stringify(dados) : null);
+}
+function bootbox(mensagem, ok) {
+    var m = document.createElement('div');
+    m.className = 'bootbox modal fade bootbox-confirm in';
+    m.innerHTML = '<div class="modal-dialog"><div class="modal-content"><div class="modal-body">' + mensagem +
+        '</div><div class="modal-footer"><button type="button" class="btn btn-default" data-bb-handler="cancel">' +
+        'Cancelar</button><button type="button" class="btn btn-primary" data-bb-handler="confirm">OK</button>' +
+        '</div></div></div>';
+    document.body.appendChild(m);
+    m.querySelector('[data-bb-handler="confirm"]').onclick = function () { m.remove(); ok(); };
+    m.querySelector('[data-bb-handler="cancel"]').onclick = function () { m.remove(); };
+}
+/* typeahead: sugestões div.tt-suggestion; clique, ou seta ↓ + Enter, grava id (oculto) e texto */
+function typeahead(vis, oculto, fonte) {
+    var menu = document.createElement('div'), seq = 0;
+    menu.className = 'tt-menu';
+    vis.parentNode.insertBefore(menu, vis.nextSibling);
+    var fechar = function () { menu.innerHTML = ''; };
+    var escolher = function (sug) {
+        oculto.value = sug.getAttribute('data-id');
+        vis.value = sug.textContent;
+        fechar();
+        oculto.dispatchEvent(new Event('change', {bubbles: true}));
+    };
+    vis.addEventListener('input', function () {
+        var minha = ++seq;
+        oculto.value = '';
+        if (!vis.value) { fechar(); return; }
+        pedir('GET', fonte + '?q=' + encodeURIComponent(vis.value), null, function (st, lista) {
+            if (minha !== seq) { return; }
+            fechar();
+            (lista || []).forEach(function (op) {
+                var d = document.createElement('div');
+                d.className = 'tt-suggestion';
+                d.setAttribute('data-id', op.id);
+                d.textContent = op.texto;
+                d.addEventListener('mousedown', function (ev) { ev.preventDefault(); escolher(d); });
+                menu.appendChild(d);
+            });
+        });
+    });
+    vis.addEventListener('keydown', function (ev) {
+        var sugs = menu.querySelectorAll('.tt-suggestion'), atual = menu.querySelector('.tt-cursor');
+        if (ev.key === 'ArrowDown' && sugs.length) {
+            ev.preventDefault();
+            if (atual) { atual.classList.remove('tt-cursor'); }
+            var prox = atual && atual.nextSibling ? atual.nextSibling : sugs[0];
+            prox.classList.add('tt-cursor');
+        } else if (ev.key === 'Enter' && sugs.length) {
+            ev.preventDefault();
+            escolher(atual || sugs[0]);
+        }
+    });
+}
+"""
+
+
+def _pagina(titulo: str, corpo: str, script: str = "") -> bytes:
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{escape(titulo)} | SGI (mock)</title>'
+            f'<link rel="icon" href="data:,"><style>{_CSS}</style></head><body>{corpo}'
+            f'<script>{_JS_COMUM}{script}</script></body></html>').encode("utf-8")
+
+
+def _alerta(msg: str) -> str:
+    return (f'<div class="alert alert-danger"><button type="button" class="close" '
+            f'onclick="this.parentNode.remove()">×</button>{escape(msg)}</div>')
+
+
+def pagina_login(erro: str = "") -> bytes:
+    return _pagina("Login", (_alerta(erro) if erro else "") +
+                   '<form method="post" action="/login">'
+                   '<input type="text" id="usuario" name="usuario" placeholder="Usuário">'
+                   '<input type="password" id="senha" name="senha" placeholder="Senha">'
+                   '<button type="submit">Entrar</button></form>')
+
+
+def pagina_filial() -> bytes:
+    return _pagina("Local de trabalho",
+                   '<form method="post" action="/local_trabalho">'
+                   '<select id="filial_id" name="filial_id"><option value="">Selecione</option>'
+                   f'<option value="6">{escape(FILIAL)}</option></select>'
+                   '<button type="submit" id="botao_prosseguir_informa_local_trabalho">Prosseguir</button>'
+                   '</form>')
+
+
+def pagina_lista(estado: EstadoSGI, pagina: int) -> bytes:
+    with estado.lock:
+        ids = sorted(estado.importacoes, reverse=True)
+        total = len(ids)
+        linhas = "".join(
+            f'<tr><td><a href="/importacoes_xml_nfe/{i}" class="btn btn-xs">Ver</a></td>'
+            f'<td data-title="Número NF-e"><a href="/importacoes_xml_nfe/{i}">{escape(estado.importacoes[i]["nf"])}</a></td>'
+            f'<td data-title="Chave de Acesso">{estado.importacoes[i]["chave"]}</td></tr>'
+            for i in ids[(pagina - 1) * POR_PAGINA: pagina * POR_PAGINA])
+    paginacao = '<ul class="pagination">'
+    if pagina > 1:
+        paginacao += f'<li class="prev"><a rel="prev" href="/importacoes_xml_nfe?page={pagina - 1}">‹</a></li>'
+    if pagina * POR_PAGINA < total:
+        paginacao += f'<li class="next"><a rel="next" href="/importacoes_xml_nfe?page={pagina + 1}">›</a></li>'
+    paginacao += "</ul>"
+    return _pagina("Importações de XML",
+                   '<h3>Importações de XML de NF-e</h3>'
+                   '<button type="button" id="novo_xml_nfe" class="btn btn-primary">Buscar XML</button>'
+                   f'<table class="table"><thead><tr><th></th><th>Número NF-e</th><th>Chave</th></tr></thead>'
+                   f'<tbody>{linhas}</tbody></table>{paginacao}'
+                   '<div id="modal_xml" class="modal"><div class="modal-content">'
+                   '<iframe id="iframe_modal" style="width:100%;height:300px;border:0"></iframe></div></div>',
+                   "$('novo_xml_nfe').onclick = function () {"
+                   "  $('iframe_modal').src = '/importacoes_xml_nfe/new'; $('modal_xml').classList.add('in'); };")
+
+
+def pagina_upload(erro: str = "") -> bytes:
+    return _pagina("Importar XML", (_alerta(erro) if erro else "") +
+                   '<form method="post" action="/importacoes_xml_nfe" enctype="multipart/form-data">'
+                   '<button type="button" class="btn btn-default botao-upload-arquivo">Escolher arquivo</button>'
+                   '<input type="file" id="file_field_arquivo" name="arquivo" accept=".xml">'
+                   '<button type="submit" class="btn btn-success" disabled>Importar</button></form>',
+                   "document.querySelector('.botao-upload-arquivo').onclick = function () {};"
+                   "$('file_field_arquivo').addEventListener('change', function () {"
+                   "  pedir('POST', '/importacoes_xml_nfe/analisar', {}, function () {"
+                   "    document.querySelector('button[type=submit]').disabled = false; }); });")
+
+
+def pagina_importado(id_: int) -> bytes:
+    # o iframe troca de documento (o botão fica "stale") e a página principal vai para a importação
+    return _pagina("Importado", f"<p>XML importado (#{id_}).</p>",
+                   f"setTimeout(function () {{ window.top.location.href = '/importacoes_xml_nfe/{id_}'; }}, 300);")
+
+
+def pagina_importacao(estado: EstadoSGI, id_: int) -> bytes:
+    with estado.lock:
+        imp = estado.importacoes[id_]
+        linhas = []
+        for it in imp["itens"]:
+            if it["vinculado"]:
+                produto, icone = f'{it["descricao"]} ({it["codigo"]})', "glyphicon-check vincular-desvincular-glyphicon-check"
+            else:
+                produto = f'{it["descricao"]} ({it["codigo"]}) *(Sugestão)' if it["sugestao"] else ""
+                icone = "glyphicon-edit vincular-desvincular-glyphicon-edit"
+            linhas.append(
+                f'<tr id="xml_nfe_{id_}_{it["n"]}" data-item="{it["n"]}" '
+                f'data-sugestao="{it["codigo"] if it["sugestao"] else ""}"><td>{it["n"]}</td>'
+                f'<td data-title="Descrição XML">{escape(it["descricao"])}</td>'
+                f'<td data-title="Referência Fornecedor">{escape(it["referencia"])}</td>'
+                f'<td class="coluna-produto" data-title="Produto">{escape(produto)}</td>'
+                f'<td><span class="glyphicon {icone}"></span></td></tr>')
+    return _pagina(f"Importação {id_}",
+                   f'<h3>Importação #{id_} – NF-e {escape(imp["nf"])}</h3>'
+                   '<button type="button" id="gerar_entrada" class="btn btn-success">Gerar entrada</button>'
+                   '<table id="lista_itens_importacao_xml_nfe" class="table"><thead><tr><th>#</th><th>Descrição</th>'
+                   '<th>Referência Fornecedor</th><th>Produto</th><th></th></tr></thead>'
+                   f'<tbody>{"".join(linhas)}</tbody></table>'
+                   '<div id="modal_vincular" class="modal"><div class="modal-content"><h4>Vincular produto</h4>'
+                   '<input type="text" id="autocompletar_produto_id"><input type="hidden" id="produto_id">'
+                   '<div class="modal-footer"><button type="button" class="btn btn-primary" id="confirmar_vinculo">'
+                   'Vincular</button></div></div></div>',
+                   f"var base = '/importacoes_xml_nfe/{id_}', linhaBusca = null;"
+                   r"""
+function vincular(tr, codigo) {
+    pedir('POST', base + '/itens/' + tr.getAttribute('data-item') + '/vincular', {codigo: codigo}, function (st, r) {
+        if (st !== 200) { return; }
+        tr.querySelector('td.coluna-produto').textContent = r.produto;
+        tr.querySelector('span.vincular-desvincular-glyphicon-edit').className =
+            'glyphicon glyphicon-check vincular-desvincular-glyphicon-check';
+    });
+}
+document.querySelectorAll('span.vincular-desvincular-glyphicon-edit').forEach(function (sp) {
+    sp.addEventListener('click', function () {
+        var tr = sp.closest('tr');
+        if (tr.getAttribute('data-sugestao')) { vincular(tr, tr.getAttribute('data-sugestao')); return; }
+        linhaBusca = tr;
+        $('autocompletar_produto_id').value = ''; $('produto_id').value = '';
+        $('modal_vincular').classList.add('in');
+        $('autocompletar_produto_id').focus();
+    });
+});
+typeahead($('autocompletar_produto_id'), $('produto_id'), '/autocomplete/produto');
+$('confirmar_vinculo').onclick = function () {
+    if (linhaBusca && $('produto_id').value) { vincular(linhaBusca, $('produto_id').value); }
+    $('modal_vincular').classList.remove('in');
+};
+document.addEventListener('keydown', function (ev) {
+    if (ev.key === 'Escape') { $('modal_vincular').classList.remove('in'); }
+});
+$('gerar_entrada').onclick = function () {
+    bootbox('Deseja gerar a entrada desta importação?', function () {
+        window.location.href = '/entrada?xml_nfe_id=""" + str(id_) + r"""';
+    });
+};
+""")
+
+
+def pagina_entrada(estado: EstadoSGI, id_: int, erro: str = "") -> bytes:
+    with estado.lock:
+        imp = estado.importacoes[id_]
+        pendentes = [it for it in imp["itens"] if not it["vinculado"]]
+        itens = list(imp["itens"])
+    if pendentes:
+        return _pagina("Entrada", _alerta(f"{len(pendentes)} item(ns) sem produto vinculado."))
+    linhas = "".join(
+        f'<tr><td>{it["n"]}</td><td>{escape(it["codigo"])}</td><td>{escape(it["descricao"])}</td><td>UN</td>'
+        f'<td>{_br(it["qtde"], 4)}</td><td>{_br(it["valor"] / (it["qtde"] or 1))}</td><td>{_br(it["valor"])}</td>'
+        f'<td>0,00</td><td>0,00</td><td>{_br(it["desconto"])}</td>'
+        f'<td class="qtde-por-local-estocagem"><span class="qtde-lida">0</span>'
+        f'<input type="hidden" name="qtde_local_{LOCAL_CD}_{it["n"]}" data-local_id="{LOCAL_CD}" value=""></td></tr>'
+        for it in itens)
+    total = sum(it["valor"] for it in itens)
+    return _pagina("Entrada", (_alerta(erro) if erro else "") +
+                   f'<form method="post" action="/entrada?xml_nfe_id={id_}">'
+                   '<table id="tabela_de_produtos" class="table"><thead><tr><th>#</th><th>Código</th><th>Produto</th>'
+                   '<th>Un</th><th>Qtde Nota</th><th>Unitário</th><th>Total</th><th>IPI</th><th>ST</th>'
+                   f'<th>Desconto</th><th>Qtde por local</th></tr></thead><tbody>{linhas}</tbody></table>'
+                   f'<input type="text" id="valor_itens" name="valor_itens" value="{_br(total)}" readonly>'
+                   '<input type="text" id="campo_valor_outros_acrescimos" name="valor_outros_acrescimos" value="">'
+                   '<select id="forma_pagamento_id_0" name="forma_pagamento_id_0"><option value="">Selecione</option>'
+                   '<option value="1">Dinheiro</option><option value="3">Boleto</option></select>'
+                   '<button type="submit" id="botao_salvar_continuar" class="btn btn-primary">Salvar e continuar</button>'
+                   '</form>'
+                   '<div id="modal_qtde_local" class="modal"><div class="modal-content">'
+                   '<h4>Quantidade por Local de Estocagem</h4>'
+                   f'<label>Depósito C.D. <input type="text" id="qtde_local_modal" data-local_id="{LOCAL_CD}"></label>'
+                   '<button type="button" id="concluir_quantidade_por_local">Concluir</button></div></div>',
+                   r"""
+var linhaQtde = null;
+document.querySelectorAll('#tabela_de_produtos td.qtde-por-local-estocagem').forEach(function (td) {
+    td.addEventListener('click', function () {
+        linhaQtde = td.closest('tr');
+        $('qtde_local_modal').value = linhaQtde.querySelector('input[data-local_id]').value;
+        $('modal_qtde_local').classList.add('in');
+    });
+    td.querySelector('input[data-local_id]').addEventListener('change', function (ev) {
+        td.querySelector('.qtde-lida').textContent = ev.target.value;
+    });
+});
+$('concluir_quantidade_por_local').onclick = function () {
+    var inp = linhaQtde.querySelector('input[data-local_id]');
+    inp.value = $('qtde_local_modal').value;
+    inp.dispatchEvent(new Event('change', {bubbles: true}));
+    $('modal_qtde_local').classList.remove('in');
+};
+""")
+
+
+def pagina_titulo(erro: str = "") -> bytes:
+    autocompletes = "".join(
+        f'<label>{campo}<input type="text" id="autocompletar_{campo}_id" class="typeahead">'
+        f'<input type="hidden" id="{campo}_id" name="{campo}_id"></label><br>'
+        for campo in AUTOCOMPLETES)
+    return _pagina("Novo título", (_alerta(erro) if erro else "") +
+                   '<form method="post" action="/titulos" id="form_titulo">' + autocompletes +
+                   '<select id="conta_financeira_id" name="conta_financeira_id"><option value="">Selecione</option>'
+                   '<option value="1">Caixa</option><option value="2">Banco</option></select>'
+                   '<input type="text" id="numero_titulo" name="numero_titulo">'
+                   '<input type="text" id="complemento" name="complemento">'
+                   '<input type="text" id="data_emissao" name="data_emissao">'
+                   '<input type="text" id="valor_cada_titulo" name="valor_cada_titulo">'
+                   '<input type="text" id="primeira_data_vencimento" name="primeira_data_vencimento">'
+                   '<input type="text" id="quantidade_parcelas" name="quantidade_parcelas" value="1">'
+                   '<input type="hidden" id="parcelas" name="parcelas">'
+                   '<table id="tabela_vencimentos_titulo" class="table"><thead><tr><th>#</th><th>Vencimento</th>'
+                   '<th>Dias</th><th>Documento</th><th>Complemento</th><th>Valor</th><th></th></tr></thead>'
+                   '<tbody></tbody></table>'
+                   '<input type="submit" value="Salvar" class="btn btn-primary"></form>',
+                   "".join(f"typeahead($('autocompletar_{c}_id'), $('{c}_id'), '/autocomplete/{c}');"
+                           for c in AUTOCOMPLETES) + r"""
+var EDITORES = {1: 'data_vencimento', 4: 'complemento', 5: 'valor_nominal'};
+function data(txt) { var p = (txt || '').split('/'); return new Date(+p[2], +p[1] - 1, +p[0]); }
+function fmt(d) { return ('0' + d.getDate()).slice(-2) + '/' + ('0' + (d.getMonth() + 1)).slice(-2) + '/' + d.getFullYear(); }
+function gerarParcelas() {
+    var n = parseInt($('quantidade_parcelas').value, 10) || 0, corpo = document.querySelector('#tabela_vencimentos_titulo tbody');
+    corpo.innerHTML = '';
+    var venc = data($('primeira_data_vencimento').value);
+    for (var i = 0; i < n; i++) {
+        var tr = document.createElement('tr'), d = new Date(venc.getTime() + 30 * 86400000 * i);
+        [String(i + 1), isNaN(d) ? '' : fmt(d), String(30 * i), $('numero_titulo').value + '/' + (i + 1),
+         $('complemento').value, $('valor_cada_titulo').value, '×'].forEach(function (txt) {
+            var td = document.createElement('td'); td.textContent = txt; tr.appendChild(td);
+        });
+        corpo.appendChild(tr);
+    }
+}
+$('quantidade_parcelas').addEventListener('change', gerarParcelas);
+document.querySelector('#tabela_vencimentos_titulo').addEventListener('dblclick', function (ev) {
+    var td = ev.target.closest('td');
+    if (!td || td.querySelector('input')) { return; }
+    var tr = td.parentNode, col = Array.prototype.indexOf.call(tr.cells, td), campo = EDITORES[col];
+    if (!campo) { return; }
+    var inp = document.createElement('input'), linha = Array.prototype.indexOf.call(tr.parentNode.rows, tr);
+    inp.id = 'titulo_parcelas_' + linha + '_' + campo;
+    inp.value = td.textContent;
+    td.textContent = '';
+    td.appendChild(inp);
+    var gravar = function () { if (inp.parentNode === td) { td.textContent = inp.value; } };
+    inp.addEventListener('keydown', function (e) { if (e.key === 'Enter') { e.preventDefault(); gravar(); } });
+    inp.addEventListener('blur', gravar);
+    inp.focus();
+});
+$('form_titulo').addEventListener('submit', function () {
+    if (document.activeElement) { document.activeElement.blur(); }
+    $('parcelas').value = JSON.stringify(Array.prototype.map.call(
+        document.querySelectorAll('#tabela_vencimentos_titulo tbody tr'), function (tr) {
+            return {vencimento: tr.cells[1].textContent, complemento: tr.cells[4].textContent,
+                    valor: tr.cells[5].textContent};
+        }));
+});
+""")
+
+
+# =========================================
+# HTTP
+# =========================================
+class HandlerSGI(BaseHTTPRequestHandler):
+    server_version = "SGIMock/1.0"
+    protocol_version = "HTTP/1.1"
+
+    # ---------- infraestrutura ----------
+    def log_message(self, formato, *args):
+        if self.server.verboso:
+            super().log_message(formato, *args)
+
+    @property
+    def estado(self) -> EstadoSGI:
+        return self.server.estado
+
+    def _latencia(self):
+        lat = self.server.latencia_s + random.uniform(-1, 1) * self.server.jitter_s
+        if lat > 0:
+            time.sleep(lat)
+
+    def _responder(self, status=200, corpo=b"", tipo="text/html; charset=utf-8", cabecalhos=()):
+        self.send_response(status)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.send_header("Cache-Control", "no-store")
+        for nome, valor in cabecalhos:
+            self.send_header(nome, valor)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(corpo)
+
+    def _json(self, dados, status=200):
+        self._responder(status, json.dumps(dados, ensure_ascii=False).encode("utf-8"),
+                        "application/json; charset=utf-8")
+
+    def _redirecionar(self, destino, status=303, cabecalhos=()):
+        self._responder(status, b"", cabecalhos=[("Location", destino), *cabecalhos])
+
+    def _corpo(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _form(self) -> dict:
+        return {k: v[-1] for k, v in parse_qs(self._corpo().decode("utf-8"), keep_blank_values=True).items()}
+
+    def _sessao(self):
+        for parte in (self.headers.get("Cookie") or "").split(";"):
+            nome, _, valor = parte.strip().partition("=")
+            if nome == COOKIE:
+                return self.estado.sessoes.get(valor)
+        return None
+
+    def _logado(self) -> bool:
+        sessao = self._sessao()
+        if sessao and sessao["filial"]:
+            return True
+        self._redirecionar("/", status=302)
+        return False
+
+    # ---------- roteamento ----------
+    ROTAS = [
+        ("GET", r"/", "get_login"),
+        ("POST", r"/login", "post_login"),
+        ("GET", r"/local_trabalho", "get_filial"),
+        ("POST", r"/local_trabalho", "post_filial"),
+        ("GET", r"/home", "get_home"),
+        ("GET", r"/favicon\.ico", "get_favicon"),
+        ("GET", r"/importacoes_xml_nfe", "get_lista"),
+        ("GET", r"/importacoes_xml_nfe/new", "get_upload"),
+        ("POST", r"/importacoes_xml_nfe/analisar", "post_analisar"),
+        ("POST", r"/importacoes_xml_nfe", "post_upload"),
+        ("GET", r"/importacoes_xml_nfe/(\d+)", "get_importacao"),
+        ("POST", r"/importacoes_xml_nfe/(\d+)/itens/(\d+)/vincular", "post_vincular"),
+        ("GET", r"/autocomplete/(\w+)", "get_autocomplete"),
+        ("GET", r"/entrada", "get_entrada"),
+        ("POST", r"/entrada", "post_entrada"),
+        ("GET", r"/entradas/(\d+)/edit", "get_lancamento"),
+        ("GET", r"/titulos/new", "get_titulo"),
+        ("POST", r"/titulos", "post_titulo"),
+        ("GET", r"/titulos/(\d+)", "get_titulo_salvo"),
+        ("GET", r"/_mock/estado", "get_estado"),
+    ]
+
+    def _despachar(self):
+        url = urlsplit(self.path)
+        self.query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        for metodo, padrao, nome in self.ROTAS:
+            m = re.fullmatch(padrao, url.path)
+            if metodo == self.command and m:
+                with self.estado.lock:
+                    self.estado.requisicoes[f"{metodo} {padrao}"] += 1
+                if nome != "get_estado":
+                    self._latencia()
+                return getattr(self, nome)(*m.groups())
+        self._responder(404, _pagina("404", "<h3>Página não encontrada</h3>"))
+
+    def do_GET(self):
+        self._despachar()
+
+    def do_POST(self):
+        self._despachar()
+
+    # ---------- login ----------
+    def get_login(self):
+        sessao = self._sessao()
+        if sessao and sessao["filial"]:
+            return self._redirecionar("/home", status=302)
+        self._responder(200, pagina_login())
+
+    def post_login(self):
+        form = self._form()
+        if not form.get("usuario") or not form.get("senha"):
+            return self._responder(200, pagina_login("Usuário ou senha inválidos."))
+        token = secrets.token_hex(16)
+        with self.estado.lock:
+            self.estado.sessoes[token] = {"filial": False}
+        self._redirecionar("/local_trabalho",
+                           cabecalhos=[("Set-Cookie", f"{COOKIE}={token}; Path=/; HttpOnly")])
+
+    def get_filial(self):
+        if self._sessao() is None:
+            return self._redirecionar("/", status=302)
+        self._responder(200, pagina_filial())
+
+    def post_filial(self):
+        sessao, form = self._sessao(), self._form()
+        if sessao is None:
+            return self._redirecionar("/", status=302)
+        if form.get("filial_id") != "6":
+            return self._responder(200, pagina_filial())
+        sessao["filial"] = True
+        self._redirecionar("/home")
+
+    def get_home(self):
+        if self._logado():
+            self._responder(200, _pagina("Início", f"<h3>SGI (mock) – {escape(FILIAL)}</h3>"))
+
+    def get_favicon(self):
+        self._responder(200, b"", "image/x-icon")
+
+    # ---------- importação de XML ----------
+    def get_lista(self):
+        if self._logado():
+            self._responder(200, pagina_lista(self.estado, max(1, int(self.query.get("page", "1") or 1))))
+
+    def get_upload(self):
+        if self._logado():
+            self._responder(200, pagina_upload())
+
+    def post_analisar(self):
+        self._corpo()
+        if self._logado():
+            self._json({"ok": True})
+
+    def post_upload(self):
+        corpo = self._corpo()
+        if not self._logado():
+            return
+        msg = BytesParser(policy=HTTP).parsebytes(
+            b"Content-Type: " + self.headers.get("Content-Type", "").encode("latin-1") + b"\r\n\r\n" + corpo)
+        conteudo = None
+        for parte in msg.iter_parts() if msg.is_multipart() else ():
+            if parte.get_param("name", header="content-disposition") == "arquivo":
+                conteudo = parte.get_payload(decode=True)
+        if not conteudo:
+            return self._responder(200, pagina_upload("Selecione um arquivo XML."))
+        fd, tmp = tempfile.mkstemp(suffix=".xml")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(conteudo)
+            nota = nfe_parser._parse(tmp)   # sem o cache por caminho do parser
+        except Exception as e:
+            return self._responder(200, pagina_upload(f"XML inválido: {e}"))
+        finally:
+            os.remove(tmp)
+        with self.estado.lock:
+            repetida = nota.chave in self.estado.por_chave
+            if repetida:
+                self.estado.recusas["chave_em_uso"] += 1
+        if repetida:
+            return self._responder(200, pagina_upload("Chave de Acesso já está em uso."))
+        self._responder(200, pagina_importado(self.estado.importar(nota)))
+
+    def get_importacao(self, id_):
+        if not self._logado():
+            return
+        if int(id_) not in self.estado.importacoes:
+            return self._responder(404, _pagina("404", "<h3>Importação não encontrada</h3>"))
+        self._responder(200, pagina_importacao(self.estado, int(id_)))
+
+    def post_vincular(self, id_, n):
+        dados = json.loads(self._corpo() or b"{}")
+        if not self._logado():
+            return
+        with self.estado.lock:
+            imp = self.estado.importacoes.get(int(id_))
+            item = next((it for it in imp["itens"] if it["n"] == int(n)), None) if imp else None
+            if item is None or str(dados.get("codigo")) != item["codigo"]:
+                self.estado.recusas["vinculo_errado"] += 1
+                return self._json({"erro": "produto não corresponde ao item"}, status=422)
+            item["vinculado"] = True
+        self._json({"produto": f'{item["descricao"]} ({item["codigo"]})'})
+
+    def get_autocomplete(self, campo):
+        if not self._logado():
+            return
+        q = (self.query.get("q") or "").strip().lower()
+        if campo == "produto":
+            with self.estado.lock:
+                opcoes = [(cod, f"{nome} ({cod})") for cod, nome in self.estado.produtos.items()]
+        else:
+            opcoes = AUTOCOMPLETES.get(campo, [])
+        self._json([{"id": i, "texto": t} for i, t in opcoes if q in t.lower()][:10])
+
+    # ---------- entrada ----------
+    def _importacao_da_query(self):
+        try:
+            id_ = int(self.query.get("xml_nfe_id", ""))
+        except ValueError:
+            return None
+        return id_ if id_ in self.estado.importacoes else None
+
+    def get_entrada(self):
+        if not self._logado():
+            return
+        id_ = self._importacao_da_query()
+        if id_ is None:
+            return self._responder(404, _pagina("404", "<h3>Importação não encontrada</h3>"))
+        self._responder(200, pagina_entrada(self.estado, id_))
+
+    def post_entrada(self):
+        form = self._form()
+        if not self._logado():
+            return
+        id_ = self._importacao_da_query()
+        if id_ is None:
+            return self._responder(404, _pagina("404", "<h3>Importação não encontrada</h3>"))
+        with self.estado.lock:
+            imp = self.estado.importacoes[id_]
+            erradas = [it["n"] for it in imp["itens"]
+                       if abs(_num(form.get(f"qtde_local_{LOCAL_CD}_{it['n']}")) - it["qtde"]) > 1e-6]
+            motivo = (f"Quantidade por local diverge em {len(erradas)} item(ns)." if erradas
+                      else "Informe a forma de pagamento." if form.get("forma_pagamento_id_0") != "3"
+                      else "Informe outros acréscimos." if not form.get("valor_outros_acrescimos")
+                      else "")
+            if motivo:
+                self.estado.recusas["entrada"] += 1
+            else:
+                numero = imp["lancamento"] or 5000 + len(self.estado.lancamentos) + 1
+                imp["lancamento"] = numero
+                self.estado.lancamentos[numero] = id_
+        if motivo:
+            return self._responder(200, pagina_entrada(self.estado, id_, motivo))
+        self._redirecionar(f"/entradas/{numero}/edit?numero_lancamento={numero}")
+
+    def get_lancamento(self, numero):
+        if self._logado():
+            self._responder(200, _pagina("Entrada", f"<h3>Lançamento {numero} salvo</h3>"))
+
+    # ---------- títulos ----------
+    def get_titulo(self):
+        if self._logado():
+            self._responder(200, pagina_titulo())
+
+    def post_titulo(self):
+        form = self._form()
+        if not self._logado():
+            return
+        try:
+            parcelas = json.loads(form.get("parcelas") or "[]")
+        except ValueError:
+            parcelas = []
+        faltando = [c for c in AUTOCOMPLETES if not form.get(f"{c}_id")]
+        problemas = []
+        if faltando:
+            problemas.append(f"campos sem valor: {', '.join(faltando)}")
+        if form.get("conta_financeira_id") != "2" or not form.get("numero_titulo"):
+            problemas.append("conta financeira / número do título")
+        try:
+            n = int(form.get("quantidade_parcelas") or 0)
+        except ValueError:
+            n = 0
+        if n < 1 or len(parcelas) != n:
+            problemas.append(f"{len(parcelas)} parcela(s) na grade para {n} informada(s)")
+        for i, p in enumerate(parcelas):
+            try:
+                datetime.strptime(p.get("vencimento", ""), "%d/%m/%Y")
+            except ValueError:
+                problemas.append(f"parcela {i + 1}: vencimento inválido")
+            if not _num(p.get("valor")) > 0:
+                problemas.append(f"parcela {i + 1}: valor inválido")
+        if problemas:
+            with self.estado.lock:
+                self.estado.recusas["titulo"] += 1
+            return self._responder(200, pagina_titulo("Não foi possível salvar: " + "; ".join(problemas)))
+        with self.estado.lock:
+            self.estado.titulos.append({"numero": form["numero_titulo"], "parcelas": parcelas})
+            id_ = len(self.estado.titulos)
+        self._redirecionar(f"/titulos/{id_}")
+
+    def get_titulo_salvo(self, id_):
+        if self._logado():
+            self._responder(200, _pagina("Título", f"<h3>Título #{id_} salvo</h3>"))
+
+    def get_estado(self):
+        self._json(self.estado.resumo())
+
+
+class ServidorSGI(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, porta=0, latencia_ms=0.0, jitter_ms=0.0, sem_sugestao=0.0, verboso=False):
+        super().__init__(("127.0.0.1", porta), HandlerSGI)
+        self.estado = EstadoSGI(sem_sugestao)
+        self.latencia_s, self.jitter_s = latencia_ms / 1000, jitter_ms / 1000
+        self.verboso = verboso
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def iniciar(self) -> "ServidorSGI":
+        """Atende numa thread em segundo plano (para benchmarks no mesmo processo)."""
+        threading.Thread(target=self.serve_forever, name="sgi-mock", daemon=True).start()
+        return self
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--porta", type=int, default=8765)
+    ap.add_argument("--latencia-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--sem-sugestao", type=float, default=0.0,
+                    help="fração dos itens importados sem sugestão de produto")
+    ap.add_argument("-v", "--verboso", action="store_true")
+    args = ap.parse_args()
+
+    servidor = ServidorSGI(args.porta, args.latencia_ms, args.jitter_ms, args.sem_sugestao, args.verboso)
+    print(f"SGI (mock) em {servidor.url} — latência {args.latencia_ms:.0f}±{args.jitter_ms:.0f} ms")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
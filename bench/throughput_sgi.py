@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+throughput_sgi.py
+Vazão ponta a ponta das etapas SGI do main() contra o SGI simulado
+(bench/sgi_mock.py), com Chromium headless de verdade:
+1) Sobe o servidor mock numa thread (latência configurável) e aponta
+   SGI_URL_BASE para ele; pastas, catálogo e cookies vão para um diretório
+   temporário
+2) Gera NF-e sintéticas, indexa no catálogo e roda pré-validação → pool de
+   sessões (login) → pipeline por NF (importar, vincular, entrada, boleto)
+3) Mostra NFs/minuto, p50/p95 por etapa (app.metricas) e o que o mock
+   recebeu/recusou; --json grava tudo para comparar execuções
+A planilha fica em memória (o benchmark mede o SGI, não o Google Sheets) e
+o Drive não é usado: a renomeação para no arquivamento local.
+
+Uso (na raiz do repositório; precisa de Chromium + chromedriver, ver
+CHROME_BIN / CHROMEDRIVER_BIN):
+    python bench/throughput_sgi.py [--nfs 20] [--itens 30] [--duplicatas 3]
+                                   [--workers 2] [--latencia-ms 100] [--sem-sugestao 0.1]
+                                   [--json resultado.json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+from collections import Counter
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from bench.sgi_mock import ServidorSGI             # noqa: E402
+from bench.gerar_nfe_sintetica import gerar_nfe    # noqa: E402
+
+ETAPAS_RELATORIO = ("sgi.login", "importar.arquivo", "vincular.nf", "vincular.item",
+                    "entrada.nf", "boleto.nf", "planilha.flush")
+
+
+def _ambiente(base: str, url: str, workers: int):
+    """Variáveis lidas no import dos módulos do app (por isso antes de importá-los)."""
+    downloads = os.path.join(base, "downloads")
+    os.environ.update({
+        "SGI_URL_BASE": url,
+        "SGI_USERNAME": "benchmark",
+        "SGI_PASSWORD": "benchmark",
+        "SGI_WORKERS": str(workers),
+        "DOWNLOAD_DIR": downloads,
+        "LOGS_DIR": os.path.join(base, "logs"),
+        "CATALOGO_DB": os.path.join(downloads, "catalogo_xml.sqlite3"),
+        "SGI_COOKIES": os.path.join(downloads, ".sgi_cookies.json"),
+        "SGI_AUTOCOMPLETE_CACHE": os.path.join(downloads, ".sgi_autocomplete.json"),
+        "CHROME_USER_DIR_BASE": os.path.join(base, "chrome-profile"),
+        "METRICAS_DIR": os.path.join(base, "metricas"),
+        "CNPJS_DESTINATARIO": "",
+    })
+
+
+def _planilha_em_memoria(m):
+    """Cópia local vazia + escritor que só conta (nenhuma chamada ao Google)."""
+    class EscritorLocal(m.EscritorPlanilha):
+        def flush(self):
+            self.ultimo_flush = time.monotonic()
+            if self.pendentes:
+                self.chamadas_api += 1
+                self.pendentes.clear()
+
+    m._SNAPSHOT = m.PlanilhaSnapshot([["NUMERO NF"]])
+    m._ESCRITOR = EscritorLocal(intervalo=float("inf"))
+
+
+def executar(args) -> dict:
+    base = tempfile.mkdtemp(prefix="bench_sgi_")
+    servidor = ServidorSGI(0, args.latencia_ms, args.jitter_ms, args.sem_sugestao).iniciar()
+    _ambiente(base, servidor.url, args.workers)
+
+    from app import metricas, prevalidacao, catalogo_xml, sgi_pool, sgi_espera
+    from app import vincular_notas_entrada_matic as m
+    _planilha_em_memoria(m)
+    os.makedirs(m.PASTA_LOCAL_XML, exist_ok=True)
+
+    for nf in range(args.nf_inicial, args.nf_inicial + args.nfs):
+        caminho = gerar_nfe(os.path.join(m.PASTA_LOCAL_XML, f"{nf}_NFe_bench.xml"), nf,
+                            args.itens, args.duplicatas, args.desconto)
+        m._catalogo().registrar(caminho)
+    aptos, rejeitados = prevalidacao.prevalidar(m._catalogo(), m._catalogo().com_status(catalogo_xml.BAIXADO))
+
+    pool = sgi_pool.PoolSGI(min(args.workers, len(aptos)), m.novo_driver, m.login)
+    inicio = time.monotonic()
+    try:
+        pool.abrir()
+        workers = len(pool.workers)
+        inicio_pipeline = time.monotonic()
+        resultados = pool.mapear("PIPELINE NF", m.processar_nfs, aptos)
+        fim = time.monotonic()
+    finally:
+        logging.info(f"🧵 SGI por worker: {pool.relatorio()}")
+        pool.fechar()
+
+    m._flush_planilha()
+    situacao = {}
+    for etapa in ("IMPORTAR XML", "VINCULAR PRODUTOS", "GERAR ENTRADA", "GERAR BOLETO"):
+        situacao[etapa] = dict(Counter(
+            "OK" if etapa == "GERAR ENTRADA" and st not in ("ERRO", "PULADA") else st
+            for _nf, res in resultados for e, st in res.items() if e == etapa))
+    etapas = metricas.resumo()["etapas"]
+    concluidas = sum(1 for _nf, res in resultados if res.get("GERAR BOLETO") == "OK")
+    saida = {
+        "parametros": vars(args),
+        "nfs": len(aptos), "rejeitadas": len(rejeitados), "workers": workers,
+        "login_s": round(inicio_pipeline - inicio, 2),
+        "pipeline_s": round(fim - inicio_pipeline, 2),
+        "nfs_por_minuto": round(60 * len(resultados) / max(fim - inicio_pipeline, 1e-9), 2),
+        "nfs_por_minuto_com_login": round(60 * len(resultados) / max(fim - inicio, 1e-9), 2),
+        "nfs_concluidas": concluidas,
+        "situacao": situacao,
+        "etapas": {e: etapas[e] for e in ETAPAS_RELATORIO if e in etapas},
+        "esperas": sgi_espera.resumo(),
+        "indice_referencias": m._catalogo().resumo_referencias(),
+        "mock": servidor.estado.resumo(),
+    }
+    servidor.shutdown()
+    servidor.server_close()
+    if not args.manter:
+        shutil.rmtree(base, ignore_errors=True)
+    else:
+        saida["pasta"] = base
+    return saida
+
+
+def _imprimir(r: dict):
+    p = r["parametros"]
+    print(f"\nSGI mock: {r['nfs']} NF(s) × {p['itens']} itens, {r['workers']} worker(s), "
+          f"latência {p['latencia_ms']:.0f}±{p['jitter_ms']:.0f} ms")
+    print(f"  login (pool)   {r['login_s']:8.1f} s")
+    print(f"  pipeline       {r['pipeline_s']:8.1f} s")
+    print(f"  vazão          {r['nfs_por_minuto']:8.2f} NFs/min  "
+          f"({r['nfs_por_minuto_com_login']:.2f} com login); {r['nfs_concluidas']} até o boleto")
+    print(f"\n  {'etapa':<18}{'n':>6}{'p50 s':>10}{'p95 s':>10}{'total s':>10}{'erros':>7}")
+    for etapa, e in r["etapas"].items():
+        print(f"  {etapa:<18}{e['n']:>6}{e['p50_s']:>10.2f}{e['p95_s']:>10.2f}{e['total_s']:>10.1f}{e['erros']:>7}")
+    print("\n  resultado por etapa: " + "; ".join(f"{e}: {c}" for e, c in r["situacao"].items()))
+    print(f"  índice de referências: {r['indice_referencias']}")
+    mock = r["mock"]
+    print(f"  mock: {mock['requisicoes']} requisições, {mock['lancamentos']} entrada(s), "
+          f"{mock['titulos']} título(s), recusas {mock['recusas'] or 'nenhuma'}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--nfs", type=int, default=10)
+    ap.add_argument("--itens", type=int, default=20)
+    ap.add_argument("--duplicatas", type=int, default=3)
+    ap.add_argument("--desconto", action="store_true")
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--latencia-ms", type=float, default=100.0)
+    ap.add_argument("--jitter-ms", type=float, default=20.0)
+    ap.add_argument("--sem-sugestao", type=float, default=0.0,
+                    help="fração dos itens sem sugestão no SGI (exercita o índice de referências)")
+    ap.add_argument("--nf-inicial", type=int, default=200000)
+    ap.add_argument("--json", help="grava o resultado completo neste arquivo")
+    ap.add_argument("--manter", action="store_true", help="não apaga a pasta temporária (logs, catálogo)")
+    ap.add_argument("-v", "--verboso", action="store_true")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verboso else logging.WARNING,
+                        format="%(asctime)s - %(levelname)s - %(message)s")
+    resultado = executar(args)
+    _imprimir(resultado)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(resultado, fh, ensure_ascii=False, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+bench_parser_nfe.py
+Suíte pytest-benchmark: parser streaming (app.nfe_parser) × leitura DOM
+original de extrair_info_xml (bench.parser_nfe.extrair_info_xml_dom), em
+tempo e pico de memória (extra_info["pico_kb"]), sobre NF-e sintéticas.
+
+Uso (na raiz do repositório; precisa de pytest-benchmark):
+    python -m pytest tests/bench_parser_nfe.py [--benchmark-group-by=param:itens]
+"""
+import tracemalloc
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from bench.gerar_nfe_sintetica import gerar_nfe   # noqa: E402
+from bench.parser_nfe import (                    # noqa: E402
+    extrair_info_xml_dom, extrair_info_streaming, contar_itens_streaming,
+)
+
+TAMANHOS = (10, 100, 500, 2000)
+PARSERS = {
+    "dom": extrair_info_xml_dom,
+    "iterparse": extrair_info_streaming,
+    "iterparse_itens": contar_itens_streaming,
+}
+
+
+def _pico_kb(fn, caminho) -> float:
+    tracemalloc.start()
+    try:
+        fn(caminho)
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.fixture(scope="module")
+def nfes(tmp_path_factory):
+    pasta = tmp_path_factory.mktemp("nfe")
+    return {n: gerar_nfe(str(pasta / f"nfe_{n}.xml"), 100000 + n, itens=n, duplicatas=6, desconto=True)
+            for n in TAMANHOS}
+
+
+@pytest.mark.parametrize("itens", TAMANHOS)
+@pytest.mark.parametrize("parser", PARSERS)
+def test_parser(benchmark, nfes, parser, itens):
+    fn, caminho = PARSERS[parser], nfes[itens]
+    benchmark.group = f"{itens} itens"
+    benchmark.extra_info["pico_kb"] = round(_pico_kb(fn, caminho))
+    benchmark(fn, caminho)
+
+
+@pytest.mark.parametrize("itens", TAMANHOS)
+def test_mesmo_resultado(nfes, itens):
+    assert extrair_info_streaming(nfes[itens]) == extrair_info_xml_dom(nfes[itens])
+
+
+@pytest.mark.parametrize("itens", (500, 2000))
+def test_streaming_usa_menos_memoria(nfes, itens):
+    """O ganho do iterparse é memória, não tempo (a árvore inteira em C é mais rápida)."""
+    assert _pico_kb(extrair_info_streaming, nfes[itens]) * 3 < _pico_kb(extrair_info_xml_dom, nfes[itens])
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+test_catalogo_xml.py
+CatalogoXML (app.catalogo_xml): indexação, arquivamento e importação dos
+sufixos legados, sobre NF-e sintéticas (bench/gerar_nfe_sintetica.py).
+"""
+import os
+
+import pytest
+
+from app import catalogo_xml
+from app.catalogo_xml import CatalogoXML
+from bench.gerar_nfe_sintetica import gerar_nfe
+
+
+@pytest.fixture
+def pasta(tmp_path):
+    p = tmp_path / "xml"
+    p.mkdir()
+    return p
+
+
+def _catalogo(tmp_path, pasta):
+    return CatalogoXML(str(tmp_path / "catalogo.sqlite3"), str(pasta))
+
+
+def test_registrar_de_novo_preserva_o_status(tmp_path, pasta):
+    cat = _catalogo(tmp_path, pasta)
+    caminho = gerar_nfe(str(pasta / "1001_NFe.xml"), 1001, itens=2)
+    reg = cat.registrar(caminho, drive_id="d1")
+    assert (reg["nf"], reg["status"], reg["nome"]) == ("1001", catalogo_xml.BAIXADO, "1001_NFe.xml")
+
+    cat.marcar(reg["chave"], catalogo_xml.IMPORTADO)
+    with open(caminho, "a", encoding="utf-8") as fh:
+        fh.write("\n")
+    de_novo = cat.registrar(caminho)
+    assert de_novo["status"] == catalogo_xml.IMPORTADO
+    assert de_novo["drive_id"] == "d1"
+    assert de_novo["hash"] != reg["hash"]
+
+
+def test_rejeitado_volta_a_baixado_quando_o_conteudo_muda(tmp_path, pasta):
+    cat = _catalogo(tmp_path, pasta)
+    caminho = gerar_nfe(str(pasta / "1002_NFe.xml"), 1002, itens=2)
+    chave = cat.registrar(caminho)["chave"]
+    cat.marcar(chave, catalogo_xml.REJEITADO, "CNPJ DIVERGENTE")
+
+    assert cat.registrar(caminho)["status"] == catalogo_xml.REJEITADO   # mesmo conteúdo
+
+    with open(caminho, "a", encoding="utf-8") as fh:
+        fh.write("\n")
+    reg = cat.registrar(caminho)
+    assert (reg["status"], reg["motivo"]) == (catalogo_xml.BAIXADO, None)
+
+
+def test_arquivar_nao_sobrescreve_arquivo_de_mesmo_nome(tmp_path, pasta):
+    cat = _catalogo(tmp_path, pasta)
+    (pasta / "a").mkdir()
+    (pasta / "b").mkdir()
+    a = cat.registrar(gerar_nfe(str(pasta / "a" / "NFe.xml"), 1003, itens=2))
+    b = cat.registrar(gerar_nfe(str(pasta / "b" / "NFe.xml"), 1004, itens=2))
+    cat.arquivar(a["chave"])
+    cat.arquivar(b["chave"])
+
+    arquivo = pasta / "arquivo"
+    assert sorted(os.listdir(arquivo)) == ["NFe.xml", f"NFe_{b['chave']}.xml"]
+    assert cat.por_chave(b["chave"])["caminho"] == str(arquivo / f"NFe_{b['chave']}.xml")
+    assert cat.por_chave(a["chave"])["arquivado"] == 1
+    assert "<nNF>1004</nNF>" in (arquivo / f"NFe_{b['chave']}.xml").read_text(encoding="utf-8")
+
+
+def test_importa_sufixos_legados_da_pasta(tmp_path, pasta):
+    gerar_nfe(str(pasta / "2001_NFe(FEITO_TMP).xml"), 2001, itens=2)
+    gerar_nfe(str(pasta / "2002_NFe(JA_IMPORTADO_TMP).xml"), 2002, itens=2)
+    gerar_nfe(str(pasta / "2003_NFe(FEITO).xml"), 2003, itens=2)
+    gerar_nfe(str(pasta / "2004_NFe.xml"), 2004, itens=2)
+    (pasta / "leia-me.txt").write_text("não é XML")
+
+    cat = _catalogo(tmp_path, pasta)
+    status = {nf: cat.por_nf(nf)["status"] for nf in ("2001", "2002", "2003", "2004")}
+    assert status == {"2001": catalogo_xml.IMPORTADO, "2002": catalogo_xml.JA_IMPORTADO,
+                      "2003": catalogo_xml.FEITO, "2004": catalogo_xml.BAIXADO}
+    assert cat.por_nf("2001")["nome"] == "2001_NFe.xml"
+    assert cat.por_nome("2004_NFe.xml") is not None
+
+
+def test_rejeitado_corrigido_no_drive_e_baixado_de_novo(tmp_path, pasta):
+    from app.vincular_notas_entrada_matic import _rejeitado_corrigido
+    cat = _catalogo(tmp_path, pasta)
+    reg = cat.registrar(gerar_nfe(str(pasta / "1005_NFe.xml"), 1005, itens=2))
+    md5_local = catalogo_xml.hash_arquivo(reg["caminho"], "md5")
+    assert not _rejeitado_corrigido(reg, {"md5Checksum": "0" * 32})       # não está REJEITADO
+
+    cat.marcar(reg["chave"], catalogo_xml.REJEITADO, "XML MALFORMADO")
+    reg = cat.por_chave(reg["chave"])
+    assert not _rejeitado_corrigido(reg, {"md5Checksum": md5_local})      # mesmo arquivo no Drive
+    assert _rejeitado_corrigido(reg, {"md5Checksum": "0" * 32})           # corrigido no Drive
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+test_drive_sync.py
+app.drive_sync / app.drive_download contra o Drive falso (bench/drive_mock.py),
+pelo mesmo cliente da automação (google_clients com credenciais anônimas).
+"""
+import json
+import hashlib
+
+import pytest
+
+pytest.importorskip("googleapiclient")
+
+from app import drive_sync, drive_download, google_clients, google_exec   # noqa: E402
+from bench.drive_mock import ServidorDrive, PASTA_PADRAO, MIME_PASTA      # noqa: E402
+
+
+@pytest.fixture
+def servidor(monkeypatch):
+    srv = ServidorDrive().iniciar()
+    monkeypatch.setenv("DRIVE_API_ENDPOINT", srv.endpoint)
+    monkeypatch.setattr(google_clients, "ANONIMAS", True)
+    monkeypatch.setattr(google_clients, "_local", type(google_clients._local)())
+    monkeypatch.setitem(google_exec.COTAS_POR_MINUTO, "drive", 60_000)
+    monkeypatch.setattr(google_exec, "_buckets", {})
+    monkeypatch.setattr(google_exec, "ESTATISTICAS", {})
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def drive(servidor):
+    return google_clients.drive(escrita=True)
+
+
+def _xmls(estado, n, inicio=1):
+    return [estado.adicionar(f"{nf}_NFe.xml", f"<nfe>{nf}</nfe>".encode()) for nf in range(inicio, inicio + n)]
+
+
+def test_listagem_segue_todas_as_paginas(servidor, drive):
+    ids = _xmls(servidor.estado, 7)
+    servidor.estado.adicionar("subpasta", mime=MIME_PASTA)
+    servidor.estado.adicionar("9_NFe.xml", b"x", pasta="outra-pasta")
+    servidor.estado.lixeira(servidor.estado.adicionar("10_NFe.xml", b"x"))
+    vistos = [f["id"] for f in drive_sync.listar_pasta(drive, PASTA_PADRAO, page_size=3)]
+    assert sorted(vistos) == sorted(ids)
+    assert servidor.estado.requisicoes["listar"] == 3
+
+
+def test_sincronizacao_incremental(servidor, drive, tmp_path):
+    estado_json = str(tmp_path / "drive_sync.json")
+    a, b, c = _xmls(servidor.estado, 3)
+    s = drive_sync.SincronizadorDrive(drive, PASTA_PADRAO, estado_json)
+    assert {f["id"] for f in s.pendentes()} == {a, b, c}
+    s.confirmar([a])
+
+    d = servidor.estado.adicionar("4_NFe.xml", b"<nfe>4</nfe>")
+    servidor.estado.renomear(b, "2_NFe (FEITO).xml")
+    servidor.estado.remover(c)
+    listagens = servidor.estado.requisicoes["listar"]
+
+    s = drive_sync.SincronizadorDrive(drive, PASTA_PADRAO, estado_json)
+    assert [f["id"] for f in s.pendentes()] == [d]
+    assert servidor.estado.requisicoes["listar"] == listagens    # só Changes API
+    s.confirmar([d])
+    with open(estado_json, encoding="utf-8") as fh:
+        salvo = json.load(fh)
+    assert salvo["pendentes"] == {} and salvo["cursor"] == str(len(servidor.estado.mudancas))
+
+
+def test_cursor_invalido_volta_para_listagem_completa(servidor, drive, tmp_path):
+    estado_json = tmp_path / "drive_sync.json"
+    estado_json.write_text(json.dumps({"pasta": PASTA_PADRAO, "cursor": "999", "pendentes": {}}))
+    ids = _xmls(servidor.estado, 2)
+    s = drive_sync.SincronizadorDrive(drive, PASTA_PADRAO, str(estado_json))
+    assert {f["id"] for f in s.pendentes()} == set(ids)
+    assert servidor.estado.requisicoes["listar"] == 1
+
+
+def test_renomear_em_lote_repete_transitorios_e_cobra_cada_item(servidor, drive):
+    ids = _xmls(servidor.estado, 5)
+    servidor.estado.falhar(1)
+    falhas = drive_sync.renomear_em_lote(drive, {fid: f"{fid} (FEITO).xml" for fid in ids}, tamanho_lote=3)
+    assert falhas == {}
+    assert all(servidor.estado.arquivos[fid]["name"] == f"{fid} (FEITO).xml" for fid in ids)
+    assert servidor.estado.requisicoes["batch"] == 3   # 3 + 2 itens, mais a rodada do 503
+    assert google_exec.ESTATISTICAS["drive"]["chamadas"] == 6   # uma ficha por item
+
+
+def test_download_em_blocos_confere_md5(servidor, drive, tmp_path):
+    conteudo = bytes(range(256)) * 40
+    fid = servidor.estado.adicionar("grande_NFe.xml", conteudo)
+    f = {"id": fid, "name": "grande_NFe.xml", "md5Checksum": hashlib.md5(conteudo).hexdigest()}
+    destino = tmp_path / f["name"]
+    drive_download.baixar_arquivo(drive, f, str(destino), chunk=1000)
+    assert destino.read_bytes() == conteudo
+
+    f["md5Checksum"] = "0" * 32
+    with pytest.raises(drive_download.ChecksumInvalido):
+        drive_download.baixar_arquivo(drive, f, str(tmp_path / "outro.xml"), chunk=1000)
+    assert not (tmp_path / "outro.xml").exists()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+test_google_exec.py
+app.google_exec: token bucket (relógio falso) e retry de chamar/executar
+em 429, 5xx e 403 rateLimitExceeded, sem dormir de verdade.
+"""
+import pytest
+
+pytest.importorskip("googleapiclient")
+
+import httplib2                                    # noqa: E402
+from googleapiclient.errors import HttpError       # noqa: E402
+
+from app import google_exec                        # noqa: E402
+from app.google_exec import TokenBucket            # noqa: E402
+
+
+class Relogio:
+    """time.monotonic/time.sleep falsos: dormir só avança o relógio."""
+
+    def __init__(self):
+        self.agora, self.pausas = 0.0, []
+
+    def monotonic(self):
+        return self.agora
+
+    def sleep(self, s):
+        self.pausas.append(s)
+        self.agora += s
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    r = Relogio()
+    monkeypatch.setattr(google_exec.time, "monotonic", r.monotonic)
+    monkeypatch.setattr(google_exec.time, "sleep", r.sleep)
+    monkeypatch.setattr(google_exec, "_buckets", {})
+    monkeypatch.setattr(google_exec, "ESTATISTICAS", {})
+    monkeypatch.setitem(google_exec.COTAS_POR_MINUTO, "sheets", 60_000)
+    return r
+
+
+def _erro(status, conteudo=b""):
+    return HttpError(httplib2.Response({"status": status}), conteudo)
+
+
+class Requisicao:
+    """Requisição falsa: levanta os erros dados, um por execute(), e depois responde."""
+
+    def __init__(self, *erros):
+        self.erros, self.execucoes = list(erros), 0
+
+    def execute(self, **kwargs):
+        self.execucoes += 1
+        if self.erros:
+            raise self.erros.pop(0)
+        return {"ok": True, **kwargs}
+
+
+def test_bucket_espera_a_taxa(relogio):
+    bucket = TokenBucket(60, rajada=2)            # 1 ficha/s
+    assert bucket.adquirir() == bucket.adquirir() == 0
+    assert bucket.adquirir() == pytest.approx(1.0)
+    relogio.agora += 10                           # enche só até a rajada
+    assert bucket.adquirir(2) == 0
+    assert bucket.adquirir() == pytest.approx(1.0)
+
+
+def test_custo_acima_da_rajada_fica_devendo(relogio):
+    bucket = TokenBucket(60, rajada=2)
+    assert bucket.adquirir(5) == 0                # saldo 2 - 5 = -3
+    assert bucket.adquirir() == pytest.approx(4.0)
+
+
+@pytest.mark.parametrize("erro", [
+    _erro(429), _erro(500), _erro(503),
+    _erro(403, b'{"error": {"errors": [{"reason": "rateLimitExceeded"}]}}'),
+    _erro(403, b'{"error": {"errors": [{"reason": "userRateLimitExceeded"}]}}'),
+    ConnectionError("reset"),
+], ids=["429", "500", "503", "403-rate", "403-user-rate", "conexao"])
+def test_repete_erros_transitorios(relogio, erro):
+    req = Requisicao(erro, erro)
+    assert google_exec.executar(req, "sheets", valueRenderOption="FORMATTED_VALUE") == {
+        "ok": True, "valueRenderOption": "FORMATTED_VALUE"}
+    assert req.execucoes == 3
+    assert google_exec.ESTATISTICAS["sheets"]["retries"] == 2
+    assert google_exec.ESTATISTICAS["sheets"]["chamadas"] == 3
+    assert len(relogio.pausas) == 2
+    assert relogio.pausas[0] <= 1.0 and relogio.pausas[1] <= 2.0     # base * 2**tentativa
+
+
+def test_desiste_depois_do_limite_de_tentativas(relogio):
+    req = Requisicao(*[_erro(429)] * 10)
+    with pytest.raises(HttpError) as exc:
+        google_exec.chamar(req.execute, "sheets", tentativas=4)
+    assert exc.value.resp.status == 429
+    assert req.execucoes == 4
+    assert google_exec.ESTATISTICAS["sheets"]["retries"] == 3
+
+
+@pytest.mark.parametrize("erro", [
+    _erro(404), _erro(400),
+    _erro(403, b'{"error": {"errors": [{"reason": "insufficientPermissions"}]}}'),
+    ValueError("definitivo"),
+], ids=["404", "400", "403-permissao", "outro"])
+def test_erro_definitivo_sobe_na_primeira(relogio, erro):
+    req = Requisicao(erro)
+    with pytest.raises(type(erro)):
+        google_exec.executar(req, "sheets")
+    assert req.execucoes == 1
+    assert google_exec.ESTATISTICAS["sheets"]["retries"] == 0
+    assert relogio.pausas == []
+
+
+def test_custo_conta_cada_item_do_batch(relogio):
+    google_exec.executar(Requisicao(), "sheets", custo=5)
+    assert google_exec.ESTATISTICAS["sheets"]["chamadas"] == 5
+    assert "sheets: 5 chamadas, 0 retries" in google_exec.resumo()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+test_indice_referencias.py
+Índice referência do fornecedor → produto SGI (app.catalogo_xml): tolerância
+de zeros à esquerda, contagem de vínculos repetidos e o mínimo de repetições
+(REFERENCIA_VEZES_MINIMO) para vincular_produtos usar o índice sem sugestão.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from app import catalogo_xml
+from app import vincular_notas_entrada_matic as m
+from app.catalogo_xml import CatalogoXML, normalizar_referencia
+
+CNPJ = "12345678000199"
+
+
+@pytest.fixture
+def cat(tmp_path):
+    pasta = tmp_path / "xml"
+    pasta.mkdir()
+    return CatalogoXML(str(tmp_path / "catalogo.sqlite3"), str(pasta))
+
+
+@pytest.mark.parametrize("ref, normalizada", [
+    ("12", "12"), ("012", "12"), ("0012", "12"), (" 0012 ", "12"),
+    ("00012", "012"), ("000012", "0012"),      # além da tolerância: zeros que sobram ficam
+    ("0", "0"), ("00", "00"), ("", ""),
+])
+def test_normalizar_referencia(ref, normalizada):
+    assert normalizar_referencia(ref) == normalizada
+
+
+def test_tolerancia_igual_a_da_vinculacao():
+    assert catalogo_xml.ZEROS_TOLERADOS == 2
+    assert m.codigos_equivalentes("0012", "12") and normalizar_referencia("0012") == "12"
+    assert not m.codigos_equivalentes("00012", "12") and normalizar_referencia("00012") != "12"
+
+
+def test_vezes_conta_vinculos_repetidos_com_o_mesmo_codigo(cat):
+    cat.aprender_referencias(CNPJ, {"0012": ("345", "MESA (345)")})
+    assert tuple(cat.produto_da_referencia(CNPJ, "12")) == ("345", "MESA (345)", 1)
+    cat.aprender_referencias(CNPJ, {"12": ("345", "MESA (345)")})
+    assert cat.produto_da_referencia(CNPJ, "012")["vezes"] == 2
+    cat.aprender_referencias(CNPJ, {"12": ("678", "CADEIRA (678)")})     # outro código: recomeça
+    assert tuple(cat.produto_da_referencia(CNPJ, "12")) == ("678", "CADEIRA (678)", 1)
+
+    assert cat.produto_da_referencia(CNPJ, "00012") is None             # além da tolerância
+    assert cat.produto_da_referencia("98765432000155", "12") is None     # outro fornecedor
+    assert cat.resumo_referencias().startswith("3/5 consulta(s)")
+
+
+@pytest.fixture
+def tela(cat, monkeypatch):
+    """vincular_produtos sem navegador: um item sem sugestão com a referência 0012."""
+    item = {"id": "xml_nfe_1", "produto": "", "referencia": "0012", "vinculado": False, "pendente": True}
+    pelo_indice = []
+    monkeypatch.setattr(m, "WebDriverWait", lambda _driver, _t: SimpleNamespace(until=lambda _cond: True))
+    monkeypatch.setattr(m, "EC", SimpleNamespace(presence_of_all_elements_located=lambda _loc: None))
+    monkeypatch.setattr(m, "By", SimpleNamespace(XPATH="xpath", ID="id"))
+    monkeypatch.setattr(m.sgi_dom, "itens_importacao", lambda _driver: [dict(item)])
+    monkeypatch.setattr(m, "_vincular_pelo_indice", lambda _d, it, codigo: pelo_indice.append((it["id"], codigo)))
+    monkeypatch.setattr(m, "_catalogo", lambda: cat)
+    monkeypatch.setattr(m, "REFERENCIA_VEZES_MINIMO", 2)
+    return pelo_indice
+
+
+def test_indice_so_vincula_depois_do_minimo_de_repeticoes(cat, tela):
+    assert m.vincular_produtos(None, CNPJ) is False
+    assert tela == []                                     # referência nunca vista
+
+    cat.aprender_referencias(CNPJ, {"12": ("345", "MESA (345)")})
+    m.vincular_produtos(None, CNPJ)
+    assert tela == []                                     # visto 1 vez: ação humana
+
+    cat.aprender_referencias(CNPJ, {"12": ("345", "MESA (345)")})
+    m.vincular_produtos(None, CNPJ)
+    assert tela == [("xml_nfe_1", "345")]
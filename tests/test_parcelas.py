@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+test_parcelas.py
+Duplicatas no formato do SGI (extrair_info_xml: ×3 se houver desconto em
+det/vDesc) e o preenchimento em lote da grade de parcelas
+(_preencher_parcelas_em_lote) com um driver falso.
+"""
+import pytest
+
+from app import sgi_dom
+from app import vincular_notas_entrada_matic as m
+from app.sgi_dom import numero_br
+from app.vincular_notas_entrada_matic import extrair_info_xml
+from bench.gerar_nfe_sintetica import gerar_nfe
+
+
+def _vdups(caminho) -> list:
+    """vDup de cada duplicata, direto do XML gerado."""
+    texto = open(caminho, encoding="utf-8").read()
+    return [float(p.split("</vDup>", 1)[0]) for p in texto.split("<vDup>")[1:]]
+
+
+def _com_vdesc_no_det(caminho) -> str:
+    """Coloca <vDesc> como filho direto do 1º <det> (a regra de FEIRA / MOSTRUÁRIO)."""
+    with open(caminho, encoding="utf-8") as fh:
+        texto = fh.read().replace("</prod>", "</prod><vDesc>10.00</vDesc>", 1)
+    with open(caminho, "w", encoding="utf-8") as fh:
+        fh.write(texto)
+    return caminho
+
+
+def test_duplicatas_sem_desconto(tmp_path):
+    caminho = gerar_nfe(str(tmp_path / "1001_NFe.xml"), 1001, itens=5, duplicatas=3)
+    info = extrair_info_xml(caminho)
+    assert info["numero_nf"] == "1001"
+    assert [d["nDup"] for d in info["duplicatas"]] == ["001", "002", "003"]
+    assert [numero_br(d["vDup"]) for d in info["duplicatas"]] == pytest.approx(_vdups(caminho))
+    assert all("," in d["vDup"] and "." not in d["vDup"] for d in info["duplicatas"])
+    dia, mes, ano = info["duplicatas"][0]["dVenc"].split("/")
+    assert (len(dia), len(mes), len(ano)) == (2, 2, 4)
+
+
+def test_desconto_so_no_prod_nao_multiplica(tmp_path):
+    caminho = gerar_nfe(str(tmp_path / "1002_NFe.xml"), 1002, itens=6, duplicatas=2, desconto=True)
+    assert "<vDesc>" in open(caminho, encoding="utf-8").read()            # det/prod/vDesc
+    info = extrair_info_xml(caminho)
+    assert [numero_br(d["vDup"]) for d in info["duplicatas"]] == pytest.approx(_vdups(caminho))
+
+
+def test_desconto_no_det_multiplica_por_tres(tmp_path):
+    caminho = _com_vdesc_no_det(gerar_nfe(str(tmp_path / "1003_NFe.xml"), 1003, itens=6, duplicatas=4))
+    info = extrair_info_xml(caminho)
+    assert len(info["duplicatas"]) == 4
+    assert [numero_br(d["vDup"]) for d in info["duplicatas"]] == pytest.approx([3 * v for v in _vdups(caminho)])
+
+
+class DriverFalso:
+    """execute_script falso: guarda as edições e devolve a grade dada na leitura."""
+
+    def __init__(self, grade):
+        self.grade, self.edicoes = grade, None
+
+    def execute_script(self, js, tabela_id, *args):
+        assert tabela_id == m.TABELA_PARCELAS
+        if js is sgi_dom._JS_EDITAR_CELULAS:
+            self.edicoes = args[0]
+            return [True] * len(self.edicoes)
+        return self.grade
+
+
+def _linha(dup):
+    return ["1", dup["dVenc"], "NF", "1/3", "X", dup["vDup"], ""]
+
+
+@pytest.fixture
+def duplicatas(tmp_path, monkeypatch):
+    monkeypatch.setattr(m, "tentar", lambda *_a, **_k: True)
+    caminho = _com_vdesc_no_det(gerar_nfe(str(tmp_path / "1004_NFe.xml"), 1004, itens=3, duplicatas=3))
+    return extrair_info_xml(caminho)["duplicatas"]
+
+
+def test_lote_escreve_da_segunda_parcela_em_diante(duplicatas):
+    driver = DriverFalso([_linha(d) for d in duplicatas])
+    assert m._preencher_parcelas_em_lote(driver, duplicatas) == []
+    assert [(e["linha"], e["coluna"], e["valor"]) for e in driver.edicoes] == [
+        (i, col, valor)
+        for i, dup in enumerate(duplicatas[1:], start=1)
+        for col, valor in ((1, dup["dVenc"]), (-2, dup["vDup"]), (4, "X"))
+    ]
+
+
+def test_lote_devolve_as_linhas_que_nao_conferem(duplicatas):
+    grade = [_linha(d) for d in duplicatas]
+    grade[1][-2] = "0,01"                                      # valor não pegou
+    assert m._preencher_parcelas_em_lote(DriverFalso(grade), duplicatas) == [1]
+    assert m._preencher_parcelas_em_lote(DriverFalso(grade[:2]), duplicatas) == [1, 2]   # linha faltando
+    grade = [_linha(d) for d in duplicatas]
+    grade[2][1] = "01/01/1999"                                 # vencimento não pegou
+    assert m._preencher_parcelas_em_lote(DriverFalso(grade), duplicatas) == [2]
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+test_planilha.py
+Cópia local da aba de controle (PlanilhaSnapshot / _snapshot) e escrita
+write-behind (EscritorPlanilha) contra uma planilha falsa em memória, no
+lugar do Sheets.
+"""
+import re
+
+import pytest
+
+from app import vincular_notas_entrada_matic as m
+from app.vincular_notas_entrada_matic import COL, PlanilhaSnapshot
+
+CABECALHO = ["NUMERO NF", "DATA EMISSÃO NF", "XML DRIVE"]
+
+
+class Requisicao:
+    def __init__(self, fn):
+        self.fn = fn
+
+    def execute(self, **_kwargs):
+        return self.fn()
+
+
+class PlanilhaFalsa:
+    """spreadsheets.values() em memória; `chamadas` guarda (método, body) na ordem."""
+
+    def __init__(self, linhas):
+        self.linhas = [list(r) for r in linhas]
+        self.chamadas = []
+
+    def values(self):
+        return self
+
+    def get(self, **_kwargs):
+        def _get():
+            self.chamadas.append(("get", None))
+            return {"values": [list(r) for r in self.linhas]}
+        return Requisicao(_get)
+
+    def batchUpdate(self, body, **_kwargs):
+        def _batch():
+            self.chamadas.append(("batchUpdate", body))
+            for d in body["data"]:
+                col, lin = re.search(r"!([A-Z])(\d+)$", d["range"]).groups()
+                self._gravar(int(lin) - 1, ord(col) - ord("A"), d["values"][0][0])
+            return {}
+        return Requisicao(_batch)
+
+    def append(self, body, **_kwargs):
+        def _append():
+            self.chamadas.append(("append", body))
+            # como o Sheets: logo após a última linha com dados
+            ultima = max((i for i, r in enumerate(self.linhas) if any(r)), default=-1) + 1
+            for i, valores in enumerate(body["values"]):
+                for c, v in enumerate(valores):
+                    self._gravar(ultima + i, c, v)
+            return {"updates": {"updatedRange": f"'{m.ABA_CONTROLE}'!A{ultima + 1}:J{ultima + 1}"}}
+        return Requisicao(_append)
+
+    def _gravar(self, lin, col, valor):
+        while len(self.linhas) <= lin:
+            self.linhas.append([])
+        self.linhas[lin].extend([""] * (col + 1 - len(self.linhas[lin])))
+        self.linhas[lin][col] = valor
+
+    def metodos(self):
+        return [metodo for metodo, _body in self.chamadas]
+
+
+@pytest.fixture
+def planilha(monkeypatch):
+    """Planilha falsa no lugar do Sheets; cópia local e buffer zerados, atexit só anotado."""
+    falsa = PlanilhaFalsa([CABECALHO, ["100", "01/01/2024"], ["200"]])
+    falsa.atexit = []
+    monkeypatch.setattr(m, "_sheets", lambda: falsa)
+    monkeypatch.setattr(m, "executar", lambda req, _api="sheets", **kw: req.execute(**kw))
+    monkeypatch.setattr(m, "_SNAPSHOT", None)
+    monkeypatch.setattr(m, "_ESCRITOR", None)
+    monkeypatch.setattr(m.atexit, "register", falsa.atexit.append)
+    return falsa
+
+
+def test_indice_nf_linha_e_linhas_vazias():
+    snap = PlanilhaSnapshot([CABECALHO, ["100", "01/01/2024"], [], ["200"], ["100", "repetida"], [""]])
+    assert (snap.linha_da_nf("100"), snap.linha_da_nf("200"), snap.linha_da_nf("300")) == (1, 3, None)
+    assert snap.vazias == [2, 5] and snap.proxima_livre() == 2
+    assert snap.ler(1, COL["DATA EMISSÃO NF"]) == "01/01/2024"
+    assert snap.ler(3, COL["DATA EMISSÃO NF"], "?") == "?"      # linha curta
+    assert snap.ler(99, 0, None) is None
+
+
+def test_gravar_reindexa_a_nf():
+    snap = PlanilhaSnapshot([CABECALHO, ["100"], []])
+    snap.gravar(2, COL["NUMERO NF"], "300")
+    assert snap.linha_da_nf("300") == 2 and snap.vazias == []
+    assert snap.proxima_livre() == 3                             # fim da tabela
+
+    snap.gravar_linha(5, ["400", "02/02/2024"])                  # além do fim: estende
+    assert snap.linha_da_nf("400") == 5 and snap.ler(5, 1) == "02/02/2024"
+
+    snap.gravar(1, COL["NUMERO NF"], "")                         # NF apagada: linha volta a ser livre
+    assert snap.proxima_livre() == 1
+
+
+def test_snapshot_le_a_planilha_uma_vez(planilha):
+    assert m._snapshot() is m._snapshot()
+    assert m._snapshot().linha_da_nf("200") == 2
+    assert planilha.metodos() == ["get"]
+
+    planilha.linhas.append(["300"])
+    assert m._snapshot().linha_da_nf("300") is None              # cópia local não relê sozinha
+    assert m._snapshot(recarregar=True).linha_da_nf("300") == 3
+    assert planilha.metodos() == ["get", "get"]
+
+
+def test_linha_acrescentada_depois_da_leitura(planilha):
+    idx = m._get_or_create_row("300", "03/03/2024")
+    assert idx == 3 and planilha.linhas[3][:2] == ["300", "03/03/2024"]
+    assert m._get_or_create_row("300") == idx                    # achada na cópia local
+    assert m._read_cell(idx, COL["DATA EMISSÃO NF"]) == "03/03/2024"
+    assert planilha.metodos() == ["get", "append"]
+
+    assert m._get_or_create_row("100") == 1
+    assert m._get_or_create_row("200", "04/04/2024") == 2        # completa a data vazia (no buffer)
+    assert m._read_cell(2, COL["DATA EMISSÃO NF"]) == "04/04/2024"
+    assert planilha.metodos() == ["get", "append"]
+
+
+# ---------- escrita write-behind (EscritorPlanilha) ----------
+class Relogio:
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self):
+        return self.agora
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    r = Relogio()
+    monkeypatch.setattr(m.time, "monotonic", r)
+    return r
+
+
+def _celulas(body):
+    return [(d["range"], d["values"][0][0]) for d in body["data"]]
+
+
+def test_buffer_junta_celulas_e_a_ultima_escrita_vence(planilha, relogio):
+    esc = m.EscritorPlanilha(intervalo=30)
+    esc.flush()
+    assert planilha.chamadas == []                               # nada pendente, nada enviado
+
+    esc.escrever(1, COL["XML DRIVE"], "BAIXADO")
+    esc.escrever(2, COL["NUMERO NF"], "200")
+    esc.escrever(1, COL["XML DRIVE"], True)
+    esc.flush()
+    assert planilha.metodos() == ["batchUpdate"]
+    body = planilha.chamadas[0][1]
+    assert body["valueInputOption"] == "RAW"
+    assert _celulas(body) == [(f"'{m.ABA_CONTROLE}'!C2", True), (f"'{m.ABA_CONTROLE}'!A3", "200")]
+    assert (esc.celulas_escritas, esc.chamadas_api, esc.chamadas_economizadas) == (3, 1, 2)
+    assert esc.pendentes == {}
+
+
+def test_flush_pelo_intervalo(planilha, relogio):
+    esc = m.EscritorPlanilha(intervalo=30)
+    esc.escrever(1, COL["XML DRIVE"], "a")
+    relogio.agora = 29
+    esc.escrever(2, COL["XML DRIVE"], "b")
+    assert planilha.chamadas == []
+
+    relogio.agora = 30
+    esc.escrever(3, COL["XML DRIVE"], "c")                       # vence o intervalo: envia as três
+    assert planilha.metodos() == ["batchUpdate"] and len(_celulas(planilha.chamadas[0][1])) == 3
+
+    relogio.agora = 50
+    esc.escrever(4, COL["XML DRIVE"], "d")                       # o relógio recomeça no flush
+    assert planilha.metodos() == ["batchUpdate"]
+
+
+def test_buffer_vai_antes_do_append(planilha, relogio):
+    # linha vazia preenchida só no buffer: o append tem de vir depois dela
+    planilha.linhas.append([])
+    assert m._get_or_create_row("300") == 3
+    assert planilha.metodos() == ["get"]
+    assert m._get_or_create_row("400") == 4
+    assert planilha.metodos() == ["get", "batchUpdate", "append"]
+    assert [r[0] for r in planilha.linhas[1:]] == ["100", "200", "300", "400"]
+
+
+def test_flush_na_saida(planilha, relogio):
+    m._update_cell(1, COL["XML IMPORTADA SGI"], "VERDADEIRO")
+    assert planilha.atexit == [m._flush_planilha]                # registrado uma vez, no 1º escritor
+    assert m._read_cell(1, COL["XML IMPORTADA SGI"]) == "TRUE"   # como a API devolve na leitura
+    m._update_cell(2, COL["XML IMPORTADA SGI"], False)
+    assert planilha.atexit == [m._flush_planilha]
+
+    planilha.atexit[0]()
+    assert planilha.metodos() == ["get", "batchUpdate"]
+    assert _celulas(planilha.chamadas[1][1]) == [(f"'{m.ABA_CONTROLE}'!D2", True),
+                                                 (f"'{m.ABA_CONTROLE}'!D3", False)]
+    planilha.atexit[0]()                                         # nada pendente: não chama a API
+    assert planilha.metodos() == ["get", "batchUpdate"]
+
+
+def test_falha_no_flush_da_saida_so_e_logada(planilha, relogio, monkeypatch, caplog):
+    m._update_cell(1, COL["XML DRIVE"], "BAIXADO")
+    monkeypatch.setattr(m, "executar", lambda *_a, **_k: (_ for _ in ()).throw(ConnectionError("offline")))
+    m._flush_planilha()
+    assert "Falha ao gravar escritas pendentes" in caplog.text
+    assert m._escritor().pendentes == {(1, COL["XML DRIVE"]): "BAIXADO"}   # nada perdido
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+test_prevalidacao.py
+app.prevalidacao: DV da chave de acesso, coerência chave × nota e a
+classificação dos XMLs (válido, chave inválida, malformado, namespace, CNPJ),
+sobre NF-e sintéticas (bench/gerar_nfe_sintetica.py).
+"""
+import os
+
+import pytest
+
+from app import catalogo_xml, prevalidacao
+from app.catalogo_xml import CatalogoXML
+from app.nfe_parser import NS_NFE
+from app.prevalidacao import dv_chave, problema_chave, validar
+from bench.gerar_nfe_sintetica import gerar_nfe, CNPJ_DEST
+
+NF = 1001
+
+
+@pytest.fixture
+def pasta(tmp_path):
+    p = tmp_path / "xml"
+    p.mkdir()
+    return p
+
+
+def _chave(caminho) -> str:
+    texto = open(caminho, encoding="utf-8").read()
+    return texto.split('Id="NFe', 1)[1][:44]
+
+
+def _variante(pasta, nome, trocar, nf=NF) -> str:
+    """NF-e sintética com o texto alterado por `trocar(texto)`."""
+    caminho = gerar_nfe(str(pasta / nome), nf, itens=2)
+    with open(caminho, encoding="utf-8") as fh:
+        texto = trocar(fh.read())
+    with open(caminho, "w", encoding="utf-8") as fh:
+        fh.write(texto)
+    return caminho
+
+
+def test_dv_chave_confere_com_a_chave_gerada(pasta):
+    chave = _chave(gerar_nfe(str(pasta / "ok.xml"), NF, itens=2))
+    assert dv_chave(chave[:43]) == chave[43]
+    assert problema_chave(chave, str(NF)) is None
+    assert dv_chave("0" * 43) == "0"                # resto < 2 vira 0
+
+
+def test_problemas_da_chave(pasta):
+    chave = _chave(gerar_nfe(str(pasta / "ok.xml"), NF, itens=2))
+    dv_errado = chave[:43] + str((int(chave[43]) + 1) % 10)
+    modelo_65 = chave[:20] + "65" + chave[22:43]
+    assert problema_chave(chave[:43], str(NF)) == "43 dígitos"
+    assert problema_chave(dv_errado, str(NF)) == "dígito verificador"
+    assert problema_chave(modelo_65 + dv_chave(modelo_65), str(NF)) == "modelo 65"
+    assert problema_chave(chave, str(NF + 1)) == f"nNF {NF} ≠ {NF + 1}"
+    assert problema_chave(chave, "") is None      # sem nNF não há o que comparar
+
+
+def test_xml_valido_e_apto(pasta):
+    res = validar(gerar_nfe(str(pasta / "ok.xml"), NF, itens=2))
+    assert res.apto and (res.nf, len(res.chave)) == (str(NF), 44)
+
+
+def test_chave_incoerente_com_o_nnf(pasta):
+    res = validar(_variante(pasta, "nnf.xml", lambda t: t.replace(f"<nNF>{NF}</nNF>", f"<nNF>{NF + 1}</nNF>")))
+    assert res.motivo == f"{prevalidacao.CHAVE_INVALIDA} (nNF {NF} ≠ {NF + 1})"
+
+
+def test_chave_com_dv_errado(pasta):
+    def trocar(texto):
+        chave = texto.split('Id="NFe', 1)[1][:44]
+        return texto.replace(chave, chave[:43] + str((int(chave[43]) + 1) % 10))
+    res = validar(_variante(pasta, "dv.xml", trocar))
+    assert res.motivo == f"{prevalidacao.CHAVE_INVALIDA} (dígito verificador)"
+
+
+def test_xml_malformado(pasta):
+    res = validar(_variante(pasta, "cortado.xml", lambda t: t[: len(t) // 2]))
+    assert res.motivo.startswith(prevalidacao.MALFORMADO)
+
+
+def test_xml_sem_namespace(pasta):
+    res = validar(_variante(pasta, "sem_ns.xml", lambda t: t.replace(f' xmlns="{NS_NFE}"', "")))
+    assert res.motivo == f"{prevalidacao.NAMESPACE} (sem namespace)"
+
+
+def test_cnpj_do_destinatario_opcional(pasta, monkeypatch):
+    caminho = gerar_nfe(str(pasta / "ok.xml"), NF, itens=2)
+    monkeypatch.setattr(prevalidacao, "CNPJS_DESTINATARIO", set())
+    assert validar(caminho).apto
+    monkeypatch.setattr(prevalidacao, "CNPJS_DESTINATARIO", {CNPJ_DEST})
+    assert validar(caminho).apto
+    monkeypatch.setattr(prevalidacao, "CNPJS_DESTINATARIO", {"11111111000111"})
+    assert validar(caminho).motivo == f"{prevalidacao.CNPJ_DIVERGENTE} ({CNPJ_DEST})"
+
+
+def test_prevalidar_marca_rejeitados_e_separa_ilegiveis(tmp_path, pasta, monkeypatch):
+    monkeypatch.setattr(prevalidacao, "CNPJS_DESTINATARIO", set())
+    gerar_nfe(str(pasta / "1001_NFe.xml"), 1001, itens=2)
+    _variante(pasta, "1002_NFe.xml", lambda t: t.replace("<nNF>1002</nNF>", "<nNF>1003</nNF>"), nf=1002)
+    (pasta / "lixo_NFe.xml").write_text("<nfeProc>", encoding="utf-8")
+    cat = CatalogoXML(str(tmp_path / "catalogo.sqlite3"), str(pasta))
+
+    aptos, rejeitados = prevalidacao.prevalidar(cat, cat.com_status(catalogo_xml.BAIXADO))
+    assert [reg["nf"] for reg in aptos] == ["1001"]
+    assert sorted(os.path.basename(r.caminho) for r in rejeitados) == ["1002_NFe.xml", "lixo_NFe.xml"]
+    assert cat.por_nf("1003")["status"] == catalogo_xml.REJEITADO
+    assert os.listdir(pasta / "rejeitados") == ["lixo_NFe.xml"]
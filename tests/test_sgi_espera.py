@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+test_sgi_espera.py
+Timeout adaptativo de app.sgi_espera (timeout_para): piso, teto, janela de
+amostras e esperas de confirmação, que nunca encurtam; log das esperas lentas.
+"""
+import logging
+
+import pytest
+
+from app import sgi_espera
+from app.sgi_espera import timeout_para
+
+
+@pytest.fixture(autouse=True)
+def medidas(monkeypatch):
+    monkeypatch.setattr(sgi_espera, "_medidas", {})
+    monkeypatch.setattr(sgi_espera, "_contagem", {})
+    monkeypatch.setattr(sgi_espera, "FATOR_P95", 4.0)
+    monkeypatch.setattr(sgi_espera, "PISO_S", 3.0)
+    monkeypatch.setattr(sgi_espera, "LENTA_S", 5.0)
+
+
+def _amostras(rotulo, *segundos, ok=True):
+    for s in segundos:
+        sgi_espera._registrar(rotulo, s, ok)
+
+
+def test_teto_ate_haver_cinco_medidas():
+    _amostras("entrada.carregar", *[0.5] * 4)
+    assert timeout_para("entrada.carregar", 15) == 15
+    _amostras("entrada.carregar", 0.5)
+    assert timeout_para("entrada.carregar", 15) == pytest.approx(3.0)    # 4 × 0,5 = 2 → piso
+
+
+def test_fator_do_p95_entre_piso_e_teto():
+    _amostras("rapida", *[0.1] * 10)
+    assert timeout_para("rapida", 15) == pytest.approx(3.0)              # piso
+    assert timeout_para("rapida", 2) == pytest.approx(2.0)               # teto abaixo do piso vence
+
+    _amostras("media", *[1.0] * 19, 2.0)
+    assert timeout_para("media", 15) == pytest.approx(8.0)               # p95 = 2,0
+
+    _amostras("lenta", *[10.0] * 5)
+    assert timeout_para("lenta", 15) == 15                               # teto
+
+
+def test_timeouts_nao_entram_no_p95():
+    _amostras("login.home", *[0.5] * 5)
+    _amostras("login.home", *[5.0] * 5, ok=False)
+    assert timeout_para("login.home", 5) == pytest.approx(3.0)
+    assert sgi_espera._contagem["login.home"]["timeout"] == 5
+
+
+def test_janela_descarta_as_mais_antigas():
+    _amostras("importar.id", *[10.0] * sgi_espera.AMOSTRAS)
+    assert timeout_para("importar.id", 15) == 15
+    _amostras("importar.id", *[1.0] * sgi_espera.AMOSTRAS)
+    assert timeout_para("importar.id", 15) == pytest.approx(4.0)
+
+
+def test_confirmacao_nunca_encurta():
+    _amostras("entrada.salvar", *[0.1] * 10)
+    assert timeout_para("entrada.salvar", 15, confirmacao=True) == 15
+    _amostras("entrada.salvar", *[10.0] * 50)
+    assert timeout_para("entrada.salvar", 15, confirmacao=True) == pytest.approx(40.0)
+    assert timeout_para("entrada.salvar", 15) == 15
+
+
+def test_esperas_lentas_vao_para_info(caplog):
+    caplog.set_level(logging.DEBUG)
+    sgi_espera._logar("entrada.carregar", 0.4, 3.0, True)
+    sgi_espera._logar("entrada.salvar", 6.2, 15.0, True)
+    sgi_espera._logar("importar.id", 5.0, 5.0, False)
+    assert [(r.levelno, r.getMessage()) for r in caplog.records] == [
+        (logging.DEBUG, "⏱️ espera entrada.carregar: 0.40s (limite 3.0s)"),
+        (logging.INFO, "⏱️ espera lenta entrada.salvar: 6.20s (limite 15.0s)"),
+        (logging.INFO, "⏱️ espera lenta importar.id: TIMEOUT após 5.00s (limite 5.0s)"),
+    ]
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+test_sgi_leitor.py
+LeitorSGI (app.sgi_leitor) contra o SGI simulado (bench/sgi_mock.py):
+paginação, limite de páginas, sessão expirada e filtro por chave de acesso.
+"""
+import pytest
+
+pytest.importorskip("requests")
+bs4 = pytest.importorskip("bs4")
+
+from app import sgi_leitor                                 # noqa: E402
+from app.sgi_leitor import LeitorSGI, SessaoExpirada       # noqa: E402
+from bench.sgi_mock import ServidorSGI, POR_PAGINA        # noqa: E402
+
+CHAVE_A = "3" * 44
+CHAVE_B = "4" * 44
+
+
+@pytest.fixture
+def servidor():
+    srv = ServidorSGI().iniciar()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def _importacoes(srv, nfs_chaves):
+    """Importações na ordem dada (ids crescentes; a lista do SGI mostra a mais recente primeiro)."""
+    with srv.estado.lock:
+        for nf, chave in nfs_chaves:
+            id_ = 1000 + len(srv.estado.importacoes) + 1
+            srv.estado.importacoes[id_] = {"nf": str(nf), "chave": chave, "itens": [], "lancamento": None}
+
+
+def _leitor_logado(srv) -> LeitorSGI:
+    leitor = LeitorSGI(base=srv.url)
+    leitor.http.post(f"{srv.url}/login", data={"usuario": "teste", "senha": "teste"})
+    leitor.http.post(f"{srv.url}/local_trabalho", data={"filial_id": "6"})
+    return leitor
+
+
+def _paginas_lidas(srv) -> int:
+    return srv.estado.requisicoes["GET /importacoes_xml_nfe"]
+
+
+def test_segue_rel_next_por_todas_as_paginas(servidor):
+    _importacoes(servidor, [(5000 + i, CHAVE_A) for i in range(2 * POR_PAGINA + 5)])
+    leitor = _leitor_logado(servidor)
+    importacoes = leitor.importacoes()
+    assert len(importacoes) == 2 * POR_PAGINA + 5
+    assert _paginas_lidas(servidor) == 3
+    assert importacoes["5000"] == [("1001", "/importacoes_xml_nfe/1001", CHAVE_A)]
+
+    leitor.importacoes()                       # em cache: nenhuma página nova
+    assert _paginas_lidas(servidor) == 3
+    leitor.importacoes(recarregar=True)
+    assert _paginas_lidas(servidor) == 6
+
+
+def test_limite_de_paginas(servidor, monkeypatch):
+    monkeypatch.setattr(sgi_leitor, "PAGINAS_MAXIMO", 2)
+    _importacoes(servidor, [(6000 + i, CHAVE_A) for i in range(3 * POR_PAGINA)])
+    importacoes = _leitor_logado(servidor).importacoes()
+    assert _paginas_lidas(servidor) == 2
+    assert len(importacoes) == 2 * POR_PAGINA
+
+
+def test_proxima_pagina_relativa_a_pagina_atual():
+    sopa = bs4.BeautifulSoup('<ul class="pagination"><li class="next"><a href="?page=3">›</a></li></ul>',
+                             "html.parser")
+    assert (LeitorSGI._proxima_pagina(sopa, "http://sgi.local/importacoes_xml_nfe?page=2")
+            == "http://sgi.local/importacoes_xml_nfe?page=3")
+    assert LeitorSGI._proxima_pagina(bs4.BeautifulSoup("<p></p>", "html.parser"), "http://x/") is None
+
+
+def test_tela_de_login_levanta_sessao_expirada(servidor):
+    _importacoes(servidor, [(7000, CHAVE_A)])
+    with pytest.raises(SessaoExpirada):
+        LeitorSGI(base=servidor.url).importacoes()
+
+
+def test_links_importacao_filtra_e_ordena_pela_chave(servidor):
+    # mesmo nº de NF: chave A (antiga), outro fornecedor (B) e uma linha sem chave (mais recente)
+    _importacoes(servidor, [(8000, CHAVE_A), (8000, CHAVE_B), (8000, "")])
+    leitor = _leitor_logado(servidor)
+    url = f"{servidor.url}/importacoes_xml_nfe"
+
+    assert leitor.links_importacao("8000") == [f"{url}/1003", f"{url}/1002", f"{url}/1001"]
+    assert leitor.links_importacao("8000", CHAVE_A) == [f"{url}/1001", f"{url}/1003"]
+    assert leitor.links_importacao("8000", CHAVE_B) == [f"{url}/1002", f"{url}/1003"]
+    assert leitor.links_importacao("8001", CHAVE_A) == []